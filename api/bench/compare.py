@@ -0,0 +1,46 @@
+"""
+Compare two benchmark results written by bench/run.py.
+
+Usage, from the api directory:
+    python -m bench.compare before.json after.json
+"""
+import argparse
+import json
+
+
+def change(before, after):
+    if not before or after is None:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def compare(before, after):
+    """
+    Print the throughput and latency percentiles of every route of two runs, with the relative change.
+
+    Args:
+        before (dict): The reference results.
+        after (dict): The new results.
+    """
+    print(f"{'route':<32} {'metric':<10} {'before':>10} {'after':>10} {'change':>9}")
+    routes = sorted(set(before["routes"]) | set(after["routes"])) + ["total"]
+    for route in routes:
+        old = before["total"] if route == "total" else before["routes"].get(route)
+        new = after["total"] if route == "total" else after["routes"].get(route)
+        if old is None or new is None:
+            print(f"{route:<32} only in {'after' if old is None else 'before'}")
+            continue
+        metrics = [("req/s", old["throughput"], new["throughput"]), ("errors", old["errors"], new["errors"])]
+        metrics += [(name, old["latency_ms"][name], new["latency_ms"][name]) for name in ("p50", "p95", "p99")]
+        for name, old_value, new_value in metrics:
+            print(f"{route:<32} {name:<10} {old_value if old_value is not None else '-':>10} "
+                  f"{new_value if new_value is not None else '-':>10} {change(old_value, new_value):>9}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before", help="results of the reference run")
+    parser.add_argument("after", help="results of the new run")
+    args = parser.parse_args()
+    with open(args.before, encoding="utf-8") as before_file, open(args.after, encoding="utf-8") as after_file:
+        compare(json.load(before_file), json.load(after_file))
@@ -0,0 +1,185 @@
+"""
+Start a throwaway MySQL database for the benchmarks, create the schema and seed it.
+"""
+import os
+import random
+import subprocess
+import time
+
+import bcrypt
+import mysql.connector
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONTAINER_NAME = "stayabucks-bench-mysql"
+# Password of every seeded user, used by the login traffic
+SEED_PASSWORD = "benchmark"
+SUPPLEMENT_TYPES = ("syrup", "milk", "other")
+WORDS = (
+    "cafe", "latte", "mocha", "caramel", "vanille", "noisette", "chocolat", "the", "matcha", "chai",
+    "glace", "frappe", "cannelle", "coco", "amande", "avoine", "double", "leger", "intense", "crème",
+)
+INSERT_CHUNK_SIZE = 1000
+
+
+def start_container(image, port, password):
+    """
+    Start a MySQL container listening on a local port, replacing a previous one.
+
+    Args:
+        image (str): The Docker image, e.g. "mysql:8.0".
+        port (int): The local port mapped to the container.
+        password (str): The root password.
+    """
+    subprocess.run(["docker", "rm", "--force", CONTAINER_NAME], capture_output=True)
+    subprocess.run(
+        ["docker", "run", "--detach", "--rm", "--name", CONTAINER_NAME,
+         "--env", f"MYSQL_ROOT_PASSWORD={password}", "--publish", f"{port}:3306", image],
+        check=True, capture_output=True
+    )
+
+
+def stop_container():
+    subprocess.run(["docker", "stop", CONTAINER_NAME], capture_output=True)
+
+
+def wait_for_server(server, timeout=120.0):
+    """
+    Wait until the MySQL server accepts connections.
+
+    Args:
+        server (dict): The host, port, user and password of the server.
+        timeout (float): Seconds to wait before giving up.
+
+    Raises:
+        TimeoutError: If the server is still unreachable after the timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            mysql.connector.connect(**server).close()
+            return
+        except mysql.connector.Error:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"MySQL is not reachable on {server['host']}:{server['port']}")
+            time.sleep(1)
+
+
+def create_database(server, database):
+    """
+    Create an empty database with the baseline schema of sql.sql and apply the migrations.
+
+    The ALTER TABLE statements of sql.sql that the server rejects are skipped, as on the existing
+    databases: MySQL refuses the foreign keys declared from the parent tables to their children.
+    The MYSQL_* environment variables are pointed at the new database, so that the application
+    and migrate.py imported afterwards use it.
+
+    Args:
+        server (dict): The host, port, user and password of the server.
+        database (str): The name of the database, dropped first if it exists.
+    """
+    from migrate import Migration, upgrade
+
+    connection = mysql.connector.connect(**server)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    cursor.execute(f"CREATE DATABASE `{database}`")
+    cursor.execute(f"USE `{database}`")
+    with open(os.path.join(API_DIR, "sql.sql"), encoding="utf-8") as file:
+        for statement in Migration(0, "baseline", file.read()).statements():
+            try:
+                cursor.execute(statement)
+            except mysql.connector.Error as err:
+                if not statement.upper().startswith("ALTER TABLE"):
+                    raise
+                print(f"Skipped baseline statement: {err}")
+    connection.commit()
+    connection.close()
+
+    os.environ.update({
+        "MYSQL_HOST": server["host"],
+        "MYSQL_PORT": str(server["port"]),
+        "MYSQL_USER": server["user"],
+        "MYSQL_PASSWORD": server["password"],
+        "MYSQL_DB": database,
+    })
+    upgrade()
+
+
+def insert_rows(cursor, query, rows):
+    for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+        cursor.executemany(query, rows[start:start + INSERT_CHUNK_SIZE])
+
+
+def unique_pairs(rng, count, left, right):
+    """
+    Draw distinct (left, right) pairs, at most left * right of them.
+    """
+    count = min(count, left * right)
+    pairs = set()
+    while len(pairs) < count:
+        pairs.add((rng.randint(1, left), rng.randint(1, right)))
+    return sorted(pairs)
+
+
+def seed(server, database, volumes, seed_value=0):
+    """
+    Fill the database with generated data.
+
+    Rows get consecutive IDs starting at 1, so the traffic can pick valid IDs without querying.
+    The same seed always produces the same data.
+
+    Args:
+        server (dict): The host, port, user and password of the server.
+        database (str): The name of the database.
+        volumes (dict): The number of users, drinks, supplements, created_drinks, likes and favorites.
+        seed_value (int): The seed of the random generator.
+
+    Returns:
+        list: The seeded drinks as (id, name, description, price) tuples.
+    """
+    rng = random.Random(seed_value)
+    users, drinks, supplements = volumes["users"], volumes["drinks"], volumes["supplements"]
+    created_drinks = volumes["created_drinks"]
+    # A single hash keeps seeding fast; every user logs in with SEED_PASSWORD
+    password = bcrypt.hashpw(SEED_PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+    connection = mysql.connector.connect(database=database, **server)
+    cursor = connection.cursor()
+    # The generated data is consistent; skipping the checks only speeds up the inserts
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+
+    insert_rows(cursor, "INSERT INTO users (id, username, email, password, role, created_at) "
+                        "VALUES (%s, %s, %s, %s, %s, NOW())",
+                [(index, f"user{index}", f"user{index}@example.com", password, "user")
+                 for index in range(1, users + 1)])
+    drink_rows = [(index, " ".join(rng.sample(WORDS, 2)).capitalize() + f" {index}",
+                   " ".join(rng.sample(WORDS, 6)), round(rng.uniform(2.0, 7.0), 2))
+                  for index in range(1, drinks + 1)]
+    insert_rows(cursor, "INSERT INTO drink (id, name, description, price) VALUES (%s, %s, %s, %s)", drink_rows)
+    insert_rows(cursor, "INSERT INTO supplement_type (id, category) VALUES (%s, %s)",
+                list(enumerate(SUPPLEMENT_TYPES, start=1)))
+    insert_rows(cursor, "INSERT INTO supplement (id, name, price, type_id) VALUES (%s, %s, %s, %s)",
+                [(index, f"Supplement {index}", round(rng.uniform(0.2, 1.5), 2),
+                  rng.randint(1, len(SUPPLEMENT_TYPES)))
+                 for index in range(1, supplements + 1)])
+    insert_rows(cursor, "INSERT INTO drink_created (id, user_id, drink_id) VALUES (%s, %s, %s)",
+                [(index, rng.randint(1, users), rng.randint(1, drinks)) for index in range(1, created_drinks + 1)])
+    insert_rows(cursor, "INSERT INTO drink_created_supplement_association (drink_created_id, supplement_id, quantity) "
+                        "VALUES (%s, %s, %s)",
+                [(index, supplement_id, rng.randint(1, 2))
+                 for index in range(1, created_drinks + 1)
+                 for supplement_id in rng.sample(range(1, supplements + 1), rng.randint(0, min(3, supplements)))])
+    insert_rows(cursor, "INSERT INTO drink_created_likes (user_id, drink_created_id) VALUES (%s, %s)",
+                unique_pairs(rng, volumes["likes"], users, created_drinks))
+    insert_rows(cursor, "INSERT INTO favoris (user_id, drink_created_id) VALUES (%s, %s)",
+                unique_pairs(rng, volumes["favorites"], users, created_drinks))
+    cursor.execute(
+        "UPDATE drink_created dc "
+        "JOIN (SELECT drink_created_id, COUNT(*) AS likes FROM drink_created_likes GROUP BY drink_created_id) l "
+        "ON l.drink_created_id = dc.id SET dc.like_count = l.likes"
+    )
+
+    cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    connection.commit()
+    connection.close()
+    return drink_rows
@@ -0,0 +1,359 @@
+"""
+Benchmark the API with a realistic mix of requests against a freshly seeded database.
+
+By default a MySQL container is started with Docker, the schema of sql.sql and the migrations are
+applied, the database is seeded and the application of main.py is driven in process. The results,
+with the throughput and latency percentiles of every route, are written to a JSON file that
+bench/compare.py compares with another run.
+
+Usage, from the api directory:
+    python -m bench.run                                    # MySQL in Docker, default volumes and traffic
+    python -m bench.run --requests 20000 --concurrency 64 --output after.json
+    python -m bench.run --host 127.0.0.1 --port 3306 --user root --password secret   # existing server
+    python -m bench.run --url http://127.0.0.1:8000        # a server started on the bench database
+    python -m bench.compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import secrets
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from bench.database import (
+    SEED_PASSWORD, WORDS, create_database, seed, start_container, stop_container, wait_for_server,
+)
+
+PERCENTILES = (50, 95, 99)
+
+
+class VirtualUser:
+    """
+    A client of the API, picking its next request from a weighted mix of the routes.
+
+    Each virtual user logs in as one of the seeded users and sends its writes with the access token.
+    Most requests come from a small share of the users, as in production, and the listings are
+    revalidated with the ETag of the previous response like a browser would.
+
+    Attributes:
+        index (int): The number of the virtual user.
+        rng (random.Random): The random generator of the virtual user.
+    """
+
+    def __init__(self, index, seed_value, volumes, drinks, run_id):
+        self.index = index
+        self.rng = random.Random(seed_value * 1000 + index)
+        self.volumes = volumes
+        self.drinks = drinks
+        self.run_id = run_id
+        self.signups = 0
+        self.etags = {}
+        self.account = self.user_id()
+        self.token = None
+        self.operations = [
+            (20, self.perso_drinks), (15, self.last_drinks), (15, self.search), (10, self.show_fav),
+            (8, self.top_drinks), (8, self.create_drink), (2, self.create_drinks_batch), (8, self.like),
+            (4, self.fav), (3, self.login), (1, self.signup), (1, self.update_user), (1, self.update_drink),
+        ]
+        self.weights = [weight for weight, _ in self.operations]
+
+    def user_id(self):
+        # 80% of the traffic comes from 20% of the users
+        users = self.volumes["users"]
+        if self.rng.random() < 0.8:
+            return self.rng.randint(1, max(1, users // 5))
+        return self.rng.randint(1, users)
+
+    async def log_in(self, client):
+        response = await client.post("/login/", json={"email": f"user{self.account}@example.com",
+                                                       "password": SEED_PASSWORD})
+        response.raise_for_status()
+        self.token = response.json()["access_token"]
+
+    def authorization(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+    def drink_order(self):
+        supplements = self.volumes["supplements"]
+        chosen = self.rng.sample(range(1, supplements + 1), self.rng.randint(0, min(3, supplements)))
+        return {
+            "drink_id": self.rng.randint(1, self.volumes["drinks"]),
+            "supplement_id": {str(supplement_id): self.rng.randint(1, 2) for supplement_id in chosen},
+        }
+
+    def next_request(self):
+        """
+        Pick the next request.
+
+        Returns:
+            tuple: The route label, the HTTP method, the path and the keyword arguments of the request.
+        """
+        return self.rng.choices(self.operations, self.weights)[0][1]()
+
+    def conditional(self, label, path, headers=None):
+        headers = dict(headers or {})
+        if path in self.etags:
+            headers["If-None-Match"] = self.etags[path]
+        return label, "GET", path, {"headers": headers}
+
+    def perso_drinks(self):
+        return self.conditional("GET /perso-drinks/{user_id}", f"/perso-drinks/{self.user_id()}")
+
+    def last_drinks(self):
+        return self.conditional("GET /last-drinks/{user_id}", f"/last-drinks/{self.user_id()}")
+
+    def show_fav(self):
+        return self.conditional("GET /show-fav/{user_id}", f"/show-fav/{self.account}", self.authorization())
+
+    def search(self):
+        # Type-ahead: a word, or the first letters of one
+        word = self.rng.choice(WORDS)
+        query = word[:self.rng.randint(2, len(word))]
+        return "GET /search/", "GET", "/search/", {"params": {"query": query}}
+
+    def top_drinks(self):
+        return "GET /top-drinks", "GET", "/top-drinks", {"params": {"limit": 10}}
+
+    def create_drink(self):
+        return "POST /perso-drink", "POST", "/perso-drink", {"json": self.drink_order(),
+                                                             "headers": self.authorization()}
+
+    def create_drinks_batch(self):
+        drinks = [self.drink_order() for _ in range(self.rng.randint(2, 6))]
+        return "POST /perso-drinks/batch", "POST", "/perso-drinks/batch", {"json": {"drinks": drinks},
+                                                                           "headers": self.authorization()}
+
+    def like(self):
+        body = {"drink_created_id": self.rng.randint(1, self.volumes["created_drinks"])}
+        return "POST /likes/", "POST", "/likes/", {"json": body, "headers": self.authorization()}
+
+    def fav(self):
+        body = {"drink_created_id": self.rng.randint(1, self.volumes["created_drinks"])}
+        return "POST /fav/", "POST", "/fav/", {"json": body, "headers": self.authorization()}
+
+    def login(self):
+        body = {"email": f"user{self.user_id()}@example.com", "password": SEED_PASSWORD}
+        return "POST /login/", "POST", "/login/", {"json": body}
+
+    def signup(self):
+        self.signups += 1
+        name = f"{self.run_id}-{self.index}-{self.signups}"
+        body = {"username": name, "email": f"{name}@example.com", "password": SEED_PASSWORD}
+        return "POST /signup/", "POST", "/signup/", {"json": body}
+
+    def update_user(self):
+        account = self.account
+        body = {"user_id": str(account), "username": f"user{account}", "email": f"user{account}@example.com",
+                "password": SEED_PASSWORD}
+        return "PUT /user/", "PUT", "/user/", {"json": body, "headers": self.authorization()}
+
+    def update_drink(self):
+        drink_id, name, description, price = self.rng.choice(self.drinks)
+        body = {"drink_id": drink_id, "name": name, "description": description,
+                "price": round(price * self.rng.uniform(0.9, 1.1), 2)}
+        return "PUT /drink/", "PUT", "/drink/", {"json": body}
+
+
+async def drive(client, users, total, warmup):
+    """
+    Send requests from every virtual user concurrently until `total` requests have been measured.
+
+    Returns:
+        tuple: The (label, status, seconds) of every measured request and the measured wall time.
+    """
+    samples = []
+    sent = 0
+    measure_started = None
+    # Logging in is part of the setup, not of the measure
+    await asyncio.gather(*(user.log_in(client) for user in users))
+
+    async def run(user):
+        nonlocal sent, measure_started
+        while sent < warmup + total:
+            sent += 1
+            measured = sent > warmup
+            if measured and measure_started is None:
+                measure_started = time.perf_counter()
+            label, method, path, kwargs = user.next_request()
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                status = response.status_code
+                if "etag" in response.headers:
+                    user.etags[path] = response.headers["etag"]
+            except httpx.HTTPError:
+                status = 0
+            if measured:
+                samples.append((label, status, time.perf_counter() - started))
+
+    await asyncio.gather(*(run(user) for user in users))
+    return samples, time.perf_counter() - (measure_started or time.perf_counter())
+
+
+def percentile(sorted_values, rank):
+    """
+    Return the nearest-rank percentile of sorted values.
+    """
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(rank / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(samples, duration):
+    """
+    Compute the throughput, status codes and latency distribution of a set of requests.
+
+    Server errors (5xx) and transport failures (status 0) count as errors.
+
+    Returns:
+        dict: The summary, with latencies in milliseconds.
+    """
+    latencies = sorted(seconds * 1000 for _, _, seconds in samples)
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(count for status, count in statuses.items() if status == "0" or status.startswith("5"))
+    summary = {
+        "requests": len(samples),
+        "throughput": round(len(samples) / duration, 2) if duration else None,
+        "errors": errors,
+        "statuses": dict(sorted(statuses.items())),
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else None,
+            **{f"p{rank}": round(percentile(latencies, rank), 3) if latencies else None for rank in PERCENTILES},
+            "max": round(latencies[-1], 3) if latencies else None,
+        },
+    }
+    return summary
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def wait_until_ready(client, timeout=120.0):
+    """
+    Poll /readyz until the application has warmed up.
+    """
+    deadline = time.monotonic() + timeout
+    while (await client.get("/readyz")).status_code != 200:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"The application was not ready after {timeout} seconds")
+        await asyncio.sleep(0.5)
+
+
+async def benchmark(args, volumes, drinks):
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    users = [VirtualUser(index, args.seed, volumes, drinks, run_id) for index in range(args.concurrency)]
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            await wait_until_ready(client)
+            return await drive(client, users, args.requests, args.warmup)
+
+    # Imported once the environment points at the bench database; the app refuses to start without a key
+    os.environ.setdefault("AUTH_SECRET_KEY", secrets.token_urlsafe(32))
+    from main import app
+
+    # Runs the lifespan of the application, which ASGITransport does not do
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            await wait_until_ready(client)
+            return await drive(client, users, args.requests, args.warmup)
+
+
+def print_report(report):
+    print(f"{'route':<32} {'requests':>9} {'req/s':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = list(report["routes"].items()) + [("total", report["total"])]
+    for label, summary in rows:
+        latency = summary["latency_ms"]
+        print(f"{label:<32} {summary['requests']:>9} {summary['throughput'] or 0:>9.1f} {summary['errors']:>7} "
+              f"{latency['p50'] or 0:>9.2f} {latency['p95'] or 0:>9.2f} {latency['p99'] or 0:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    server_group = parser.add_argument_group("database")
+    server_group.add_argument("--host", help="use this MySQL server instead of starting a Docker container")
+    server_group.add_argument("--port", type=int, default=3307, help="MySQL port (default: 3307)")
+    server_group.add_argument("--user", default="root", help="MySQL user (default: root)")
+    server_group.add_argument("--password", default="benchmark", help="MySQL password (default: benchmark)")
+    server_group.add_argument("--database", default="stayabucks_bench", help="database created for the run")
+    server_group.add_argument("--image", default="mysql:8.0", help="Docker image of the MySQL container")
+    server_group.add_argument("--keep-container", action="store_true", help="leave the container running")
+
+    seed_group = parser.add_argument_group("data")
+    seed_group.add_argument("--users", type=int, default=1000)
+    seed_group.add_argument("--drinks", type=int, default=50)
+    seed_group.add_argument("--supplements", type=int, default=30)
+    seed_group.add_argument("--created-drinks", type=int, default=20000)
+    seed_group.add_argument("--likes", type=int, default=50000)
+    seed_group.add_argument("--favorites", type=int, default=10000)
+    seed_group.add_argument("--seed", type=int, default=42, help="seed of the data and of the traffic")
+
+    traffic_group = parser.add_argument_group("traffic")
+    traffic_group.add_argument("--requests", type=int, default=5000, help="measured requests")
+    traffic_group.add_argument("--warmup", type=int, default=500, help="requests sent before measuring")
+    traffic_group.add_argument("--concurrency", type=int, default=32, help="virtual users sending requests")
+    traffic_group.add_argument("--timeout", type=float, default=30.0, help="request timeout in seconds")
+    traffic_group.add_argument("--url", help="drive a running server started on the bench database")
+    traffic_group.add_argument("--output", default="bench-results.json", help="JSON file of the results")
+    args = parser.parse_args()
+
+    volumes = {
+        "users": args.users, "drinks": args.drinks, "supplements": args.supplements,
+        "created_drinks": args.created_drinks, "likes": args.likes, "favorites": args.favorites,
+    }
+    server = {"host": args.host or "127.0.0.1", "port": args.port, "user": args.user, "password": args.password}
+
+    started_container = args.host is None
+    if started_container:
+        print(f"Starting {args.image} on port {args.port}")
+        start_container(args.image, args.port, args.password)
+    try:
+        wait_for_server(server)
+        print(f"Creating and seeding {args.database}")
+        create_database(server, args.database)
+        drinks = seed(server, args.database, volumes, args.seed)
+
+        print(f"Sending {args.warmup} + {args.requests} requests from {args.concurrency} virtual users")
+        samples, duration = asyncio.run(benchmark(args, volumes, drinks))
+    finally:
+        if started_container and not args.keep_container:
+            stop_container()
+
+    by_route = {}
+    for sample in samples:
+        by_route.setdefault(sample[0], []).append(sample)
+    report = {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "target": args.url or "in-process",
+        "volumes": volumes,
+        "traffic": {"requests": args.requests, "warmup": args.warmup, "concurrency": args.concurrency,
+                    "seed": args.seed},
+        "duration_seconds": round(duration, 3),
+        "total": summarize(samples, duration),
+        "routes": {label: summarize(route_samples, duration) for label, route_samples in sorted(by_route.items())},
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print_report(report)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import asyncio
+import time
+
+import aiomysql
+
+from config.database import db_config, pool_config
+from config.replicas import route
+from config.settings import env_number
+from config.instrumentation import AsyncInstrumentedCursor
+from services.metrics import db_acquire_duration_seconds
+
+# Settings of the pool shared by every AsyncDatabaseConnection, read from the same .env as db_config
+async_pool_config = {
+    "minsize": env_number("MYSQL_ASYNC_POOL_MIN_SIZE", 1),  # Connections opened with the pool
+    "maxsize": env_number("MYSQL_ASYNC_POOL_MAX_SIZE", 20),  # Upper bound of open connections
+    "pool_recycle": int(pool_config["recycle"]),  # Maximum age of a connection in seconds
+}
+
+# The pool of the primary under None, then one pool per read replica under its name
+_pools = {}
+_pool_lock = asyncio.Lock()
+
+
+async def get_pool(replica=None):
+    """
+    Return the async connection pool of the primary or of a replica, creating it on first use.
+
+    Args:
+        replica (Replica): The replica, or None for the primary.
+
+    Returns:
+        aiomysql.Pool: The pool shared by every AsyncDatabaseConnection to that server.
+    """
+    key = replica.name if replica else None
+    if key not in _pools:
+        async with _pool_lock:
+            if key not in _pools:
+                _pools[key] = await aiomysql.create_pool(
+                    user=db_config["user"],
+                    password=db_config["password"] or "",
+                    host=replica.host if replica else db_config["host"] or "localhost",
+                    db=db_config["database"],
+                    port=replica.port if replica else int(db_config["port"] or 3306),
+                    autocommit=False,
+                    cursorclass=aiomysql.DictCursor,
+                    **async_pool_config
+                )
+    return _pools[key]
+
+
+async def close_pool():
+    """
+    Close the async connection pools and wait for their connections to be released.
+    """
+    while _pools:
+        _, pool = _pools.popitem()
+        pool.close()
+        await pool.wait_closed()
+
+
+def pool_status():
+    """
+    Describe the current state of the async pool of the primary.
+
+    Returns:
+        dict: The pool size limits and the number of open, idle and checked-out connections,
+        or None if the pool has not been created yet.
+    """
+    pool = _pools.get(None)
+    if pool is None:
+        return None
+    return {
+        "minsize": pool.minsize,
+        "maxsize": pool.maxsize,
+        "opened": pool.size,
+        "idle": pool.freesize,
+        "checked_out": pool.size - pool.freesize,
+    }
+
+
+class AsyncDatabaseConnection:
+    """
+    An async context manager for managing MySQL database connections without blocking the event loop.
+
+    Connections are checked out of the shared async pool on entry and returned to it on exit.
+    The cursor is instrumented, so every statement is timed in the /metrics endpoint.
+
+    Read-only connections go to a read replica when MYSQL_REPLICA_HOSTS lists some, unless the
+    user they read for has just written; they fall back to the primary when no replica is healthy.
+
+    Usage:
+        async with AsyncDatabaseConnection() as (connection, cursor):
+            await cursor.execute(...)
+            rows = await cursor.fetchall()
+
+        async with AsyncDatabaseConnection(readonly=True, user_id=user_id) as (connection, cursor):
+            # Reads that may be served by a replica
+
+    Attributes:
+        readonly (bool): Whether the connection may go to a replica.
+        user_id (int): The user the reads are made for, if any.
+        replica (Replica): The replica the connection goes to, or None for the primary.
+        db_connection (aiomysql.Connection): The database connection.
+        db_cursor (AsyncInstrumentedCursor): The database cursor.
+    """
+
+    def __init__(self, readonly=False, user_id=None):
+        self.readonly = readonly
+        self.user_id = user_id
+        self.replica = None
+        self.pool = None
+        self.db_connection = None
+        self.db_cursor = None
+
+    async def user_exists(self, user_id):
+        """
+        Check if a user exists in the database.
+
+        Args:
+            user_id (int): The ID of the user.
+
+        Returns:
+            bool: True if the user exists, False otherwise.
+        """
+        await self.db_cursor.execute("SELECT 1 FROM users WHERE id = %s", (user_id,))
+        return await self.db_cursor.fetchone() is not None
+
+    async def drink_exists(self, drink_id):
+        """
+        Check if a drink exists in the database.
+
+        Args:
+            drink_id (int): The ID of the drink.
+
+        Returns:
+            bool: True if the drink exists, False otherwise.
+        """
+        await self.db_cursor.execute("SELECT 1 FROM drink WHERE id = %s", (drink_id,))
+        return await self.db_cursor.fetchone() is not None
+
+    async def _connect(self, replica, check=False):
+        self.pool = await get_pool(replica)
+        # aiomysql opens missing connections inside acquire(), so this also covers connect time
+        started = time.perf_counter()
+        try:
+            self.db_connection = await asyncio.wait_for(self.pool.acquire(), pool_config["timeout"])
+        except asyncio.TimeoutError:
+            raise aiomysql.OperationalError(
+                f"No database connection available after {pool_config['timeout']} seconds")
+        db_acquire_duration_seconds.observe(time.perf_counter() - started, "async")
+        try:
+            if pool_config["ping"]:
+                await self.db_connection.ping()
+            # Checked on the raw cursor, so the check does not show up in the statement metrics
+            if check:
+                async with self.db_connection.cursor() as cursor:
+                    try:
+                        await cursor.execute(replica.status_query)
+                    except aiomysql.Error as err:
+                        if not replica.unsupported_status_query(err.args[0] if err.args else None):
+                            raise
+                        await cursor.execute(replica.status_query)
+                    rows = await cursor.fetchall()
+                if not replica.record_status(rows[0] if rows else None):
+                    self.pool.release(self.db_connection)
+                    self.db_connection = None
+                    return False
+            self.db_cursor = AsyncInstrumentedCursor(await self.db_connection.cursor())
+        except Exception:
+            self.db_connection.close()
+            self.pool.release(self.db_connection)
+            self.db_connection = None
+            raise
+        return True
+
+    async def __aenter__(self):
+        for replica in route(self.readonly, self.user_id):
+            check = replica.claim_check()
+            if not check and not replica.healthy:
+                # Its first check, or the one after an ejection, runs on another connection
+                continue
+            try:
+                if await self._connect(replica, check):
+                    self.replica = replica
+                    return self.db_connection, self.db_cursor
+            except Exception as e:
+                replica.eject(str(e) or type(e).__name__)
+        await self._connect(None)
+        return self.db_connection, self.db_cursor
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        try:
+            if self.db_cursor:
+                await self.db_cursor.close()
+            # The pool closes connections released inside a transaction, so end it here
+            if self.db_connection and not self.db_connection.closed \
+                    and self.db_connection.get_transaction_status():
+                await self.db_connection.rollback()
+        except aiomysql.Error:
+            self.db_connection.close()
+        finally:
+            if self.db_connection:
+                self.pool.release(self.db_connection)
+            self.replica = None
+            self.db_connection = None
+            self.db_cursor = None
@@ -1,9 +1,16 @@
+import logging
 import mysql.connector
 import os
-from dotenv import load_dotenv
+import time
 
-# Load environment variables from the .env file
-load_dotenv(".env")
+from config.instrumentation import InstrumentedCursor
+from config.pool import ConnectionPool, is_disconnect_error
+from config.prepared import MYSQL_STATEMENT_CACHE_SIZE, PreparedCursor, StatementCache
+from config.replicas import replicas, route
+from config.settings import env_number
+from services.metrics import db_acquire_duration_seconds, db_connect_duration_seconds
+
+logger = logging.getLogger(__name__)
 
 # Configuration for connecting to the MySQL database using information from the .env file
 db_config = {
@@ -15,27 +22,158 @@ db_config = {
 }
 
 
+# Settings of the connection pool shared by every DatabaseConnection
+pool_config = {
+    "size": env_number("MYSQL_POOL_SIZE", 5),  # Connections kept open
+    "max_overflow": env_number("MYSQL_POOL_MAX_OVERFLOW", 10),  # Extra connections allowed under bursts
+    "timeout": env_number("MYSQL_POOL_TIMEOUT", 30.0, float),  # Seconds to wait for a free connection
+    "idle_timeout": env_number("MYSQL_POOL_IDLE_TIMEOUT", 300.0, float),  # Seconds before an idle connection is reopened
+    "recycle": env_number("MYSQL_POOL_RECYCLE", 3600.0, float),  # Maximum age of a connection in seconds
+    "ping": bool(env_number("MYSQL_POOL_PING", 1)),  # Validate connections on checkout
+}
+
+pool = ConnectionPool(db_config, **pool_config,
+                      on_connect=lambda seconds: db_connect_duration_seconds.observe(seconds, "sync"))
+
+# One pool per read replica, with the credentials and settings of the primary
+replica_pools = {
+    replica.name: ConnectionPool(dict(db_config, host=replica.host, port=replica.port), **pool_config,
+                                 on_connect=lambda seconds: db_connect_duration_seconds.observe(seconds, "sync"))
+    for replica in replicas.replicas
+}
+
+
+def dispose_pools():
+    """
+    Close the idle connections of the primary and replica pools.
+    """
+    pool.dispose()
+    for replica_pool in replica_pools.values():
+        replica_pool.dispose()
+
+
+def check_replica(replica, pooled):
+    """
+    Check the lag of a replica on a connection taken from it, ejecting the replica if needed.
+
+    Args:
+        replica (Replica): The replica.
+        pooled (PooledConnection): A connection to the replica.
+
+    Returns:
+        bool: Whether the replica can serve reads.
+    """
+    cursor = pooled.connection.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute(replica.status_query)
+        except mysql.connector.Error as err:
+            if not replica.unsupported_status_query(err.errno):
+                raise
+            cursor.execute(replica.status_query)
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    return replica.record_status(rows[0] if rows else None)
+
+
 class DatabaseConnection:
     """
     A context manager for managing MySQL database connections.
 
+    Connections are checked out of the shared pool on first use and returned to it on exit.
+    The cursor is instrumented, so every statement is timed in the /metrics endpoint, and runs the
+    statements a pooled connection executes repeatedly as server-side prepared statements, kept open
+    with the connection across requests.
+
+    Read-only connections go to a read replica when MYSQL_REPLICA_HOSTS lists some, unless the
+    user they read for has just written; they fall back to the primary when no replica is healthy.
+
     Usage:
         with DatabaseConnection() as (connection, cursor):
             # Database operations here
 
+        with DatabaseConnection(readonly=True, user_id=user_id) as (connection, cursor):
+            # Reads that may be served by a replica
+
     Attributes:
+        readonly (bool): Whether the connection may go to a replica.
+        user_id (int): The user the reads are made for, if any.
+        replica (Replica): The replica the connection goes to, or None for the primary.
         db_connection (mysql.connector.MySQLConnection): The database connection.
-        db_cursor (mysql.connector.cursor.MySQLCursor): The database cursor.
+        db_cursor (InstrumentedCursor): The database cursor.
     """
 
-    def __init__(self):
-        try:
-            self.db_connection = mysql.connector.connect(**db_config)
-            self.db_cursor = self.db_connection.cursor(dictionary=True)
-        except mysql.connector.Error as err:
-            print(f"Error during database connection: {err}")
-            self.db_connection = None
-            self.db_cursor = None
+    def __init__(self, readonly=False, user_id=None):
+        self.readonly = readonly
+        self.user_id = user_id
+        self.replica = None
+        self.pooled = None
+        self.db_connection = None
+        self.db_cursor = None
+
+    def _acquire(self):
+        for replica in route(self.readonly, self.user_id):
+            check = replica.claim_check()
+            if not check and not replica.healthy:
+                # Its first check, or the one after an ejection, runs on another connection
+                continue
+            replica_pool = replica_pools[replica.name]
+            try:
+                pooled = replica_pool.acquire()
+            except mysql.connector.Error as err:
+                replica.eject(str(err))
+                continue
+            try:
+                if check and not check_replica(replica, pooled):
+                    replica_pool.release(pooled)
+                    continue
+            except mysql.connector.Error as err:
+                replica_pool.release(pooled, discard=True)
+                replica.eject(str(err))
+                continue
+            return replica, pooled
+        return None, pool.acquire()
+
+    def _pool(self):
+        return pool if self.replica is None else replica_pools[self.replica.name]
+
+    def checkout(self):
+        """
+        Check a connection out of the pool unless this instance already holds one.
+
+        Returns:
+            tuple: The database connection and its dictionary cursor.
+        """
+        if self.pooled is None:
+            started = time.perf_counter()
+            self.replica, self.pooled = self._acquire()
+            db_acquire_duration_seconds.observe(time.perf_counter() - started, "sync")
+            self.db_connection = self.pooled.connection
+            if self.pooled.statements is None:
+                self.pooled.statements = StatementCache(self.db_connection, MYSQL_STATEMENT_CACHE_SIZE)
+            self.db_cursor = InstrumentedCursor(
+                PreparedCursor(self.db_connection.cursor(dictionary=True), self.pooled.statements))
+        return self.db_connection, self.db_cursor
+
+    def close(self, discard=False):
+        """
+        Close the cursor and return the connection to the pool.
+
+        Args:
+            discard (bool): Close the connection instead of returning it to the pool.
+        """
+        if self.db_cursor:
+            try:
+                self.db_cursor.close()
+            except mysql.connector.Error:
+                discard = True
+        if self.pooled:
+            self._pool().release(self.pooled, discard=discard)
+        self.replica = None
+        self.pooled = None
+        self.db_connection = None
+        self.db_cursor = None
 
     def user_exists(self, user_id):
         """
@@ -48,6 +186,7 @@ class DatabaseConnection:
             bool: True if the user exists, False otherwise.
         """
         try:
+            self.checkout()
             query = "SELECT COUNT(*) FROM users WHERE id = %s"
             self.db_cursor.execute(query, (user_id,))
             result = self.db_cursor.fetchone()
@@ -57,7 +196,7 @@ class DatabaseConnection:
             else:
                 return False  # User does not exist
         except mysql.connector.Error as err:
-            print(f"Error checking user existence: {err}")
+            logger.error("Error checking user existence: %s", err)
             return False
 
     def drink_exists(self, drink_id):
@@ -71,6 +210,7 @@ class DatabaseConnection:
             bool: True if the drink exists, False otherwise.
         """
         try:
+            self.checkout()
             query = "SELECT COUNT(*) FROM drink WHERE id = %s"
             self.db_cursor.execute(query, (drink_id,))
             result = self.db_cursor.fetchone()
@@ -80,27 +220,12 @@ class DatabaseConnection:
             else:
                 return False  # Drink does not exist
         except mysql.connector.Error as err:
-            print(f"Error checking drink existence: {err}")
+            logger.error("Error checking drink existence: %s", err)
             return False
 
     def __enter__(self):
-        try:
-            self.db_connection = mysql.connector.connect(**db_config)
-            self.db_cursor = self.db_connection.cursor(dictionary=True)
-            return self.db_connection, self.db_cursor
-        except mysql.connector.Error as err:
-            raise err
+        return self.checkout()
 
     def __exit__(self, exc_type, exc_value, traceback):
-        if self.db_cursor:
-            self.db_cursor.close()
-        if self.db_connection:
-            self.db_connection.close()
-
+        self.close(discard=is_disconnect_error(exc_value))
 
-# Using the MySQL database connection with a context manager
-with DatabaseConnection() as (connection, cursor):
-    if connection is not None and cursor is not None:
-        print("Database connection succeeded.")
-    else:
-        print("Database connection failed. Please check connection parameters.")
@@ -0,0 +1,142 @@
+import time
+
+from services.metrics import (
+    db_rows_returned,
+    db_statement_duration_seconds,
+    db_statement_errors_total,
+    sql_operation,
+)
+from services.tracing import record_query
+
+
+class InstrumentedCursor:
+    """
+    Wraps a mysql.connector cursor to time every statement and count the rows it returns.
+
+    Statements are also added to the trace of the current request, and logged when slow.
+
+    Every other attribute (lastrowid, rowcount, ...) is read from the wrapped cursor.
+
+    Usage:
+        cursor = InstrumentedCursor(connection.cursor(dictionary=True))
+
+    Attributes:
+        cursor (mysql.connector.cursor.MySQLCursor): The wrapped cursor.
+        pool (str): The pool label of the metrics.
+    """
+
+    def __init__(self, cursor, pool="sync"):
+        self.cursor = cursor
+        self.pool = pool
+        self._operation = None
+        self._rows = 0
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def _start(self, query):
+        self._flush_rows()
+        self._operation = sql_operation(query)
+        return time.perf_counter()
+
+    def _finish(self, started, failed, query, params, many=False):
+        seconds = time.perf_counter() - started
+        db_statement_duration_seconds.observe(seconds, self.pool, self._operation)
+        record_query(query, params, seconds, many)
+        if failed:
+            db_statement_errors_total.inc(self.pool, self._operation)
+            self._operation = None
+
+    def _flush_rows(self):
+        # The rows of a statement are reported once the next statement starts or the cursor closes
+        if self._operation == "select":
+            db_rows_returned.observe(self._rows, self.pool, self._operation)
+        self._operation = None
+        self._rows = 0
+
+    def _count(self, rows):
+        self._rows += len(rows)
+        return rows
+
+    def _count_one(self, row):
+        if row is not None:
+            self._rows += 1
+        return row
+
+    def execute(self, query, params=None, *args, **kwargs):
+        started = self._start(query)
+        try:
+            result = self.cursor.execute(query, params, *args, **kwargs)
+        except Exception:
+            self._finish(started, True, query, params)
+            raise
+        self._finish(started, False, query, params)
+        return result
+
+    def executemany(self, query, seq_params, *args, **kwargs):
+        started = self._start(query)
+        try:
+            result = self.cursor.executemany(query, seq_params, *args, **kwargs)
+        except Exception:
+            self._finish(started, True, query, seq_params, many=True)
+            raise
+        self._finish(started, False, query, seq_params, many=True)
+        return result
+
+    def fetchone(self):
+        return self._count_one(self.cursor.fetchone())
+
+    def fetchmany(self, *args, **kwargs):
+        return self._count(self.cursor.fetchmany(*args, **kwargs))
+
+    def fetchall(self):
+        return self._count(self.cursor.fetchall())
+
+    def close(self):
+        self._flush_rows()
+        return self.cursor.close()
+
+
+class AsyncInstrumentedCursor(InstrumentedCursor):
+    """
+    Wraps an aiomysql cursor to time every statement and count the rows it returns.
+
+    Usage:
+        cursor = AsyncInstrumentedCursor(await connection.cursor())
+    """
+
+    def __init__(self, cursor, pool="async"):
+        super().__init__(cursor, pool)
+
+    async def execute(self, query, params=None):
+        started = self._start(query)
+        try:
+            result = await self.cursor.execute(query, params)
+        except Exception:
+            self._finish(started, True, query, params)
+            raise
+        self._finish(started, False, query, params)
+        return result
+
+    async def executemany(self, query, seq_params):
+        started = self._start(query)
+        try:
+            result = await self.cursor.executemany(query, seq_params)
+        except Exception:
+            self._finish(started, True, query, seq_params, many=True)
+            raise
+        self._finish(started, False, query, seq_params, many=True)
+        return result
+
+    async def fetchone(self):
+        return self._count_one(await self.cursor.fetchone())
+
+    async def fetchmany(self, size=None):
+        return self._count(await self.cursor.fetchmany(size))
+
+    async def fetchall(self):
+        return self._count(await self.cursor.fetchall())
+
+    async def close(self):
+        self._flush_rows()
+        await self.cursor.close()
@@ -0,0 +1,243 @@
+import threading
+import time
+
+import mysql.connector
+from mysql.connector.errors import InterfaceError, OperationalError, PoolError
+
+
+class PoolTimeoutError(PoolError):
+    """
+    Raised when no connection could be checked out of the pool before the wait timeout.
+    """
+
+
+class PooledConnection:
+    """
+    A MySQL connection owned by a ConnectionPool.
+
+    Attributes:
+        connection (mysql.connector.MySQLConnection): The underlying database connection.
+        created_at (float): Monotonic time at which the connection was opened.
+        last_used (float): Monotonic time at which the connection was last returned to the pool.
+        statements (StatementCache): The prepared statements of the connection, created on first checkout.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.statements = None
+
+    def close(self):
+        try:
+            self.connection.close()
+        except mysql.connector.Error:
+            pass
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of MySQL connections.
+
+    The pool keeps up to `size` idle connections open and allows `max_overflow` extra
+    connections to be opened under bursts; overflow connections are closed when they are
+    returned. Connections are validated on checkout: they are replaced when they exceed
+    the recycle age, have been idle for longer than the idle timeout, or fail a ping.
+
+    Usage:
+        pool = ConnectionPool(db_config, size=5)
+        pooled = pool.acquire()
+        try:
+            # Database operations with pooled.connection
+        finally:
+            pool.release(pooled)
+
+    Attributes:
+        size (int): Number of connections kept open in the pool.
+        max_overflow (int): Number of connections allowed beyond `size`.
+        timeout (float): Seconds to wait for a free connection before giving up.
+        idle_timeout (float): Seconds after which an idle connection is reopened.
+        recycle (float): Seconds after which a connection is reopened regardless of use.
+        ping (bool): Whether to ping connections on checkout.
+        on_connect (callable): Called with the seconds spent opening each new connection.
+    """
+
+    def __init__(self, connect_args, size=5, max_overflow=10, timeout=30.0,
+                 idle_timeout=300.0, recycle=3600.0, ping=True, on_connect=None):
+        self.connect_args = connect_args
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.recycle = recycle
+        self.ping = ping
+        self.on_connect = on_connect
+
+        self._idle = []
+        self._opened = 0
+        self._condition = threading.Condition()
+
+    def _connect(self):
+        started = time.perf_counter()
+        pooled = PooledConnection(mysql.connector.connect(**self.connect_args))
+        if self.on_connect:
+            self.on_connect(time.perf_counter() - started)
+        return pooled
+
+    def _is_stale(self, pooled):
+        now = time.monotonic()
+        if self.recycle and now - pooled.created_at > self.recycle:
+            return True
+        if self.idle_timeout and now - pooled.last_used > self.idle_timeout:
+            return True
+        return False
+
+    def _is_alive(self, pooled):
+        if not self.ping:
+            return True
+        try:
+            pooled.connection.ping(reconnect=False)
+            return True
+        except mysql.connector.Error:
+            return False
+
+    def _discard(self, pooled):
+        pooled.close()
+        with self._condition:
+            self._opened -= 1
+            self._condition.notify()
+
+    def acquire(self):
+        """
+        Check a connection out of the pool, opening a new one if allowed.
+
+        Returns:
+            PooledConnection: A validated connection, to be handed back with release().
+
+        Raises:
+            PoolTimeoutError: If no connection became available within the wait timeout.
+            mysql.connector.Error: If opening a new connection fails.
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._condition:
+                while not self._idle and self._opened >= self.size + self.max_overflow:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            f"No database connection available after {self.timeout} seconds")
+                    self._condition.wait(remaining)
+
+                if self._idle:
+                    # Most recently used first, so the connections beyond the steady
+                    # load age out through the idle timeout
+                    pooled = self._idle.pop()
+                else:
+                    pooled = None
+                    self._opened += 1
+
+            if pooled is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    with self._condition:
+                        self._opened -= 1
+                        self._condition.notify()
+                    raise
+
+            if self._is_stale(pooled) or not self._is_alive(pooled):
+                self._discard(pooled)
+                continue
+            return pooled
+
+    def release(self, pooled, discard=False):
+        """
+        Return a connection to the pool.
+
+        Any transaction left open by the caller is rolled back so the next user starts
+        from a clean session.
+
+        Args:
+            pooled (PooledConnection): The connection obtained from acquire().
+            discard (bool): Close the connection instead of keeping it, e.g. after a network error.
+        """
+        if not discard:
+            try:
+                if pooled.connection.in_transaction:
+                    pooled.connection.rollback()
+            except mysql.connector.Error:
+                discard = True
+
+        with self._condition:
+            if not discard and len(self._idle) < self.size:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+                self._condition.notify()
+                return
+            self._opened -= 1
+            self._condition.notify()
+        pooled.close()
+
+    def warm(self, count):
+        """
+        Open connections until `count` of them are idle, so the first requests do not wait for a connect.
+
+        Args:
+            count (int): The number of idle connections wanted, capped at `size`.
+
+        Raises:
+            mysql.connector.Error: If opening a connection fails.
+        """
+        while True:
+            with self._condition:
+                if len(self._idle) >= min(count, self.size) or self._opened >= self.size + self.max_overflow:
+                    return
+                self._opened += 1
+            try:
+                pooled = self._connect()
+            except Exception:
+                with self._condition:
+                    self._opened -= 1
+                    self._condition.notify()
+                raise
+            self.release(pooled)
+
+    def dispose(self):
+        """
+        Close every idle connection. Checked-out connections are closed when released.
+        """
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+            self._condition.notify_all()
+        for pooled in idle:
+            pooled.close()
+
+    def status(self):
+        """
+        Describe the current state of the pool.
+
+        Returns:
+            dict: The pool size limits and the number of open, idle and checked-out connections.
+        """
+        with self._condition:
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "opened": self._opened,
+                "idle": len(self._idle),
+                "checked_out": self._opened - len(self._idle),
+            }
+
+
+def is_disconnect_error(error):
+    """
+    Tell whether an exception means the connection itself can no longer be trusted.
+
+    Args:
+        error (BaseException): The exception raised while using a pooled connection.
+
+    Returns:
+        bool: True if the connection should be discarded instead of returned to the pool.
+    """
+    return isinstance(error, (InterfaceError, OperationalError))
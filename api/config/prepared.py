@@ -0,0 +1,227 @@
+import logging
+
+import mysql.connector
+from mysql.connector.errors import InterfaceError, get_mysql_exception
+
+from config.settings import env_number
+from services.metrics import db_prepared_statements_total, sql_operation
+
+logger = logging.getLogger(__name__)
+
+# Server-side prepared statements kept open on each pooled connection (0 disables them)
+MYSQL_STATEMENT_CACHE_SIZE = env_number("MYSQL_STATEMENT_CACHE_SIZE", 32)
+
+# Statements worth preparing; the others (SHOW, DDL, transactions) always use the text protocol
+PREPARED_OPERATIONS = {"select", "insert", "update", "delete", "replace"}
+
+# "This command is not supported in the prepared statement protocol yet"
+ER_UNSUPPORTED_PS = 1295
+
+
+def server_error(err):
+    """
+    Rebuild the error the text protocol raises for a server error of a prepared statement.
+
+    The C extension of mysql.connector reports every error of a prepared statement as an InterfaceError
+    without errno, keeping the MySQL error as its cause: a duplicate key would not be an IntegrityError,
+    and the pool would discard the connection as if it had dropped.
+
+    Args:
+        err (mysql.connector.Error): The error raised by the prepared cursor.
+
+    Returns:
+        mysql.connector.Error: The error matching the MySQL error number, or err itself if it has none
+        or is a client error such as a lost connection.
+    """
+    cause = err.__cause__
+    errno = getattr(cause, "errno", None)
+    # Client errors (CR_*, 2000-2999) are InterfaceError with the text protocol too
+    if not isinstance(err, InterfaceError) or not errno or 2000 <= errno < 3000:
+        return err
+    return get_mysql_exception(errno, msg=getattr(cause, "msg", None) or str(err),
+                               sqlstate=getattr(cause, "sqlstate", None))
+
+
+class StatementCache:
+    """
+    The server-side prepared statements of one connection, by SQL text, evicting the least recently used.
+
+    A statement is prepared the second time its SQL text is executed on the connection, so SQL built for
+    a single call, such as an IN list of a given length, does not push out the statements run on every
+    request. Each statement lives in its own prepared cursor: the server parses it once, and every later
+    execution only sends the parameters.
+
+    Usage:
+        entry = cache.get(query)
+        if entry is not None:
+            statement, cursor = entry
+            cursor.execute(statement, params)
+
+    Attributes:
+        connection (mysql.connector.MySQLConnection): The connection the statements belong to.
+        capacity (int): Statements kept prepared at most.
+        hits (int): Executions that reused a prepared statement.
+        misses (int): Executions that found none.
+        evictions (int): Statements closed to make room for another.
+    """
+
+    def __init__(self, connection, capacity):
+        self.connection = connection
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # SQL text -> (SQL text, prepared cursor), least recently used first
+        self._cursors = {}
+        # SQL text executed once without being prepared, oldest first
+        self._seen = {}
+        # SQL text the server refused to prepare
+        self._unsupported = set()
+
+    def get(self, query):
+        """
+        Return the prepared cursor of a statement, preparing it if it was already seen.
+
+        Args:
+            query (str): The SQL text, with %s placeholders.
+
+        Returns:
+            tuple: The SQL text to execute and its prepared cursor, or None if the statement must go
+            through the text protocol.
+        """
+        if not self.capacity or query in self._unsupported or sql_operation(query) not in PREPARED_OPERATIONS:
+            return None
+        entry = self._cursors.pop(query, None)
+        if entry is not None:
+            self._cursors[query] = entry
+            self.hits += 1
+            db_prepared_statements_total.inc("hit")
+            return entry
+
+        self.misses += 1
+        db_prepared_statements_total.inc("miss")
+        if self._seen.pop(query, None) is None:
+            self._seen[query] = True
+            if len(self._seen) > 4 * self.capacity:
+                del self._seen[next(iter(self._seen))]
+            return None
+
+        if len(self._cursors) >= self.capacity:
+            self.evictions += 1
+            db_prepared_statements_total.inc("evicted")
+            self._evict(next(iter(self._cursors)))
+        # The prepared cursor prepares again whenever it is handed another string object than the last
+        # one, so it is always executed with the string it was first prepared from
+        entry = self._cursors[query] = (query, self.connection.cursor(prepared=True, dictionary=True))
+        return entry
+
+    def unsupported(self, query):
+        """
+        Send a statement the server cannot prepare through the text protocol from now on.
+
+        Args:
+            query (str): The SQL text.
+        """
+        self._unsupported.add(query)
+        self._evict(query)
+
+    def _evict(self, query):
+        entry = self._cursors.pop(query, None)
+        if entry is None:
+            return
+        try:
+            # Deallocates the statement on the server
+            entry[1].close()
+        except mysql.connector.Error as err:
+            logger.warning("Closing a prepared statement failed: %s", err)
+
+
+class PreparedCursor:
+    """
+    A dictionary cursor that executes the statements it sees repeatedly as server-side prepared statements.
+
+    execute() with a tuple or list of parameters goes through the StatementCache of the connection;
+    statements without parameters, with named parameters, and executemany(), which mysql.connector
+    rewrites into a single multi-row INSERT, use the plain cursor. The rows, lastrowid and rowcount are
+    read from the cursor that ran the last statement. Errors of prepared statements are raised as the
+    text protocol raises them, e.g. IntegrityError for a duplicate key.
+
+    Usage:
+        cursor = PreparedCursor(connection.cursor(dictionary=True), statements)
+
+    Attributes:
+        cursor: The plain dictionary cursor.
+        statements (StatementCache): The prepared statements of the connection.
+    """
+
+    def __init__(self, cursor, statements):
+        self.cursor = cursor
+        self.statements = statements
+        self._current = cursor
+        # Whether the last statement may have rows left to read
+        self._unread = False
+
+    def __getattr__(self, name):
+        return getattr(self._current, name)
+
+    def _drain(self):
+        # Rows left unread by the previous statement would block the next one, run by another cursor
+        if self._unread:
+            self._unread = False
+            self._current.fetchall()
+
+    def execute(self, query, params=None, *args, **kwargs):
+        self._drain()
+        entry = None
+        if isinstance(params, (tuple, list)) and not args and not kwargs:
+            entry = self.statements.get(query)
+        if entry is None:
+            self._current = self.cursor
+            result = self.cursor.execute(query, params, *args, **kwargs)
+            self._unread = True
+            return result
+
+        statement, self._current = entry
+        try:
+            result = self._current.execute(statement, params)
+        except mysql.connector.Error as err:
+            error = server_error(err)
+            if error.errno != ER_UNSUPPORTED_PS:
+                if error is err:
+                    raise
+                raise error from err
+        else:
+            self._unread = True
+            return result
+        logger.info("Statement not supported by the prepared protocol, using the text protocol: %s", query)
+        self.statements.unsupported(query)
+        self._current = self.cursor
+        result = self.cursor.execute(query, params)
+        self._unread = True
+        return result
+
+    def executemany(self, query, seq_params, *args, **kwargs):
+        self._drain()
+        self._current = self.cursor
+        return self.cursor.executemany(query, seq_params, *args, **kwargs)
+
+    def fetchone(self):
+        row = self._current.fetchone()
+        if row is None:
+            self._unread = False
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        return self._current.fetchmany(*args, **kwargs)
+
+    def fetchall(self):
+        self._unread = False
+        return self._current.fetchall()
+
+    def close(self):
+        # The prepared cursors stay open with the connection for the next requests
+        try:
+            self._drain()
+        finally:
+            self._current = self.cursor
+            self.cursor.close()
@@ -0,0 +1,273 @@
+import itertools
+import logging
+import os
+import threading
+import time
+
+from config.settings import env_number
+
+logger = logging.getLogger(__name__)
+
+# Replicas lagging further behind the primary, in seconds, stop receiving reads
+REPLICA_MAX_LAG = env_number("MYSQL_REPLICA_MAX_LAG", 5.0, float)
+# Seconds between two lag checks of a replica, run on the next connection taken from it
+REPLICA_CHECK_INTERVAL = env_number("MYSQL_REPLICA_CHECK_INTERVAL", 5.0, float)
+# Seconds a failing or lagging replica is left out before being tried again
+REPLICA_EJECT_SECONDS = env_number("MYSQL_REPLICA_EJECT_SECONDS", 30.0, float)
+# Seconds during which the reads of a user who just wrote go to the primary
+READ_YOUR_WRITES_WINDOW = env_number("READ_YOUR_WRITES_WINDOW", 5.0, float)
+# Accept hosts that are not replicas as up to date (1), e.g. to try the routing locally, instead of ejecting them (0)
+REPLICA_ALLOW_STANDALONE = bool(env_number("MYSQL_REPLICA_ALLOW_STANDALONE", 0))
+
+# MySQL 8.0.22 and later; older servers only know SHOW SLAVE STATUS, which reports Seconds_Behind_Master
+REPLICA_STATUS_QUERY = "SHOW REPLICA STATUS"
+LEGACY_REPLICA_STATUS_QUERY = "SHOW SLAVE STATUS"
+# Raised by a server that does not know the statement
+ER_PARSE_ERROR = 1064
+
+
+class Replica:
+    """
+    A read replica and what the last lag check found.
+
+    Attributes:
+        host (str): The host of the replica.
+        port (int): The port of the replica.
+        allow_standalone (bool): Whether a host that is not a replica counts as up to date.
+        lag (float): The replication lag in seconds at the last check, if known.
+        healthy (bool): Whether the last check passed.
+        error (str): Why the replica was last ejected, if it was.
+        status_query (str): The statement reporting the lag, downgraded on servers older than MySQL 8.0.22.
+    """
+
+    def __init__(self, host, port, max_lag, check_interval, eject_seconds, allow_standalone=False):
+        self.host = host
+        self.port = port
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.eject_seconds = eject_seconds
+        self.allow_standalone = allow_standalone
+        self.lag = None
+        self.healthy = False
+        self.error = None
+        self.status_query = REPLICA_STATUS_QUERY
+        self.checked_at = float("-inf")
+        self.ejected_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def name(self):
+        return "%s:%s" % (self.host, self.port)
+
+    @property
+    def available(self):
+        return time.monotonic() >= self.ejected_until
+
+    @property
+    def check_due(self):
+        return time.monotonic() - self.checked_at >= self.check_interval
+
+    def claim_check(self):
+        """
+        Take the next lag check if it is due, so that concurrent connections do not all run it.
+
+        Returns:
+            bool: True if the caller must run the check, False if it is not due or another caller runs it.
+        """
+        with self._lock:
+            if not self.check_due:
+                return False
+            self.checked_at = time.monotonic()
+            return True
+
+    def unsupported_status_query(self, errno):
+        """
+        Switch to LEGACY_REPLICA_STATUS_QUERY if the server rejected the current status query as unknown.
+
+        Args:
+            errno (int): The MySQL error number raised by the status query.
+
+        Returns:
+            bool: True if the check must be run again with the new status_query.
+        """
+        if errno != ER_PARSE_ERROR or self.status_query == LEGACY_REPLICA_STATUS_QUERY:
+            return False
+        self.status_query = LEGACY_REPLICA_STATUS_QUERY
+        return True
+
+    def eject(self, reason):
+        """
+        Stop sending reads to the replica for eject_seconds.
+
+        Args:
+            reason (str): Why the replica is left out, reported by /readyz.
+        """
+        self.error = reason
+        self.healthy = False
+        self.checked_at = float("-inf")
+        self.ejected_until = time.monotonic() + self.eject_seconds
+        logger.warning("Replica %s ejected for %.0f s: %s", self.name, self.eject_seconds, reason)
+
+    def record_status(self, row):
+        """
+        Record the result of the status query, ejecting the replica if it lags too far behind.
+
+        A host returning no row is not a replica: its data may be unrelated to the primary, so it is
+        ejected unless allow_standalone is set.
+
+        Args:
+            row (dict): The first row returned by the query, or None.
+
+        Returns:
+            bool: Whether the replica can serve reads.
+        """
+        self.checked_at = time.monotonic()
+        if row is None:
+            if not self.allow_standalone:
+                self.lag = None
+                self.eject("Not a replica: %s returned no row" % self.status_query)
+                return False
+            self.lag = 0.0
+        else:
+            lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+            if lag is None:
+                self.lag = None
+                self.eject("Replication is not running")
+                return False
+            self.lag = float(lag)
+            if self.lag > self.max_lag:
+                self.eject("Lagging %.0f s behind the primary" % self.lag)
+                return False
+        self.error = None
+        self.healthy = True
+        return True
+
+    def status(self):
+        return {"available": self.available, "lag": self.lag, "error": self.error}
+
+
+class ReplicaSet:
+    """
+    The read replicas, handed out round-robin while they are healthy.
+
+    Nothing checks the replicas in the background: once check_interval has passed, the connection
+    classes check the lag of a replica on the next connection they take from it, and eject it when the
+    check or the connection fails. Only the connection that claimed the check runs it; the others keep
+    using the replica meanwhile if its previous check passed, and skip it otherwise. Callers fall back
+    to the primary when no replica is available.
+
+    Usage:
+        for replica in replicas.candidates():
+            check = replica.claim_check()
+            if not check and not replica.healthy:
+                continue
+            # Connect to the replica and check it if `check`, moving on to the next one on failure
+        # Connect to the primary
+
+    Attributes:
+        replicas (list): The Replica instances.
+    """
+
+    def __init__(self, replicas):
+        self.replicas = replicas
+        self._turn = itertools.count()
+
+    def candidates(self):
+        """
+        Return the available replicas, starting with the next one in the round-robin order.
+
+        Returns:
+            list: The replicas to try in order, empty if reads must go to the primary.
+        """
+        if not self.replicas:
+            return []
+        start = next(self._turn) % len(self.replicas)
+        rotated = self.replicas[start:] + self.replicas[:start]
+        return [replica for replica in rotated if replica.available]
+
+    def status(self):
+        return {replica.name: replica.status() for replica in self.replicas}
+
+
+class RecentWriters:
+    """
+    The users who wrote within the last `window` seconds, whose reads are sent to the primary.
+
+    The set belongs to the process: with several workers, a read served by another worker than the
+    write may still hit a lagging replica, within MYSQL_REPLICA_MAX_LAG.
+
+    Attributes:
+        window (float): Seconds after a write during which the user reads from the primary.
+        max_size (int): Users remembered at most, the oldest writes being forgotten first.
+    """
+
+    def __init__(self, window, max_size=100000):
+        self.window = window
+        self.max_size = max_size
+        # user ID -> end of the window, in insertion order
+        self._until = {}
+        self._lock = threading.Lock()
+
+    def record(self, user_id):
+        """
+        Send the reads of a user to the primary for the next `window` seconds.
+
+        Args:
+            user_id (int): The ID of the user who wrote.
+        """
+        now = time.monotonic()
+        # Path parameters arrive as strings, token IDs as integers
+        key = str(user_id)
+        with self._lock:
+            self._until.pop(key, None)
+            self._until[key] = now + self.window
+            for writer, until in list(self._until.items()):
+                if until > now and len(self._until) <= self.max_size:
+                    break
+                del self._until[writer]
+
+    def active(self, user_id):
+        return self._until.get(str(user_id), 0.0) > time.monotonic()
+
+
+def parse_hosts(value, default_port):
+    """
+    Parse a comma-separated list of host[:port].
+
+    Args:
+        value (str): The list, possibly empty or None.
+        default_port (int): The port of the hosts that do not give one.
+
+    Returns:
+        list: The (host, port) pairs.
+    """
+    hosts = []
+    for item in (value or "").split(","):
+        item = item.strip()
+        if item:
+            host, _, port = item.partition(":")
+            hosts.append((host, int(port or default_port)))
+    return hosts
+
+
+replicas = ReplicaSet([
+    Replica(host, port, REPLICA_MAX_LAG, REPLICA_CHECK_INTERVAL, REPLICA_EJECT_SECONDS, REPLICA_ALLOW_STANDALONE)
+    for host, port in parse_hosts(os.getenv("MYSQL_REPLICA_HOSTS"), int(os.getenv("MYSQL_PORT") or 3306))
+])
+recent_writers = RecentWriters(READ_YOUR_WRITES_WINDOW)
+
+
+def route(readonly, user_id=None):
+    """
+    Pick the replicas a connection may use.
+
+    Args:
+        readonly (bool): Whether the connection only reads.
+        user_id (int): The user the reads are made for, to send them to the primary right after a write.
+
+    Returns:
+        list: The replicas to try in order, empty if the connection must go to the primary.
+    """
+    if not readonly or (user_id is not None and recent_writers.active(user_id)):
+        return []
+    return replicas.candidates()
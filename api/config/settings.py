@@ -0,0 +1,15 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables from the .env file
+load_dotenv(".env")
+
+
+def env_number(name, default, cast=int):
+    """
+    Read a numeric setting from the environment, falling back to a default when unset or empty.
+    """
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return cast(value)
@@ -1,16 +1,94 @@
-from fastapi import FastAPI
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from starlette.routing import Match
+
+from config.async_database import close_pool
+from config.database import dispose_pools
+from services.metrics import http_request_duration_seconds, http_requests_in_progress, http_requests_total
+from services.passwords import password_hasher
+from services.tracing import check_query_count, end_trace, start_trace
+from services.warmup import warmup
+from services.write_behind import drain
 
 from routers.drinks import router as create_drinks_router
 from routers.admin import router as admin_router
 from routers.authentication import router as authentication_router
 from routers.ratings import router as ratings_router
+from routers.metrics import router as metrics_router
+from routers.health import router as health_router
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Warm the pools, the catalog and the leaderboard in the background: the worker starts
+    # accepting requests at once and /readyz reports when it is warm
+    warmup_task = asyncio.create_task(warmup.run())
+    yield
+    warmup_task.cancel()
+    # Write the queued likes and favorites while the pools are still open
+    await asyncio.to_thread(drain)
+    # Release the connections held by both pools
+    await close_pool()
+    dispose_pools()
+    password_hasher.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.include_router(create_drinks_router)
 app.include_router(admin_router)
 app.include_router(authentication_router)
 app.include_router(ratings_router)
+app.include_router(metrics_router)
+app.include_router(health_router)
+
+
+def route_template(request):
+    """
+    Find the path template of the route handling a request, e.g. "/perso-drinks/{user_id}".
+
+    Metrics are labelled with the template so that every user ID does not create a new series.
+    """
+    partial = None
+    for route in app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            # Path known but method not allowed
+            partial = route.path
+    return partial or "<unmatched>"
+
+
+@app.middleware("http")
+async def instrument_request(request: Request, call_next):
+    """
+    Record the request metrics and trace the queries run by the request.
+
+    The response reports the query count and database time in the Server-Timing and
+    X-DB-Query-Count headers.
+    """
+    method, route = request.method, route_template(request)
+    http_requests_in_progress.inc(method, route)
+    trace, token = start_trace()
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["Server-Timing"] = trace.server_timing(time.perf_counter() - started)
+        response.headers["X-DB-Query-Count"] = str(trace.query_count)
+        return response
+    finally:
+        http_request_duration_seconds.observe(time.perf_counter() - started, method, route)
+        http_requests_total.inc(method, route, status)
+        http_requests_in_progress.dec(method, route)
+        check_query_count(trace, method, route)
+        end_trace(token)
+
 
 if __name__ == "__main__":
     import uvicorn
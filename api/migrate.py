@@ -0,0 +1,209 @@
+"""
+Apply the versioned schema migrations stored in the migrations directory.
+
+sql.sql creates the initial schema; every later change is a migrations/NNNN_description.sql file.
+Migrations run in version order and each applied one is recorded in the schema_migrations table.
+
+Usage, from the api directory:
+    python migrate.py status              # list applied and pending migrations
+    python migrate.py upgrade             # apply every pending migration
+    python migrate.py upgrade --target 2  # apply pending migrations up to version 2
+    python migrate.py sql --after 1       # print the SQL of migrations after version 1, without a database
+"""
+import argparse
+import hashlib
+import os
+import re
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+FILENAME_PATTERN = re.compile(r"^(\d+)_(\w+)\.sql$")
+TRACKING_TABLE_SQL = (
+    "CREATE TABLE IF NOT EXISTS schema_migrations ("
+    "version INTEGER NOT NULL PRIMARY KEY, "
+    "name VARCHAR(255) NOT NULL, "
+    "checksum CHAR(64) NOT NULL, "
+    "applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+)
+
+
+class MigrationError(Exception):
+    """
+    Raised when the migrations directory or the tracking table is inconsistent.
+    """
+
+
+class Migration:
+    """
+    A schema migration read from a SQL file.
+
+    Attributes:
+        version (int): The version number taken from the file name.
+        name (str): The description taken from the file name.
+        sql (str): The content of the file.
+        checksum (str): The SHA-256 of the content, to detect files edited after being applied.
+    """
+
+    def __init__(self, version, name, sql):
+        self.version = version
+        self.name = name
+        self.sql = sql
+        self.checksum = hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+    def statements(self):
+        """
+        Split the file into statements, dropping comment-only lines.
+
+        Returns:
+            list: The SQL statements, without their trailing semicolon.
+        """
+        lines = [line for line in self.sql.splitlines() if not line.strip().startswith("--")]
+        return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """
+    Read every migration file of a directory.
+
+    Args:
+        directory (str): The directory containing the NNNN_description.sql files.
+
+    Returns:
+        list: The migrations sorted by version.
+
+    Raises:
+        MigrationError: If two files share the same version.
+    """
+    migrations = {}
+    for filename in os.listdir(directory):
+        match = FILENAME_PATTERN.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Duplicate migration version {version}: {filename}")
+        with open(os.path.join(directory, filename), encoding="utf-8") as file:
+            migrations[version] = Migration(version, match.group(2), file.read())
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def ensure_tracking_table(cursor):
+    cursor.execute(TRACKING_TABLE_SQL)
+
+
+def applied_migrations(cursor):
+    """
+    Read the migrations recorded in the tracking table.
+
+    Args:
+        cursor (mysql.connector.cursor.MySQLCursorDict): The database cursor.
+
+    Returns:
+        dict: The tracking rows by version.
+    """
+    ensure_tracking_table(cursor)
+    cursor.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+    return {row['version']: row for row in cursor.fetchall()}
+
+
+def check_applied(migrations, applied):
+    """
+    Make sure every applied migration still matches its file.
+
+    Raises:
+        MigrationError: If an applied migration was edited or removed.
+    """
+    by_version = {migration.version: migration for migration in migrations}
+    for version, row in applied.items():
+        migration = by_version.get(version)
+        if migration is None:
+            raise MigrationError(f"Migration {version} ({row['name']}) is applied but its file is missing")
+        if migration.checksum != row['checksum']:
+            raise MigrationError(f"Migration {version} ({migration.name}) was modified after being applied")
+
+
+def upgrade(target=None):
+    """
+    Apply the pending migrations in version order.
+
+    Args:
+        target (int, optional): The last version to apply. Every pending migration when omitted.
+
+    Returns:
+        list: The migrations that were applied.
+    """
+    # Imported here so that the offline "sql" command never opens a connection
+    from config.database import DatabaseConnection
+
+    migrations = load_migrations()
+    done = []
+    with DatabaseConnection() as (conn, cursor):
+        applied = applied_migrations(cursor)
+        check_applied(migrations, applied)
+        for migration in migrations:
+            if migration.version in applied or (target is not None and migration.version > target):
+                continue
+            print(f"Applying {migration.version:04d}_{migration.name}")
+            for statement in migration.statements():
+                cursor.execute(statement)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                (migration.version, migration.name, migration.checksum)
+            )
+            conn.commit()
+            done.append(migration)
+    return done
+
+
+def status():
+    """
+    Print every migration with the date it was applied, or "pending".
+    """
+    from config.database import DatabaseConnection
+
+    migrations = load_migrations()
+    with DatabaseConnection() as (conn, cursor):
+        applied = applied_migrations(cursor)
+    check_applied(migrations, applied)
+    for migration in migrations:
+        row = applied.get(migration.version)
+        state = f"applied {row['applied_at']}" if row else "pending"
+        print(f"{migration.version:04d}_{migration.name}: {state}")
+
+
+def print_sql(after=0):
+    """
+    Print the SQL of the migrations after a version, for review or manual application.
+
+    Args:
+        after (int): The last version already applied to the target database.
+    """
+    print(f"{TRACKING_TABLE_SQL};\n")
+    for migration in load_migrations():
+        if migration.version <= after:
+            continue
+        print(f"-- {migration.version:04d}_{migration.name}")
+        for statement in migration.statements():
+            print(f"{statement};")
+        print(
+            "INSERT INTO schema_migrations (version, name, checksum) "
+            f"VALUES ({migration.version}, '{migration.name}', '{migration.checksum}');\n"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="list applied and pending migrations")
+    upgrade_parser = commands.add_parser("upgrade", help="apply pending migrations")
+    upgrade_parser.add_argument("--target", type=int, help="last version to apply")
+    sql_parser = commands.add_parser("sql", help="print the SQL of the migrations without connecting")
+    sql_parser.add_argument("--after", type=int, default=0, help="last version already applied")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        status()
+    elif args.command == "upgrade":
+        applied = upgrade(args.target)
+        print(f"{len(applied)} migration(s) applied")
+    else:
+        print_sql(args.after)
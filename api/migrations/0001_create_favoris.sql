@@ -0,0 +1,7 @@
+-- Création de la table "favoris" utilisée par routers/ratings.py, si elle n'existe pas déjà ;
+-- ses clés étrangères sont ajoutées par 0007, aussi sur les bases où elle existait
+CREATE TABLE IF NOT EXISTS favoris (
+  id SERIAL PRIMARY KEY,
+  user_id BIGINT UNSIGNED NOT NULL,
+  drink_created_id BIGINT UNSIGNED NOT NULL
+);
@@ -0,0 +1,4 @@
+-- Quantité de chaque supplément d'une boisson créée, lue par routers/drinks.py
+-- (perso-drinks, last-drinks) et renseignée à la création ; les lignes existantes
+-- valent 1, scripts/backfill_drink_supplements.py recopie ensuite les quantités du JSON
+ALTER TABLE drink_created_supplement_association ADD COLUMN quantity INTEGER NOT NULL DEFAULT 1;
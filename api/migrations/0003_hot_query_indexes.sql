@@ -0,0 +1,20 @@
+-- Index des requêtes par utilisateur de routers/drinks.py :
+-- WHERE user_id = ? AND id > ? ORDER BY id (perso-drinks) et ORDER BY id DESC (last-drinks)
+CREATE INDEX idx_drink_created_user_id ON drink_created (user_id, id);
+
+-- Jointure des suppléments d'une boisson créée (perso-drinks, last-drinks), index couvrant
+CREATE INDEX idx_drink_created_supplement_association_drink_created
+  ON drink_created_supplement_association (drink_created_id, supplement_id, quantity);
+
+-- Likes d'une boisson créée
+CREATE INDEX idx_drink_created_likes_drink_created_id ON drink_created_likes (drink_created_id);
+
+-- Un favori par utilisateur et par boisson créée ; sert aussi
+-- WHERE user_id = ? AND drink_created_id > ? ORDER BY drink_created_id (show-fav)
+DELETE duplicate FROM favoris duplicate
+  JOIN favoris original
+    ON original.user_id = duplicate.user_id
+   AND original.drink_created_id = duplicate.drink_created_id
+   AND original.id < duplicate.id;
+
+CREATE UNIQUE INDEX uq_favoris_user_id_drink_created_id ON favoris (user_id, drink_created_id);
@@ -0,0 +1,20 @@
+-- Un like par utilisateur et par boisson créée, et clés étrangères effectives
+-- (les REFERENCES en ligne de sql.sql sont ignorées par MySQL) pour que
+-- routers/ratings.py puisse insérer sans vérifications préalables
+DELETE duplicate FROM drink_created_likes duplicate
+  JOIN drink_created_likes original
+    ON original.user_id = duplicate.user_id
+   AND original.drink_created_id = duplicate.drink_created_id
+   AND original.id < duplicate.id;
+
+DELETE FROM drink_created_likes
+ WHERE user_id NOT IN (SELECT id FROM users)
+    OR drink_created_id NOT IN (SELECT id FROM drink_created);
+
+ALTER TABLE drink_created_likes
+  MODIFY user_id BIGINT UNSIGNED NOT NULL,
+  MODIFY drink_created_id BIGINT UNSIGNED NOT NULL,
+  ADD CONSTRAINT uq_drink_created_likes_user_id_drink_created_id UNIQUE (user_id, drink_created_id),
+  ADD CONSTRAINT fk_drink_created_likes_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+  ADD CONSTRAINT fk_drink_created_likes_drink_created
+    FOREIGN KEY (drink_created_id) REFERENCES drink_created(id) ON DELETE CASCADE;
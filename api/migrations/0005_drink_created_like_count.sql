@@ -0,0 +1,10 @@
+-- Compteur de likes maintenu par routers/ratings.py (add_like), initialisé depuis drink_created_likes
+ALTER TABLE drink_created ADD COLUMN like_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE drink_created dc
+  JOIN (SELECT drink_created_id, COUNT(*) AS likes FROM drink_created_likes GROUP BY drink_created_id) l
+    ON l.drink_created_id = dc.id
+   SET dc.like_count = l.likes;
+
+-- Classement des boissons les plus aimées (top-drinks)
+CREATE INDEX idx_drink_created_like_count ON drink_created (like_count, id);
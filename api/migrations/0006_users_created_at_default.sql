@@ -0,0 +1,3 @@
+-- Date d'inscription renseignée par MySQL : routers/authentication.py (signup)
+-- n'envoie pas created_at, refusé en mode strict sans valeur par défaut
+ALTER TABLE users MODIFY created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
@@ -0,0 +1,13 @@
+-- Clés étrangères de "favoris", y compris sur les bases où la table existait avant 0001
+-- (CREATE TABLE IF NOT EXISTS n'y a rien changé), pour que routers/ratings.py (add_fav)
+-- réponde 404 à un utilisateur ou une boisson créée inconnus
+DELETE FROM favoris
+ WHERE user_id NOT IN (SELECT id FROM users)
+    OR drink_created_id NOT IN (SELECT id FROM drink_created);
+
+ALTER TABLE favoris
+  MODIFY user_id BIGINT UNSIGNED NOT NULL,
+  MODIFY drink_created_id BIGINT UNSIGNED NOT NULL,
+  ADD CONSTRAINT fk_favoris_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+  ADD CONSTRAINT fk_favoris_drink_created
+    FOREIGN KEY (drink_created_id) REFERENCES drink_created(id) ON DELETE CASCADE;
@@ -0,0 +1,6 @@
+-- Versions des listes de chaque utilisateur, incrémentées dans la transaction de chaque écriture
+-- (services/http_cache.py) : les ETags de /perso-drinks, /last-drinks et /show-fav sont les mêmes
+-- dans tous les workers
+ALTER TABLE users
+  ADD COLUMN drinks_version BIGINT UNSIGNED NOT NULL DEFAULT 0,
+  ADD COLUMN favoris_version BIGINT UNSIGNED NOT NULL DEFAULT 0;
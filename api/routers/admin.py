@@ -1,9 +1,23 @@
-from fastapi import HTTPException, APIRouter
-from pydantic import BaseModel, Field
-from config.database import DatabaseConnection  # Import the new connection class
+import asyncio
+import csv
+import io
+import itertools
+import json
+import logging
+
+import aiomysql
+from fastapi import HTTPException, APIRouter, UploadFile
+from pydantic import BaseModel, Field, ValidationError
+from config.async_database import AsyncDatabaseConnection
+from services.catalog import catalog
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Rows written per multi-row statement and transaction by the bulk imports
+BULK_CHUNK_SIZE = 500
+
 
 class DrinksAdd(BaseModel):
     name: str = Field(..., description="The name is required")
@@ -31,6 +45,161 @@ class Supplement(BaseModel):
     type_id: int = Field(..., description="The type id is required")
 
 
+def read_upload_rows(file):
+    """
+    Read the rows of an NDJSON or CSV upload one at a time, without loading the whole file.
+
+    CSV is detected from the file name or content type; anything else is read as one JSON
+    object per line. Empty CSV cells are left out so that optional columns may stay blank.
+    Bytes that are not valid UTF-8 only reject the rows they belong to.
+
+    The upload is read from its spooled file, which blocks once it is on disk: iterate from
+    a worker thread.
+
+    Args:
+        file (UploadFile): The uploaded file.
+
+    Yields:
+        tuple: The line number, then the row as a dict, or None and an error message.
+    """
+    # Undecodable bytes become lone surrogates, detected row by row below
+    stream = io.TextIOWrapper(file.file, encoding="utf-8-sig", errors="surrogateescape", newline="")
+    try:
+        if (file.filename or "").lower().endswith(".csv") or file.content_type == "text/csv":
+            reader = csv.DictReader(stream)
+            for row in reader:
+                if not is_utf8(reader.fieldnames) or not is_utf8(row.values()):
+                    yield reader.line_num, None, "Invalid UTF-8"
+                    continue
+                yield reader.line_num, {key: value for key, value in row.items() if key and value}, None
+        else:
+            for line_number, line in enumerate(stream, start=1):
+                if not line.strip():
+                    continue
+                if not is_utf8([line]):
+                    yield line_number, None, "Invalid UTF-8"
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as err:
+                    yield line_number, None, f"Invalid JSON: {err}"
+                    continue
+                if not isinstance(row, dict):
+                    yield line_number, None, "Each line must be a JSON object"
+                    continue
+                yield line_number, row, None
+    finally:
+        # Leave the upload open: it is closed with the request
+        stream.detach()
+
+
+def next_rows(rows, count):
+    return list(itertools.islice(rows, count))
+
+
+def is_utf8(values):
+    try:
+        for value in values:
+            if isinstance(value, str):
+                value.encode("utf-8")
+            elif isinstance(value, list):
+                # Extra cells of a CSV row longer than its header
+                "".join(value).encode("utf-8")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def validation_messages(err):
+    return [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in err.errors()]
+
+
+async def bulk_import(file, parse_row, insert_query, upsert_query):
+    """
+    Validate the rows of an upload and write them in chunked, multi-row transactions.
+
+    The upload is streamed: only one chunk of rows is held in memory at a time. Rows without
+    an ID are inserted, rows with an ID are inserted or updated. Each chunk of BULK_CHUNK_SIZE rows is committed on its own; when the database rejects a chunk, its rows
+    are written again one by one so that only the rejected rows are reported. The catalog is
+    reloaded once the upload is processed, even if it stopped midway.
+
+    Args:
+        file (UploadFile): The NDJSON or CSV upload.
+        parse_row (callable): Turns a row into (has_id, values), raising ValueError or ValidationError.
+        insert_query (str): The INSERT statement for rows without an ID.
+        upsert_query (str): The INSERT ... ON DUPLICATE KEY UPDATE statement for rows with an ID.
+
+    Returns:
+        dict: The number of imported rows and the errors by line.
+    """
+    imported = 0
+    errors = []
+    rows = read_upload_rows(file)
+
+    try:
+        async with AsyncDatabaseConnection() as (conn, cursor):
+            async def flush(chunk):
+                try:
+                    inserts = [values for _, has_id, values in chunk if not has_id]
+                    upserts = [values for _, has_id, values in chunk if has_id]
+                    # The driver sends each list as a single multi-row statement
+                    if inserts:
+                        await cursor.executemany(insert_query, inserts)
+                    if upserts:
+                        await cursor.executemany(upsert_query, upserts)
+                    await conn.commit()
+                    return len(chunk)
+                except aiomysql.Error:
+                    await conn.rollback()
+
+                # Find the rejected rows, keeping the others in a single transaction
+                written = 0
+                for line, has_id, values in chunk:
+                    await cursor.execute("SAVEPOINT bulk_row")
+                    try:
+                        await cursor.execute(upsert_query if has_id else insert_query, values)
+                        written += 1
+                    except aiomysql.Error as err:
+                        await cursor.execute("ROLLBACK TO SAVEPOINT bulk_row")
+                        errors.append({"line": line, "errors": [str(err)]})
+                await conn.commit()
+                return written
+
+            chunk = []
+            while True:
+                # Read the next rows off the event loop: the upload is spooled to a temporary file once it is large
+                batch = await asyncio.to_thread(next_rows, rows, BULK_CHUNK_SIZE)
+                if not batch:
+                    break
+                for line, row, error in batch:
+                    if error is None:
+                        try:
+                            has_id, values = await parse_row(cursor, row)
+                            chunk.append((line, has_id, values))
+                        except ValidationError as err:
+                            error = validation_messages(err)
+                        except Exception as err:
+                            error = [str(err)]
+                    if error is not None:
+                        errors.append({"line": line, "errors": error if isinstance(error, list) else [error]})
+                    if len(chunk) >= BULK_CHUNK_SIZE:
+                        imported += await flush(chunk)
+                        chunk = []
+            if chunk:
+                imported += await flush(chunk)
+    finally:
+        rows.close()
+        if imported:
+            # Reload once for every worker instead of patching row by row; a failure must not hide the
+            # error that stopped the import, and the catalog expires after CATALOG_TTL anyway
+            try:
+                await catalog.load()
+            except Exception:
+                logger.exception("Reloading the catalog after importing %d rows failed", imported)
+    errors.sort(key=lambda error: error["line"])
+    return {"message": "Import finished", "imported": imported, "errors": errors}
+
+
 @router.post("/drink/", tags=["Admin - Drinks"])
 async def add_drink(drinks: DrinksAdd):
     """
@@ -46,12 +215,13 @@ async def add_drink(drinks: DrinksAdd):
         HTTPException: If adding the drink fails.
     """
     try:
-        with DatabaseConnection() as (conn, cursor):
-            cursor.execute(
+        async with AsyncDatabaseConnection() as (conn, cursor):
+            await cursor.execute(
                 "INSERT INTO drink (name, description, price) VALUES (%s, %s, %s)",
                 (drinks.name, drinks.description, drinks.price)
             )
-            conn.commit()
+            await conn.commit()
+            await catalog.upsert_drink(cursor.lastrowid, drinks.name, drinks.description, drinks.price)
         return {"message": "Drink added successfully"}
     except HTTPException as http_exception:
         raise http_exception
@@ -76,18 +246,20 @@ async def update_drink(updated_drink: Drinks):
         HTTPException: If updating the drink fails or if the drink does not exist.
     """
     try:
-        with DatabaseConnection() as (conn, cursor):
-            cursor.execute("SELECT id FROM drink WHERE id = %s", (updated_drink.drink_id,))
-            drink_result = cursor.fetchone()
+        async with AsyncDatabaseConnection() as (conn, cursor):
+            await cursor.execute("SELECT id FROM drink WHERE id = %s", (updated_drink.drink_id,))
+            drink_result = await cursor.fetchone()
 
             if drink_result is None:
                 raise HTTPException(status_code=404, detail="The drink does not exist")
 
-            cursor.execute(
+            await cursor.execute(
                 "UPDATE drink SET name = %s, description = %s, price = %s WHERE id = %s",
                 (updated_drink.name, updated_drink.description, updated_drink.price, updated_drink.drink_id)
             )
-            conn.commit()
+            await conn.commit()
+            await catalog.upsert_drink(updated_drink.drink_id, updated_drink.name, updated_drink.description,
+                                       updated_drink.price)
         return {"message": "Drink updated successfully"}
     except HTTPException as http_exception:
         raise http_exception
@@ -111,15 +283,16 @@ async def delete_drink(drink_id: int):
         HTTPException: If deleting the drink fails or if the drink does not exist.
     """
     try:
-        with DatabaseConnection() as (conn, cursor):
-            cursor.execute("SELECT id FROM drink WHERE id = %s", (drink_id,))
-            drink_result = cursor.fetchone()
+        async with AsyncDatabaseConnection() as (conn, cursor):
+            await cursor.execute("SELECT id FROM drink WHERE id = %s", (drink_id,))
+            drink_result = await cursor.fetchone()
 
             if drink_result is None:
                 raise HTTPException(status_code=404, detail="The drink does not exist")
 
-            cursor.execute("DELETE FROM drink WHERE id = %s", (drink_id,))
-            conn.commit()
+            await cursor.execute("DELETE FROM drink WHERE id = %s", (drink_id,))
+            await conn.commit()
+            await catalog.remove_drink(drink_id)
         return {"message": "Drink deleted successfully"}
     except HTTPException as http_exception:
         raise http_exception
@@ -143,18 +316,19 @@ async def add_supplement(supplement: SupplementAdd):
         HTTPException: If adding the supplement fails or if the supplement type does not exist.
     """
     try:
-        with DatabaseConnection() as (conn, cursor):
-            cursor.execute("SELECT id FROM supplement_type WHERE id = %s", (supplement.type_id,))
-            type_result = cursor.fetchone()
+        async with AsyncDatabaseConnection() as (conn, cursor):
+            await cursor.execute("SELECT id FROM supplement_type WHERE id = %s", (supplement.type_id,))
+            type_result = await cursor.fetchone()
 
             if type_result is None:
                 raise HTTPException(status_code=404, detail="The type does not exist")
 
-            cursor.execute(
+            await cursor.execute(
                 "INSERT INTO supplement (name, price, type_id) VALUES (%s, %s, %s)",
                 (supplement.name, supplement.price, supplement.type_id)
             )
-            conn.commit()
+            await conn.commit()
+            await catalog.upsert_supplement(cursor.lastrowid, supplement.name, supplement.price, supplement.type_id)
         return {"message": "Supplement added successfully"}
     except HTTPException as http_exception:
         raise http_exception
@@ -180,24 +354,26 @@ async def update_supplement(updated_supplement: Supplement):
         or if the supplement type does not exist.
     """
     try:
-        with DatabaseConnection() as (conn, cursor):
-            cursor.execute("SELECT id FROM supplement WHERE id = %s", (updated_supplement.supplement_id,))
-            supplement_result = cursor.fetchone()
+        async with AsyncDatabaseConnection() as (conn, cursor):
+            await cursor.execute("SELECT id FROM supplement WHERE id = %s", (updated_supplement.supplement_id,))
+            supplement_result = await cursor.fetchone()
 
             if supplement_result is None:
                 raise HTTPException(status_code=404, detail="The supplement does not exist")
 
-            cursor.execute("SELECT id FROM supplement_type WHERE id = %s", (updated_supplement.type_id,))
-            type_result = cursor.fetchone()
+            await cursor.execute("SELECT id FROM supplement_type WHERE id = %s", (updated_supplement.type_id,))
+            type_result = await cursor.fetchone()
 
             if type_result is None:
                 raise HTTPException(status_code=404, detail="The type does not exist")
 
-            cursor.execute(
+            await cursor.execute(
                 "UPDATE supplement SET name = %s, price = %s, type_id = %s WHERE id = %s",
                 (updated_supplement.name, updated_supplement.price, updated_supplement.type_id, updated_supplement.supplement_id)
             )
-            conn.commit()
+            await conn.commit()
+            await catalog.upsert_supplement(updated_supplement.supplement_id, updated_supplement.name,
+                                            updated_supplement.price, updated_supplement.type_id)
         return {"message": "Supplement updated successfully"}
     except HTTPException as http_exception:
         raise http_exception
@@ -221,18 +397,106 @@ async def delete_supplement(supplement_id: int):
         HTTPException: If deleting the supplement fails or if the supplement does not exist.
     """
     try:
-        with DatabaseConnection() as (conn, cursor):
-            cursor.execute("SELECT id FROM supplement WHERE id = %s", (supplement_id,))
-            supplement_result = cursor.fetchone()
+        async with AsyncDatabaseConnection() as (conn, cursor):
+            await cursor.execute("SELECT id FROM supplement WHERE id = %s", (supplement_id,))
+            supplement_result = await cursor.fetchone()
 
             if supplement_result is None:
                 raise HTTPException(status_code=404, detail="The supplement does not exist")
 
-            cursor.execute("DELETE FROM supplement WHERE id = %s", (supplement_id,))
-            conn.commit()
+            await cursor.execute("DELETE FROM supplement WHERE id = %s", (supplement_id,))
+            await conn.commit()
+            await catalog.remove_supplement(supplement_id)
         return {"message": "Supplement deleted successfully"}
     except HTTPException as http_exception:
         raise http_exception
     except Exception as e:
         # Raise a custom HTTP exception with a 500 status code
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/drinks/bulk/", tags=["Admin - Drinks"])
+async def import_drinks(file: UploadFile):
+    """
+    Add or update many drinks from an NDJSON or CSV upload.
+
+    Each row has the fields of DrinksAdd, plus drink_id to update (or create with that ID) an existing drink.
+
+    Args:
+        file (UploadFile): The NDJSON or CSV file, with a header line for CSV.
+
+    Returns:
+        dict: The number of imported drinks and the errors of the rejected rows by line.
+
+    Raises:
+        HTTPException: If the import fails.
+    """
+    async def parse_row(cursor, row):
+        if "drink_id" in row:
+            drink = Drinks(**row)
+            return True, (drink.drink_id, drink.name, drink.description, drink.price)
+        drink = DrinksAdd(**row)
+        return False, (drink.name, drink.description, drink.price)
+
+    try:
+        return await bulk_import(
+            file, parse_row,
+            "INSERT INTO drink (name, description, price) VALUES (%s, %s, %s)",
+            "INSERT INTO drink (id, name, description, price) VALUES (%s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE name = VALUES(name), description = VALUES(description), price = VALUES(price)"
+        )
+    except HTTPException as http_exception:
+        raise http_exception
+    except Exception as e:
+        # Raise a custom HTTP exception with a 500 status code
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/supplements/bulk/", tags=["Admin - Supplement"])
+async def import_supplements(file: UploadFile):
+    """
+    Add or update many supplements from an NDJSON or CSV upload.
+
+    Each row has the fields of SupplementAdd, plus supplement_id to update (or create with that ID) an existing
+    supplement.
+
+    Args:
+        file (UploadFile): The NDJSON or CSV file, with a header line for CSV.
+
+    Returns:
+        dict: The number of imported supplements and the errors of the rejected rows by line.
+
+    Raises:
+        HTTPException: If the import fails.
+    """
+    type_ids = None
+
+    async def parse_row(cursor, row):
+        nonlocal type_ids
+        if type_ids is None:
+            # Load the supplement types once for the whole upload
+            await cursor.execute("SELECT id FROM supplement_type")
+            type_ids = {type_row['id'] for type_row in await cursor.fetchall()}
+
+        if "supplement_id" in row:
+            supplement = Supplement(**row)
+            values = (supplement.supplement_id, supplement.name, supplement.price, supplement.type_id)
+        else:
+            supplement = SupplementAdd(**row)
+            values = (supplement.name, supplement.price, supplement.type_id)
+        if supplement.type_id not in type_ids:
+            raise ValueError("The type does not exist")
+        return "supplement_id" in row, values
+
+    try:
+        return await bulk_import(
+            file, parse_row,
+            "INSERT INTO supplement (name, price, type_id) VALUES (%s, %s, %s)",
+            "INSERT INTO supplement (id, name, price, type_id) VALUES (%s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE name = VALUES(name), price = VALUES(price), type_id = VALUES(type_id)"
+        )
+    except HTTPException as http_exception:
+        raise http_exception
+    except Exception as e:
+        # Raise a custom HTTP exception with a 500 status code
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,8 +1,10 @@
 import re
-import bcrypt
-from fastapi import HTTPException, APIRouter
+from fastapi import HTTPException, APIRouter, Depends
 from pydantic import BaseModel, EmailStr, Field
+from config.async_database import AsyncDatabaseConnection
 from config.database import DatabaseConnection
+from services.auth import check_user, current_user, token_service
+from services.passwords import PasswordHasherBusy, password_hasher
 
 router = APIRouter()
 
@@ -43,29 +45,32 @@ async def signup(user: UserCreate):
         HTTPException: If registration fails.
     """
     try:
-        with DatabaseConnection() as (db_connection, db_cursor):
-            if not is_valid_email(user.email):
-                raise HTTPException(status_code=400, detail="Invalid email format")
+        if not is_valid_email(user.email):
+            raise HTTPException(status_code=400, detail="Invalid email format")
+
+        # Hacher le mot de passe avant de prendre une connexion, pour ne pas la garder pendant bcrypt
+        hashed_password = await password_hasher.hash(user.password)
 
+        async with AsyncDatabaseConnection() as (db_connection, db_cursor):
             # Check if the user already exists
             query = "SELECT * FROM users WHERE email = %s"
-            db_cursor.execute(query, (user.email,))
-            existing_user = db_cursor.fetchone()
+            await db_cursor.execute(query, (user.email,))
+            existing_user = await db_cursor.fetchone()
 
             if existing_user:
                 raise HTTPException(status_code=400, detail="Email already in use")
 
-            hashed_password = bcrypt.hashpw(user.password.encode('utf-8'), bcrypt.gensalt())
-
             # Add the user to the database
             query = "INSERT INTO users (username, email, password, role) VALUES (%s, %s, %s, %s)"
             values = (user.username, user.email, hashed_password, "user")
-            db_cursor.execute(query, values)
-            db_connection.commit()
+            await db_cursor.execute(query, values)
+            await db_connection.commit()
 
             return {"message": "Registration successful"}
     except HTTPException as http_exception:
         raise http_exception
+    except PasswordHasherBusy as busy:
+        raise HTTPException(status_code=503, detail=str(busy), headers={"Retry-After": "1"})
     except Exception as e:
         # Raise a custom HTTP exception with a 500 status code
         raise HTTPException(status_code=500, detail=str(e))
@@ -76,48 +81,72 @@ async def login_endpoint(user_data: UserLogin):
     """
     Verify user credentials in the database and perform login.
 
+    The returned access token is sent as "Authorization: Bearer <token>" to the routes acting on
+    behalf of the user, which then verify it without querying the database.
+
     Args:
         user_data (UserLogin): User login credentials (email and password).
 
     Returns:
-        dict: A dictionary containing a success message.
+        dict: A dictionary containing a success message, the user ID and the access token with its lifetime in seconds.
 
     Raises:
         HTTPException: If authentication fails.
     """
     try:
-        with DatabaseConnection() as (db_connection, db_cursor):
+        async with AsyncDatabaseConnection() as (db_connection, db_cursor):
             # Search for the user in the database
             query = "SELECT * FROM users WHERE email = %s"
-            db_cursor.execute(query, (user_data.email,))
-            user = db_cursor.fetchone()
-
-            if user is None:
-                raise HTTPException(status_code=401, detail="Incorrect email or password")
-
-            # Vérifier le mot de passe haché avec bcrypt
-            stored_password_hash = user["password"]
-            provided_password = user_data.password.encode('utf-8')
-
-            if bcrypt.checkpw(provided_password, stored_password_hash.encode('utf-8')):
-                return {"message": "Login successful"}
-            else:
-                raise HTTPException(status_code=401, detail="Incorrect email or password")
+            await db_cursor.execute(query, (user_data.email,))
+            user = await db_cursor.fetchone()
+
+        if user is None:
+            raise HTTPException(status_code=401, detail="Incorrect email or password")
+
+        # Vérifier le mot de passe haché avec bcrypt, une fois la connexion rendue au pool
+        if await password_hasher.verify(user_data.password, user["password"]):
+            return {
+                "message": "Login successful",
+                "user_id": user["id"],
+                "access_token": token_service.issue(user["id"], user["role"]),
+                "token_type": "bearer",
+                "expires_in": token_service.ttl,
+            }
+        else:
+            raise HTTPException(status_code=401, detail="Incorrect email or password")
     except HTTPException as http_exception:
         raise http_exception
+    except PasswordHasherBusy as busy:
+        raise HTTPException(status_code=503, detail=str(busy), headers={"Retry-After": "1"})
     except Exception as e:
         # Raise a custom HTTP exception with a 500 status code
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/logout/", tags=["Authentication"])
+async def logout(user=Depends(current_user)):
+    """
+    Revoke the access token of the request.
+
+    Args:
+        user (TokenUser): The user of the Bearer token.
+
+    Returns:
+        dict: A dictionary containing a success message.
+    """
+    token_service.revoke(user)
+    return {"message": "Logout successful"}
+
+
 @router.put("/user/", tags=["Authentication"])
-def update_user(user_update: UserUpdate):
+def update_user(user_update: UserUpdate, user=Depends(current_user)):
     """
     Update user information in the database.
 
     Args:
         user_id (int): ID of the user to be updated.
         user_update (UserUpdate): Updated user information.
+        user (TokenUser): The user of the Bearer token, who must be the updated user.
 
     Returns:
         dict: A dictionary containing a success message.
@@ -126,6 +155,7 @@ def update_user(user_update: UserUpdate):
         HTTPException: If the update fails or if the user is not found.
     """
     try:
+        check_user(user, user_update.user_id)
         with DatabaseConnection() as (db_connection, db_cursor):
             if not is_valid_email(user_update.email):
                 raise HTTPException(status_code=400, detail="Invalid email format")
@@ -1,26 +1,84 @@
-import json
-from typing import Dict, Optional
-from fastapi import HTTPException, APIRouter, Query
-from pydantic import BaseModel
+import math
+from typing import Dict, List, Optional
+from fastapi import HTTPException, APIRouter, Depends, Query, Request, Response
+from pydantic import BaseModel, Field
 
-from config.database import DatabaseConnection
+from config.async_database import AsyncDatabaseConnection
+from config.replicas import recent_writers
+from services.auth import check_user, current_user
+from services.catalog import catalog
+from services.http_cache import bump_version_query, conditional_response, make_etag, read_version, user_version
+from services.pricing import pricing
+from services.search import search_index
+from services.singleflight import read_flights
 
 router = APIRouter()
 
+# Page sizes of the paginated listings
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+LAST_DRINKS_PAGE_SIZE = 10
+# Largest group order accepted by /perso-drinks/batch
+MAX_BATCH_SIZE = 100
+# Most configurations priced by a single /quote call
+MAX_QUOTE_SIZE = 500
+
 
 class Drinks(BaseModel):
-    user_id: int
+    # Defaults to the user of the access token
+    user_id: Optional[int] = None
+    drink_id: int
+    supplement_id: Dict[int, int]
+
+
+class DrinksBatch(BaseModel):
+    drinks: List[Drinks] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE,
+                                 description="The drinks of the order")
+
+
+class QuoteItem(BaseModel):
     drink_id: int
-    supplement_id: Dict
+    supplement_id: Dict[int, int] = {}
+
+
+class Quote(BaseModel):
+    items: List[QuoteItem] = Field(..., min_length=1, max_length=MAX_QUOTE_SIZE,
+                                   description="The drink configurations to price")
+
+
+def check_drink(snapshot, drinks):
+    """
+    Check a drink and its supplements against the catalog.
+
+    Args:
+        snapshot (CatalogSnapshot): The catalog to check against.
+        drinks (Drinks): The drink to create.
+
+    Raises:
+        HTTPException:
+            - 404: If the drink or one of the supplements does not exist.
+            - 400: If a supplement quantity is not positive.
+    """
+    # check if drink exist
+    if snapshot.drink(drinks.drink_id) is None:
+        raise HTTPException(status_code=404, detail="Boisson non trouvée")
+
+    # check if supplements exist
+    for supplement_id, quantity in drinks.supplement_id.items():
+        if snapshot.supplement(supplement_id) is None:
+            raise HTTPException(status_code=404, detail="Supplément non trouvé")
+        if quantity <= 0:
+            raise HTTPException(status_code=400, detail="Quantité de supplément invalide")
 
 
 @router.post('/perso-drink', tags=["Drinks"])
-async def create_drink(drinks: Drinks):
+async def create_drink(drinks: Drinks, user=Depends(current_user)):
     """
     Create drinks in the database.
 
     Args:
         drinks (Drinks): Information required to create drinks in the database.
+        user (TokenUser): The user of the Bearer token, who must be the user of the drink.
 
     Returns:
         dict: A dictionary with a success message or an error type.
@@ -29,24 +87,30 @@ async def create_drink(drinks: Drinks):
         HTTPException: If an error occurs during the operation.
     """
     try:
-        db_connection = DatabaseConnection()
-
-        # check if user exist
-        if not db_connection.user_exists(drinks.user_id):
-            raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
-
-        # check if drink exist
-        if not db_connection.drink_exists(drinks.drink_id):
-            raise HTTPException(status_code=404, detail="Boisson non trouvée")
-
-        # Use the existing db_connection instance with a context manager
-        with db_connection as (conn, cursor):
-            supplement_id_json = json.dumps(drinks.supplement_id)
-            cursor.execute(
-                "INSERT INTO drink_created (user_id, drink_id, supplement_id) VALUES (%s, %s, %s)",
-                (drinks.user_id, drinks.drink_id, supplement_id_json)
+        # The signed token proves the user exists, no query needed
+        drinks.user_id = check_user(user, drinks.user_id)
+        snapshot = await catalog.get()
+        check_drink(snapshot, drinks)
+
+        async with AsyncDatabaseConnection() as (conn, cursor):
+            await cursor.execute(
+                "INSERT INTO drink_created (user_id, drink_id) VALUES (%s, %s)",
+                (drinks.user_id, drinks.drink_id)
             )
-            conn.commit()
+            drink_created_id = cursor.lastrowid
+
+            # The driver sends all the supplement rows as a single multi-row insert
+            if drinks.supplement_id:
+                await cursor.executemany(
+                    "INSERT INTO drink_created_supplement_association (drink_created_id, supplement_id, quantity) "
+                    "VALUES (%s, %s, %s)",
+                    [(drink_created_id, supplement_id, quantity)
+                     for supplement_id, quantity in drinks.supplement_id.items()]
+                )
+            await cursor.execute(bump_version_query("drinks"), (drinks.user_id,))
+            await conn.commit()
+
+        recent_writers.record(drinks.user_id)
         return {"message": "Drink created successfully"}
     except HTTPException as http_exception:
         raise http_exception
@@ -55,57 +119,197 @@ async def create_drink(drinks: Drinks):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post('/perso-drinks/batch', tags=["Drinks"])
+async def create_drinks_batch(batch: DrinksBatch, user=Depends(current_user)):
+    """
+    Create all the drinks of a group order in a single transaction.
+
+    Args:
+        batch (DrinksBatch): The drinks to create.
+        user (TokenUser): The user of the Bearer token, who must be the user of every drink.
+
+    Returns:
+        dict: A dictionary with a success message and, for each drink in order, its created ID and total price.
+
+    Raises:
+        HTTPException:
+            - 403: If a drink belongs to another user than the one of the token.
+            - 404: If a drink or supplement does not exist.
+            - 400: If a supplement quantity is not positive.
+            - 500: If an unexpected error occurs during the operation.
+    """
+    try:
+        snapshot = await catalog.get()
+        for drinks in batch.drinks:
+            drinks.user_id = check_user(user, drinks.user_id)
+            check_drink(snapshot, drinks)
+        total_prices = pricing.table_for(snapshot).prices(
+            [(drinks.drink_id, drinks.supplement_id) for drinks in batch.drinks])
+
+        async with AsyncDatabaseConnection() as (conn, cursor):
+            # One insert per drink: the IDs of a multi-row insert are not consecutive with
+            # innodb_autoinc_lock_mode=2 and concurrent inserts, so only lastrowid is reliable
+            created_ids = []
+            for drinks in batch.drinks:
+                await cursor.execute(
+                    "INSERT INTO drink_created (user_id, drink_id) VALUES (%s, %s)",
+                    (drinks.user_id, drinks.drink_id)
+                )
+                created_ids.append(cursor.lastrowid)
+
+            supplement_rows = [
+                (drink_created_id, supplement_id, quantity)
+                for drink_created_id, drinks in zip(created_ids, batch.drinks)
+                for supplement_id, quantity in drinks.supplement_id.items()
+            ]
+            if supplement_rows:
+                await cursor.executemany(
+                    "INSERT INTO drink_created_supplement_association (drink_created_id, supplement_id, quantity) "
+                    "VALUES (%s, %s, %s)",
+                    supplement_rows
+                )
+            await cursor.execute(bump_version_query("drinks"), (user.id,))
+            await conn.commit()
+
+        recent_writers.record(user.id)
+        return {
+            "message": "Drinks created successfully",
+            "drinks": [
+                {
+                    "drink_created_id": drink_created_id,
+                    "drink_id": drinks.drink_id,
+                    "total_price": total_price
+                }
+                for drink_created_id, drinks, total_price in zip(created_ids, batch.drinks, total_prices)
+            ]
+        }
+    except HTTPException as http_exception:
+        raise http_exception
+    except Exception as e:
+        # Raise a custom HTTP exception with a 500 status code
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post('/quote', tags=["Drinks"])
+async def quote_drinks(quote: Quote):
+    """
+    Price many drink configurations at once, without creating them, e.g. for menu previews.
+
+    The configurations are priced together from the in-memory catalog, without querying the database.
+    A configuration that cannot be priced gets a null price and the reason, the others are still priced.
+
+    Args:
+        quote (Quote): The configurations to price.
+
+    Returns:
+        dict: The catalog version the prices come from and, for each configuration in order, its drink ID,
+        its total price and, if it cannot be priced, an error.
+
+    Raises:
+        HTTPException: 500 if an unexpected error occurs during the operation.
+    """
+    try:
+        snapshot = await catalog.get()
+        totals, unknown_supplements, invalid_quantities = pricing.table_for(snapshot).quote(
+            [(item.drink_id, item.supplement_id) for item in quote.items])
+
+        quotes = []
+        for item, total, unknown, invalid in zip(quote.items, totals.tolist(), unknown_supplements.tolist(),
+                                                 invalid_quantities.tolist()):
+            # Same checks, in the same order, as when creating the drink
+            error = None
+            if math.isnan(total):
+                error = "Boisson non trouvée"
+            elif unknown:
+                error = "Supplément non trouvé"
+            elif invalid:
+                error = "Quantité de supplément invalide"
+            quotes.append({
+                "drink_id": item.drink_id,
+                "total_price": None if error else total,
+                **({"error": error} if error else {})
+            })
+        return {"catalog_version": snapshot.version, "quotes": quotes}
+    except Exception as e:
+        # Raise a custom HTTP exception with a 500 status code
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get('/perso-drinks/{user_id}', tags=["Drinks"])
-async def show_drinks(user_id):
+async def show_drinks(user_id: int, request: Request, response: Response,
+                      after: Optional[int] = Query(None, description="Cursor returned by the previous page"),
+                      limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size")):
     """
-    Retrieve drinks created by a specific user.
+    Retrieve drinks created by a specific user, oldest first, one page at a time.
+
+    The response carries an ETag; a request repeating it in If-None-Match gets a 304 after reading only
+    the user's drinks version, as long as the user has not created a drink and the catalog is unchanged.
 
     Args:
         user_id (int): The ID of the user whose drinks are to be retrieved.
+        request (Request): The incoming request.
+        response (Response): The response, which receives the caching headers.
+        after (int, optional): The next_cursor of the previous page.
+        limit (int): The maximum number of drinks to return.
 
     Returns:
-        dict: A dictionary containing the drinks and their total prices.
+        dict: A dictionary containing the drinks, their total prices and the cursor of the next page,
+        or an empty 304 response if the client's copy is current.
 
     Raises:
         HTTPException:
             - 404: If no drinks are found for this user.
-            - 400: If the supplement_ids data is invalid.
             - 500: If an unexpected error occurs during the operation.
     """
     try:
-        user_id = int(user_id)
-        # Use the new connection class with a context manager
-        with DatabaseConnection() as (conn, cursor):
-            cursor.execute(
-                "SELECT drink_id, supplement_id FROM drink_created WHERE user_id = %s",
-                (user_id,)
-            )
-            drinks = cursor.fetchall()
-            drinks_with_prices = []
-            for drink_data in drinks:
-                supplement_id_list = json.loads(drink_data['supplement_id']) if drink_data['supplement_id'] else {}
-                cursor.execute("SELECT price FROM drink WHERE id = %s", (drink_data['drink_id'],))
-                drink_price = cursor.fetchone()
-                if drink_price:
-                    drink_price = drink_price['price']
-                    total_price = drink_price
-                    for supplement_id, quantity in supplement_id_list.items():
-                        cursor.execute("SELECT price FROM supplement WHERE id = %s", (supplement_id,))
-                        supplement_price = cursor.fetchone()
-                        if supplement_price:
-                            supplement_price = supplement_price['price']
-                            total_price += supplement_price * quantity
-                    drinks_with_prices.append({
-                        "drink_id": drink_data['drink_id'],
-                        "total_price": total_price
-                    })
-
-        if not drinks_with_prices:
-            raise HTTPException(status_code=404, detail="No drinks found for this user")
+        snapshot = await catalog.get()
+        prices = pricing.table_for(snapshot)
+        etag = make_etag("perso-drinks", user_id, after, limit,
+                         await user_version("drinks", user_id), snapshot.generation)
+        not_modified = conditional_response(request, response, etag)
+        if not_modified is not None:
+            return not_modified
+
+        async def load():
+            # Read-only: served by a replica unless the user has just written
+            async with AsyncDatabaseConnection(readonly=True, user_id=user_id) as (conn, cursor):
+                # In the same transaction as the page, so that the ETag sent describes it
+                version = await read_version(cursor, "drinks", user_id)
+                await cursor.execute(
+                    "SELECT dc.id, dc.drink_id, a.supplement_id, a.quantity "
+                    "FROM (SELECT id, drink_id FROM drink_created "
+                    "WHERE user_id = %s AND id > %s ORDER BY id LIMIT %s) dc "
+                    "LEFT JOIN drink_created_supplement_association a ON a.drink_created_id = dc.id "
+                    "ORDER BY dc.id",
+                    (user_id, after or 0, limit)
+                )
+                rows = await cursor.fetchall()
+
+            # Group the supplement rows of each created drink, keeping the creation order
+            drinks = {}
+            for row in rows:
+                supplements = drinks.setdefault(row['id'], (row['drink_id'], {}))[1]
+                if row['supplement_id'] is not None:
+                    supplements[row['supplement_id']] = row['quantity']
+
+            # Prices come from the in-memory catalog, the whole page at once
+            total_prices = prices.prices(list(drinks.values()))
+            drinks_with_prices = [
+                {"drink_id": drink_id, "total_price": total_price}
+                for (drink_id, _), total_price in zip(drinks.values(), total_prices)
+                if total_price is not None
+            ]
+
+            if not drinks_with_prices and after is None:
+                raise HTTPException(status_code=404, detail="No drinks found for this user")
 
-        return {"drinks": drinks_with_prices}
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid supplement_ids data")
+            next_cursor = list(drinks)[-1] if len(drinks) == limit else None
+            return version, {"drinks": drinks_with_prices, "next_cursor": next_cursor}
+
+        # Concurrent requests for the same page share one query; the ETag covers the page and the versions
+        version, page = await read_flights.do("perso-drinks", user_id, etag, load)
+        response.headers["ETag"] = make_etag("perso-drinks", user_id, after, limit, version, snapshot.generation)
+        return page
     except HTTPException as http_exception:
         raise http_exception
     except Exception as e:
@@ -114,15 +318,24 @@ async def show_drinks(user_id):
 
 
 @router.get('/last-drinks/{user_id}', tags=["Drinks"])
-async def last_drinks(user_id):
+async def last_drinks(user_id: int, request: Request, response: Response,
+                      after: Optional[int] = Query(None, description="Cursor returned by the previous page"),
+                      limit: int = Query(LAST_DRINKS_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size")):
     """
-    Retrieve the 10 most recent drinks created by a specific user.
+    Retrieve the most recent drinks created by a specific user, newest first, one page at a time.
+
+    Like /perso-drinks, the response carries an ETag and a matching If-None-Match gets a 304.
 
     Args:
         user_id (int): The ID of the user whose drinks are to be retrieved.
+        request (Request): The incoming request.
+        response (Response): The response, which receives the caching headers.
+        after (int, optional): The next_cursor of the previous page.
+        limit (int): The maximum number of drinks to return, 10 by default.
 
     Returns:
-        dict: A dictionary containing the list of drinks or an error message.
+        dict: A dictionary containing the list of drinks and the cursor of the next page,
+        or an empty 304 response if the client's copy is current.
 
     Raises:
         HTTPException:
@@ -130,18 +343,42 @@ async def last_drinks(user_id):
             - 500: If an unexpected error occurs during the operation.
     """
     try:
-        user_id = int(user_id)
-        # Use the new connection class with a context manager
-        with DatabaseConnection() as (conn, cursor):
-            cursor.execute(
-                "SELECT * FROM drink_created WHERE user_id = %s ORDER BY id DESC LIMIT 10",
-                (user_id,)
-            )
-            drinks = cursor.fetchall()
+        # Deleting a drink from the catalog cascades to the created drinks, hence the catalog generation,
+        # shared by the workers of the host
+        snapshot = await catalog.get()
+        etag = make_etag("last-drinks", user_id, after, limit,
+                         await user_version("drinks", user_id), snapshot.generation)
+        not_modified = conditional_response(request, response, etag)
+        if not_modified is not None:
+            return not_modified
 
-        if not drinks:
+        # A drink without supplements gets an empty object, as when they were stored in drink_created
+        query = (
+            "SELECT dc.id, dc.user_id, dc.drink_id, "
+            "COALESCE((SELECT JSON_OBJECTAGG(a.supplement_id, a.quantity) FROM drink_created_supplement_association a "
+            "WHERE a.drink_created_id = dc.id), JSON_OBJECT()) AS supplement_id "
+            "FROM drink_created dc WHERE dc.user_id = %s"
+        )
+        params = [user_id]
+        if after is not None:
+            query += " AND dc.id < %s"
+            params.append(after)
+        query += " ORDER BY dc.id DESC LIMIT %s"
+        params.append(limit)
+
+        # Read-only: served by a replica unless the user has just written
+        async with AsyncDatabaseConnection(readonly=True, user_id=user_id) as (conn, cursor):
+            # In the same transaction as the page, so that the ETag sent describes it
+            version = await read_version(cursor, "drinks", user_id)
+            await cursor.execute(query, params)
+            drinks = await cursor.fetchall()
+
+        if not drinks and after is None:
             raise HTTPException(status_code=404, detail="No drinks found for this user")
-        return {"drinks": drinks}
+
+        response.headers["ETag"] = make_etag("last-drinks", user_id, after, limit, version, snapshot.generation)
+        next_cursor = drinks[-1]['id'] if len(drinks) == limit else None
+        return {"drinks": drinks, "next_cursor": next_cursor}
     except HTTPException as http_exception:
         raise http_exception
     except Exception as e:
@@ -149,60 +386,44 @@ async def last_drinks(user_id):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# @router.get("/search/")
-# async def search_drinks(query: str = Query(..., description="Recherchez une boisson par nom ou description"),
-#                         max_price: Optional[float] = Query(None, description="Filtrez par prix maximum")):
-#     """
-#     Recherche des boissons en fonction d'un terme de recherche (nom ou description) et éventuellement d'un filtre de prix maximum.
-#
-#     Args:
-#         query (str): Terme de recherche pour le nom ou la description de la boisson.
-#         max_price (float, optional): Prix maximum pour filtrer les résultats (facultatif).
-#
-#     Raises:
-#         HTTPException 400: Si le filtre de prix est trop bas pour trouver des boissons.
-#         HTTPException 404: Si aucune boisson n'est trouvée pour la recherche.
-#
-#     Returns:
-#         list: Liste des boissons correspondantes (peut être vide).
-#
-#     Example:
-#         Pour rechercher des boissons avec le terme "Latte" et un prix maximum de 6.0 :
-#         `/search/?query=Latte&max_price=6.0`
-#     """
-#     db_connection, db_cursor = connect_to_database()
-#
-#     try:
-#         # Utilisez une requête SQL pour rechercher des boissons par nom ou description
-#         # Ajoutez des % pour rechercher des correspondances partielles
-#         search_query = f"%{query}%"
-#         query = "SELECT * FROM drink WHERE (name LIKE %s OR description LIKE %s)"
-#
-#         # Si max_price est spécifié, ajoutez un filtre de prix
-#         if max_price is not None:
-#             query += " AND price <= %s"
-#             db_cursor.execute(query, (search_query, search_query, max_price))
-#         else:
-#             db_cursor.execute(query, (search_query, search_query))
-#
-#         drinks = db_cursor.fetchall()
-#
-#         if not drinks:
-#             # Si aucune boisson n'est trouvée, renvoyer un message personnalisé
-#             if max_price is not None and max_price <= 0:
-#                 raise HTTPException(
-#                     status_code=400, detail="Le filtre de prix est trop bas pour trouver des boissons")
-#             else:
-#                 raise HTTPException(
-#                     status_code=404, detail="Aucune boisson trouvée")
-#
-#         return drinks
-#     except HTTPException:
-#         # Capturer l'exception HTTPException et la répercuter
-
-#         raise
-#     except Exception as e:
-#         raise e
-#     finally:
-#         close_database_connection()
+@router.get("/search/", tags=["Drinks"])
+async def search_drinks(query: str = Query(..., description="Recherchez une boisson par nom ou description"),
+                        max_price: Optional[float] = Query(None, description="Filtrez par prix maximum"),
+                        limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE, description="Nombre maximum de résultats")):
+    """
+    Search drinks by name or description, with an optional maximum price.
+
+    Every word of the query must start a word of the drink's name or description, ignoring case and
+    accents, so that "cafe lat" finds "Café Latte". Results are ranked, name matches first, and are
+    served from the in-memory search index without querying the database.
+
+    Args:
+        query (str): The words to look for in the name or description of the drinks.
+        max_price (float, optional): Only return drinks up to this price.
+        limit (int): The maximum number of drinks to return.
+
+    Returns:
+        list: The matching drinks, best first.
+
+    Raises:
+        HTTPException:
+            - 400: If the price filter is too low to find any drink.
+            - 404: If no drink matches the search.
+
+    Example:
+        To search drinks matching "Latte" up to 6.0:
+        `/search/?query=Latte&max_price=6.0`
+    """
+    if max_price is not None and max_price <= 0:
+        raise HTTPException(status_code=400, detail="Le filtre de prix est trop bas pour trouver des boissons")
+    try:
+        # Brings the index up to date if the catalog has expired
+        await catalog.get()
+        drinks = search_index.search(query, max_price=max_price, limit=limit)
+    except Exception as e:
+        # Raise a custom HTTP exception with a 500 status code
+        raise HTTPException(status_code=500, detail=str(e))
 
+    if not drinks:
+        raise HTTPException(status_code=404, detail="Aucune boisson trouvée")
+    return drinks
@@ -0,0 +1,60 @@
+import asyncio
+
+from fastapi import APIRouter, Response
+
+from config.async_database import pool_status
+from config.database import pool
+from config.replicas import replicas
+from config.settings import env_number
+from services.warmup import ping_database, warmup
+
+router = APIRouter()
+
+# Seconds /readyz waits for the database before reporting the worker unready
+READINESS_TIMEOUT = env_number("READINESS_TIMEOUT", 2.0, float)
+
+
+@router.get("/healthz", tags=["Monitoring"])
+async def healthz():
+    """
+    Tell whether the process is alive, without touching the database.
+
+    A database outage must not get every worker restarted, so this never fails while the event
+    loop runs; /readyz reports the dependencies.
+
+    Returns:
+        dict: The status of the process.
+    """
+    return {"status": "ok"}
+
+
+@router.get("/readyz", tags=["Monitoring"])
+async def readyz(response: Response):
+    """
+    Tell whether the worker is warm and its database reachable, for the load balancer.
+
+    Args:
+        response (Response): The response, whose status is set to 503 when the worker is not ready.
+
+    Returns:
+        dict: The status, the warm-up checks, the state of both connection pools of the primary and the
+        state of the read replicas, which fall back to the primary and so never make the worker unready.
+    """
+    checks = warmup.status()
+    status = "starting"
+    if warmup.ready:
+        try:
+            await asyncio.wait_for(ping_database(), READINESS_TIMEOUT)
+            status = "ready"
+        except Exception as e:
+            status = "unavailable"
+            checks["error"] = str(e) or type(e).__name__
+
+    if status != "ready":
+        response.status_code = 503
+    return {
+        "status": status,
+        **checks,
+        "pools": {"sync": pool.status(), "async": pool_status()},
+        "replicas": replicas.status(),
+    }
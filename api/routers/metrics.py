@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Response
+
+from config.async_database import pool_status
+from config.database import pool
+from config.replicas import replicas
+from services.catalog import catalog
+from services.leaderboard import top_drinks
+from services.metrics import CONTENT_TYPE, CallbackCounter, CallbackGauge, registry
+from services.passwords import password_hasher
+from services.singleflight import read_flights
+from services.write_behind import write_behind_queues
+
+router = APIRouter()
+
+CONNECTION_STATES = ("opened", "idle", "checked_out")
+
+
+def pool_connections():
+    values = {}
+    for name, status in (("sync", pool.status()), ("async", pool_status())):
+        if status is not None:
+            for state in CONNECTION_STATES:
+                values[(name, state)] = status[state]
+    return values
+
+
+# Values owned by other components, read at scrape time
+CallbackGauge("db_pool_connections", "Database connections by pool and state.", pool_connections, ("pool", "state"))
+CallbackGauge("db_replica_available", "Whether each read replica receives reads (1) or is ejected (0).",
+              lambda: {(replica.name,): int(replica.available) for replica in replicas.replicas}, ("replica",))
+CallbackGauge("db_replica_lag_seconds", "Replication lag of each read replica at its last check.",
+              lambda: {(replica.name,): replica.lag for replica in replicas.replicas if replica.lag is not None},
+              ("replica",))
+CallbackGauge("password_hash_in_flight", "Password hash operations running.",
+              lambda: {(): password_hasher.in_flight})
+CallbackGauge("password_hash_queue_depth", "Password hash operations waiting for a worker.",
+              lambda: {(): password_hasher.queue_depth})
+CallbackCounter("password_hash_rejected_total", "Password hash operations rejected because the queue was full.",
+                lambda: {(): password_hasher.rejected})
+CallbackCounter("password_hash_completed_total", "Password hash operations completed.",
+                lambda: {(): password_hasher.completed})
+CallbackGauge("write_behind_queue_depth", "Rows waiting in the write-behind queues.",
+              lambda: {(queue.kind,): queue.depth for queue in write_behind_queues}, ("kind",))
+CallbackCounter("write_behind_rows_written_total", "Rows written by the write-behind queues.",
+                lambda: {(queue.kind,): queue.written for queue in write_behind_queues}, ("kind",))
+CallbackCounter("write_behind_flush_errors_total", "Write-behind flushes that failed and were retried.",
+                lambda: {(queue.kind,): queue.failed for queue in write_behind_queues}, ("kind",))
+CallbackCounter("write_behind_rejected_total", "Rows turned away because a write-behind queue was full.",
+                lambda: {(queue.kind,): queue.rejected for queue in write_behind_queues}, ("kind",))
+CallbackCounter("singleflight_calls_total", "Coalesced reads by route, run (leader) or joining a running one (shared).",
+                lambda: dict(read_flights.calls), ("route", "result"))
+CallbackGauge("singleflight_in_flight", "Coalesced reads running.", lambda: {(): read_flights.in_flight})
+CallbackCounter("singleflight_shared_calls_by_key", "Deduplicated reads of the busiest users, by route.",
+                read_flights.top_shared, ("route", "key"))
+CallbackGauge("catalog_version", "Version of the in-memory drink and supplement catalog.",
+              lambda: {(): catalog.version})
+CallbackGauge("top_drinks_entries", "Created drinks held by the in-memory leaderboard.",
+              lambda: {(): len(top_drinks)})
+
+
+@router.get("/metrics", tags=["Monitoring"], include_in_schema=False)
+def show_metrics():
+    """
+    Expose the request, database and component metrics in the Prometheus text format.
+
+    Returns:
+        Response: The metrics, to be scraped by Prometheus.
+    """
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
@@ -1,125 +1,199 @@
-from fastapi import HTTPException, APIRouter
+from typing import Optional
+from fastapi import HTTPException, APIRouter, Depends, Query, Request, Response
+from mysql.connector import errorcode
+from mysql.connector.errors import IntegrityError
 from pydantic import BaseModel
+from config.async_database import AsyncDatabaseConnection
 from config.database import DatabaseConnection
+from config.replicas import recent_writers
+from services.auth import check_user, current_user, legacy_reader
+from services.catalog import catalog
+from services.http_cache import bump_version_query, conditional_response, make_etag, read_version, user_version
+from services.leaderboard import top_drinks
+from services.singleflight import read_flights
+from services.write_behind import WRITE_BEHIND, WriteBehindFull, favorite_queue, like_queue
 
 router = APIRouter()
 
+# Page sizes of the paginated listings
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_TOP_DRINKS = 100
+
 
 class LikeCreate(BaseModel):
-    user_id: int
+    # Defaults to the user of the access token
+    user_id: Optional[int] = None
     drink_created_id: int
 
 class FavCreate(BaseModel):
-    user_id: int
+    # Defaults to the user of the access token
+    user_id: Optional[int] = None
     drink_created_id: int
 
 
+def integrity_error_to_http(err, duplicate_detail):
+    """
+    Translate a constraint violation raised by an insert into the matching HTTP error.
+
+    Args:
+        err (mysql.connector.errors.IntegrityError): The error raised by the insert.
+        duplicate_detail (str): The message returned when the row already exists.
+
+    Returns:
+        HTTPException: 400 for a duplicate row, 404 for an unknown user or created drink, 500 otherwise.
+    """
+    if err.errno == errorcode.ER_DUP_ENTRY:
+        return HTTPException(status_code=400, detail=duplicate_detail)
+    if err.errno == errorcode.ER_NO_REFERENCED_ROW_2:
+        if "FOREIGN KEY (`user_id`)" in err.msg:
+            return HTTPException(status_code=404, detail="User not found")
+        return HTTPException(status_code=404, detail="Created drink not found")
+    return HTTPException(status_code=500, detail=str(err))
+
+
+def check_before_queueing(table, user_id, drink_created_id, duplicate_detail):
+    """
+    Check a like or favorite against the database before it is queued for the write-behind flush.
+
+    The flush writes it after the response is sent and can no longer report an error to the client, so
+    the created drink and the existing row are looked up first, on the primary, in a single read.
+
+    Args:
+        table (str): The table the row goes to, "drink_created_likes" or "favoris".
+        user_id (int): The ID of the user.
+        drink_created_id (int): The ID of the created drink.
+        duplicate_detail (str): The message returned when the row already exists.
+
+    Raises:
+        HTTPException:
+            - 404: If the created drink does not exist.
+            - 409: If the row already exists.
+    """
+    with DatabaseConnection() as (db_connection, db_cursor):
+        db_cursor.execute(
+            "SELECT EXISTS(SELECT 1 FROM drink_created WHERE id = %s) AS drink_found, "
+            f"EXISTS(SELECT 1 FROM {table} WHERE user_id = %s AND drink_created_id = %s) AS row_found",
+            (drink_created_id, user_id, drink_created_id)
+        )
+        found = db_cursor.fetchone()
+    if not found['drink_found']:
+        raise HTTPException(status_code=404, detail="Created drink not found")
+    if found['row_found']:
+        raise HTTPException(status_code=409, detail=duplicate_detail)
+
+
 @router.post("/likes/", tags=["Ratings"])
-def add_like(like_create: LikeCreate):
+def add_like(like_create: LikeCreate, response: Response, user=Depends(current_user)):
     """
     Add a new "like" for a drink created by a specific user.
 
+    With WRITE_BEHIND enabled, the "like" is checked, queued and written with others by a background
+    flush: the response is a 202, or a 409 if the user already likes the created drink.
+
     Args:
         like_create (LikeCreate): Information about the "like."
+        response (Response): The response, whose status is set to 202 when the "like" is queued.
+        user (TokenUser): The user of the Bearer token, who must be the user of the "like."
 
     Returns:
         dict: A success message.
 
     Raises:
         HTTPException:
+            - 400: If the user already likes this created drink.
+            - 409: If the user already likes this created drink, with WRITE_BEHIND enabled.
+            - 403: If the token belongs to another user.
             - 404: If the user or the created drink is not found.
+            - 503: If the write-behind queue is full.
             - 500: If an unexpected error occurs during the operation.
     """
     try:
+        like_create.user_id = check_user(user, like_create.user_id)
+        if WRITE_BEHIND:
+            detail = "Like already exists for this user and drink"
+            check_before_queueing("drink_created_likes", like_create.user_id, like_create.drink_created_id, detail)
+            if not like_queue.put(like_create.user_id, like_create.drink_created_id):
+                raise HTTPException(status_code=409, detail=detail)
+            recent_writers.record(like_create.user_id)
+            response.status_code = 202
+            return {"message": "Like accepted"}
+
         # Use a context manager to handle the database connection
         with DatabaseConnection() as (db_connection, db_cursor):
-
-            # Check if the user exists (you can add more checks here)
-            query = "SELECT * FROM users WHERE id = %s"
-            db_cursor.execute(query, (like_create.user_id,))
-            existing_user = db_cursor.fetchone()
-
-            if not existing_user:
-                raise HTTPException(
-                    status_code=404, detail="User not found")
-
-            # Check if the created drink exists (you can add more checks here)
-            query = "SELECT * FROM drink_created WHERE id = %s"
-            db_cursor.execute(query, (like_create.drink_created_id,))
-            existing_drink_created = db_cursor.fetchone()
-
-            if not existing_drink_created:
-                raise HTTPException(
-                    status_code=404, detail="Created drink not found")
-
-            # Add the "like" to the drink_created_likes table
+            # The foreign keys and the unique (user_id, drink_created_id) key do the checks
             query = "INSERT INTO drink_created_likes (user_id, drink_created_id) VALUES (%s, %s)"
             values = (like_create.user_id, like_create.drink_created_id)
             db_cursor.execute(query, values)
+
+            # Increment the counter in the same transaction; LAST_INSERT_ID(expr) hands back the new count
+            query = "UPDATE drink_created SET like_count = LAST_INSERT_ID(like_count + 1) WHERE id = %s"
+            db_cursor.execute(query, (like_create.drink_created_id,))
+            like_count = db_cursor.lastrowid
             db_connection.commit()
 
-            return {"message": "Like added successfully"}
+        top_drinks.observe(like_create.drink_created_id, like_count)
+        recent_writers.record(like_create.user_id)
+        return {"message": "Like added successfully"}
     except HTTPException as http_exception:
         raise http_exception
+    except IntegrityError as err:
+        raise integrity_error_to_http(err, "Like already exists for this user and drink")
+    except WriteBehindFull as full:
+        raise HTTPException(status_code=503, detail=str(full), headers={"Retry-After": "1"})
     except Exception as e:
         # Raise a custom HTTP exception with a 500 status code
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/fav/", tags=["Ratings"])
-def add_fav(fav_create: FavCreate):
+def add_fav(fav_create: FavCreate, response: Response, user=Depends(current_user)):
     """
     Adds a favorite drink for a user.
 
+    With WRITE_BEHIND enabled, the favorite is checked, queued and written with others by a background
+    flush: the response is a 202, or a 409 if the favorite already exists.
+
     Args:
         fav_create (FavCreate): The data for creating a favorite drink for a user.
+        response (Response): The response, whose status is set to 202 when the favorite is queued.
+        user (TokenUser): The user of the Bearer token, who must be the user of the favorite.
 
     Returns:
         dict: A dictionary containing a success message if the favorite is added successfully.
 
     Raises:
-        HTTPException: If an error occurs while processing the request, such as user not found or created drink not found.
+        HTTPException: If an error occurs while processing the request, such as user not found or created drink not found,
+        or 503 if the write-behind queue is full.
     """
     try:
+        fav_create.user_id = check_user(user, fav_create.user_id)
+        if WRITE_BEHIND:
+            detail = "Favorite already exists for this user and drink"
+            check_before_queueing("favoris", fav_create.user_id, fav_create.drink_created_id, detail)
+            if not favorite_queue.put(fav_create.user_id, fav_create.drink_created_id):
+                raise HTTPException(status_code=409, detail=detail)
+            recent_writers.record(fav_create.user_id)
+            response.status_code = 202
+            return {"message": "Fav accepted"}
+
         # Use a context manager to handle the database connection
         with DatabaseConnection() as (db_connection, db_cursor):
-
-            # Check if the user exists
-            query = "SELECT * FROM users WHERE id = %s"
-            db_cursor.execute(query, (fav_create.user_id,))
-            existing_user = db_cursor.fetchone()
-
-            if not existing_user:
-                raise HTTPException(
-                    status_code=404, detail="User not found")
-
-            # Check if the created drink exists
-            query = "SELECT * FROM drink_created WHERE id = %s"
-            db_cursor.execute(query, (fav_create.drink_created_id,))
-            existing_drink_created = db_cursor.fetchone()
-
-            if not existing_drink_created:
-                raise HTTPException(
-                    status_code=404, detail="Created drink not found")
-
-            # Check if the like already exists
-            query = "SELECT * FROM favoris WHERE user_id = %s AND drink_created_id = %s"
-            db_cursor.execute(query, (fav_create.user_id, fav_create.drink_created_id))
-            existing_like = db_cursor.fetchone()
-
-            if existing_like:
-                raise HTTPException(
-                    status_code=400, detail="Favorite already exists for this user and drink")
-
-            # Add the "like" to the drink_created_likes table
+            # The foreign keys and the unique (user_id, drink_created_id) key do the checks
             query = "INSERT INTO favoris (user_id, drink_created_id) VALUES (%s, %s)"
             values = (fav_create.user_id, fav_create.drink_created_id)
             db_cursor.execute(query, values)
+            db_cursor.execute(bump_version_query("favoris"), (fav_create.user_id,))
             db_connection.commit()
 
-            return {"message": "Fav added successfully"}
+        recent_writers.record(fav_create.user_id)
+        return {"message": "Fav added successfully"}
     except HTTPException as http_exception:
         raise http_exception
+    except IntegrityError as err:
+        raise integrity_error_to_http(err, "Favorite already exists for this user and drink")
+    except WriteBehindFull as full:
+        raise HTTPException(status_code=503, detail=str(full), headers={"Retry-After": "1"})
     except Exception as e:
         # Raise a custom HTTP exception with a 500 status code
         raise HTTPException(status_code=500, detail=str(e))
@@ -127,40 +201,92 @@ def add_fav(fav_create: FavCreate):
 
 
 @router.get('/show-fav/{user_id}', tags=["Ratings"])
-async def show_fav(user_id):
+async def show_fav(user_id: int, request: Request, response: Response, user=Depends(legacy_reader),
+                   after: Optional[int] = Query(None, description="Cursor returned by the previous page"),
+                   limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size")):
     """
-    Retrieves the favorite drinks of a user.
+    Retrieves the favorite drinks of a user, one page at a time.
+
+    The response carries an ETag; a request repeating it in If-None-Match gets a 304 after reading only
+    the user's favorites version, as long as the user has not added a favorite.
+
+    Requests without a token are still answered while AUTH_LEGACY_READS is on, with a Deprecation header.
 
     Args:
         user_id (int): The ID of the user whose favorite drinks need to be retrieved.
+        request (Request): The incoming request.
+        response (Response): The response, which receives the caching headers.
+        user (TokenUser): The user of the Bearer token, who must be the user of the favorites, or None
+            for a request without a token.
+        after (int, optional): The next_cursor of the previous page.
+        limit (int): The maximum number of favorites to return.
+
+    Returns:
+        dict: A dictionary with the user's favorite drinks and the cursor of the next page,
+        or an empty 304 response if the client's copy is current.
+
+    Raises:
+        HTTPException: If an error occurs while processing the request, such as another user's token or no favorites found.
+    """
+    try:
+        if user is None:
+            # Public before access tokens; answered until AUTH_LEGACY_READS is turned off
+            response.headers["Deprecation"] = "true"
+        else:
+            # The signed token proves the user exists, no query needed
+            user_id = check_user(user, user_id)
+        # Deleting a drink from the catalog cascades to the favorites, hence the catalog generation,
+        # shared by the workers of the host
+        snapshot = await catalog.get()
+        etag = make_etag("show-fav", user_id, after, limit,
+                         await user_version("favoris", user_id), snapshot.generation)
+        not_modified = conditional_response(request, response, etag)
+        if not_modified is not None:
+            return not_modified
+
+        async def load():
+            # Read-only: served by a replica unless the user has just written
+            async with AsyncDatabaseConnection(readonly=True, user_id=user_id) as (conn, cursor):
+                # In the same transaction as the page, so that the ETag sent describes it
+                version = await read_version(cursor, "favoris", user_id)
+                await cursor.execute(
+                    "SELECT user_id, drink_created_id FROM favoris WHERE user_id = %s AND drink_created_id > %s "
+                    "ORDER BY drink_created_id LIMIT %s",
+                    (user_id, after or 0, limit)
+                )
+                favoris = await cursor.fetchall()
+                if not favoris and after is None:
+                    raise HTTPException(
+                        status_code=404, detail="Not favoris found")
+
+            next_cursor = favoris[-1]['drink_created_id'] if len(favoris) == limit else None
+            return version, {"favoris": favoris, "next_cursor": next_cursor}
+
+        # Concurrent requests for the same page share one query; the ETag covers the page and the version
+        version, page = await read_flights.do("show-fav", user_id, etag, load)
+        response.headers["ETag"] = make_etag("show-fav", user_id, after, limit, version, snapshot.generation)
+        return page
+    except HTTPException as http_exception:
+        raise http_exception
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get('/top-drinks', tags=["Ratings"])
+async def show_top_drinks(limit: int = Query(10, ge=1, le=MAX_TOP_DRINKS, description="Number of drinks")):
+    """
+    Retrieves the most liked created drinks.
+
+    Args:
+        limit (int): The number of created drinks to return.
 
     Returns:
-        tuple: A tuple containing a dictionary with the user's favorite drinks and HTTP status code.
+        dict: A dictionary with the created drinks and their like count, most liked first.
 
     Raises:
-        HTTPException: If an error occurs while processing the request, such as user not found or no favorites found.
+        HTTPException: If an error occurs while loading the leaderboard.
     """
     try:
-        user_id = int(user_id)
-        # Use the new connection class with a context manager
-        with DatabaseConnection() as (conn, cursor):
-            # Check if the user exists (you can add more checks here)
-            query = "SELECT * FROM users WHERE id = %s"
-            cursor.execute(query, (user_id,))
-            existing_user = cursor.fetchone()
-
-            if not existing_user:
-                raise HTTPException(
-                    status_code=404, detail="User not found")
-
-            cursor.execute(
-                "SELECT user_id, drink_created_id FROM favoris WHERE user_id = %s",
-                (user_id,)
-            )
-            favoris = cursor.fetchall()
-            if not favoris:
-                raise HTTPException(
-                    status_code=404, detail="Not favoris found")
-        return {"favoris": favoris}
+        return {"drinks": await top_drinks.get(limit)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,95 @@
+"""
+Copy the supplements stored as JSON in drink_created.supplement_id into drink_created_supplement_association.
+
+Run once from the api directory, after `python migrate.py upgrade` has added the quantity column and the code
+that reads the association table is deployed:
+
+    python -m scripts.backfill_drink_supplements --chunk-size 1000
+
+Rows are processed in chunks of increasing id, each chunk in its own transaction. The JSON column is
+left untouched and the association rows of a chunk are rewritten as a whole, so the script can be
+interrupted and run again, or resumed with --after <last id printed>.
+"""
+import argparse
+import json
+
+from config.database import DatabaseConnection
+
+
+def parse_supplements(raw):
+    """
+    Parse the JSON supplements of a created drink.
+
+    Args:
+        raw (str): The JSON object mapping supplement IDs to quantities.
+
+    Returns:
+        list: The (supplement_id, quantity) pairs.
+
+    Raises:
+        ValueError: If the JSON or one of its entries is invalid.
+    """
+    supplements = json.loads(raw) if raw else {}
+    if not isinstance(supplements, dict):
+        raise ValueError("supplements must be a JSON object")
+    return [(int(supplement_id), int(quantity)) for supplement_id, quantity in supplements.items()]
+
+
+def backfill(chunk_size, after):
+    """
+    Copy the JSON supplements of every created drink with an id greater than `after`.
+
+    Args:
+        chunk_size (int): Number of created drinks handled per transaction.
+        after (int): Only created drinks with a greater id are handled.
+
+    Returns:
+        int: Number of association rows written.
+    """
+    written = 0
+    with DatabaseConnection() as (conn, cursor):
+        while True:
+            cursor.execute(
+                "SELECT id, supplement_id FROM drink_created "
+                "WHERE id > %s AND supplement_id IS NOT NULL ORDER BY id LIMIT %s",
+                (after, chunk_size)
+            )
+            drinks = cursor.fetchall()
+            if not drinks:
+                break
+
+            rows = []
+            for drink in drinks:
+                try:
+                    supplements = parse_supplements(drink['supplement_id'])
+                except (TypeError, ValueError) as err:
+                    print(f"Skipping drink_created {drink['id']}: {err}")
+                    continue
+                rows.extend((drink['id'], supplement_id, quantity) for supplement_id, quantity in supplements)
+
+            ids = [drink['id'] for drink in drinks]
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(
+                f"DELETE FROM drink_created_supplement_association WHERE drink_created_id IN ({placeholders})",
+                ids
+            )
+            if rows:
+                cursor.executemany(
+                    "INSERT INTO drink_created_supplement_association (drink_created_id, supplement_id, quantity) "
+                    "VALUES (%s, %s, %s)",
+                    rows
+                )
+            conn.commit()
+
+            written += len(rows)
+            after = ids[-1]
+            print(f"Backfilled up to drink_created {after} ({written} supplement rows)")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=1000, help="created drinks per transaction")
+    parser.add_argument("--after", type=int, default=0, help="resume after this drink_created id")
+    args = parser.parse_args()
+    backfill(args.chunk_size, args.after)
@@ -0,0 +1,187 @@
+import hashlib
+import os
+import secrets
+import threading
+import time
+
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from config.settings import env_number
+
+# Seconds an access token stays valid after login
+AUTH_TOKEN_TTL = env_number("AUTH_TOKEN_TTL", 3600)
+# Revoked tokens remembered at most, the oldest being dropped first
+AUTH_REVOCATION_CACHE_SIZE = env_number("AUTH_REVOCATION_CACHE_SIZE", 10000)
+# Still serve the user-scoped reads that were public before access tokens to requests without a token (1),
+# marked deprecated, or require a token (0)
+AUTH_LEGACY_READS = bool(env_number("AUTH_LEGACY_READS", 1))
+
+
+class TokenUser:
+    """
+    The user an access token was issued to.
+
+    Attributes:
+        id (int): The ID of the user.
+        role (str): The role of the user.
+        token_id (str): The unique ID of the token, used to revoke it.
+        expires_at (float): The time at which the token expires.
+    """
+
+    def __init__(self, id, role, token_id, expires_at):
+        self.id = id
+        self.role = role
+        self.token_id = token_id
+        self.expires_at = expires_at
+
+
+class TokenService:
+    """
+    Issues and verifies signed, expiring access tokens.
+
+    A token carries the user ID and role, signed with the secret key, so verifying it is a matter of
+    computing an HMAC: no database query and no bcrypt. Logged out tokens are kept in a small
+    revocation cache until they expire. The cache belongs to the process, so with several workers a
+    token logged out on one worker stays valid on the others until it expires; keep the TTL short.
+
+    Usage:
+        token = token_service.issue(user_id, role)
+        user = token_service.verify(token)
+
+    Attributes:
+        ttl (int): Seconds a token stays valid.
+        revocation_cache_size (int): Revoked tokens remembered at most.
+    """
+
+    def __init__(self, secret_key, ttl, revocation_cache_size):
+        self.ttl = ttl
+        self.revocation_cache_size = revocation_cache_size
+        self._serializer = URLSafeTimedSerializer(
+            secret_key, salt="access-token", signer_kwargs={"digest_method": hashlib.sha256})
+        # token ID -> expiry time, in insertion order
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+    def issue(self, user_id, role):
+        """
+        Create an access token for a user.
+
+        Args:
+            user_id (int): The ID of the user.
+            role (str): The role of the user.
+
+        Returns:
+            str: The signed token.
+        """
+        return self._serializer.dumps({"sub": user_id, "role": role, "jti": secrets.token_urlsafe(12)})
+
+    def verify(self, token):
+        """
+        Check the signature, the age and the revocation of a token.
+
+        Args:
+            token (str): The token sent by the client.
+
+        Returns:
+            TokenUser: The user of the token, or None if the token is invalid, expired or revoked.
+        """
+        try:
+            payload, signed_at = self._serializer.loads(token, max_age=self.ttl, return_timestamp=True)
+        except (SignatureExpired, BadSignature):
+            return None
+        if payload["jti"] in self._revoked:
+            return None
+        return TokenUser(payload["sub"], payload["role"], payload["jti"], signed_at.timestamp() + self.ttl)
+
+    def revoke(self, user):
+        """
+        Reject a token until it expires.
+
+        Args:
+            user (TokenUser): The user of the token, as returned by verify().
+        """
+        now = time.time()
+        with self._lock:
+            self._revoked[user.token_id] = user.expires_at
+            # Expired tokens are rejected anyway; drop them, then the oldest if the cache is still full
+            for token_id, expires_at in list(self._revoked.items()):
+                if expires_at > now and len(self._revoked) <= self.revocation_cache_size:
+                    break
+                del self._revoked[token_id]
+
+
+def secret_key():
+    key = os.getenv("AUTH_SECRET_KEY")
+    if not key:
+        # A random key per process would make tokens fail on the other workers and after a restart
+        raise RuntimeError("AUTH_SECRET_KEY is not set: set it in .env to the same secret on every worker")
+    return key
+
+
+token_service = TokenService(secret_key(), AUTH_TOKEN_TTL, AUTH_REVOCATION_CACHE_SIZE)
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+async def current_user(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
+    """
+    FastAPI dependency returning the user of the Bearer token of the request.
+
+    It is a coroutine so that FastAPI runs it on the event loop instead of a worker thread.
+
+    Args:
+        credentials (HTTPAuthorizationCredentials): The Authorization header, if any.
+
+    Returns:
+        TokenUser: The authenticated user.
+
+    Raises:
+        HTTPException: 401 if the token is missing, invalid, expired or revoked.
+    """
+    user = token_service.verify(credentials.credentials) if credentials else None
+    if user is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return user
+
+
+async def legacy_reader(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
+    """
+    FastAPI dependency for the user-scoped reads that did not require a token before access tokens.
+
+    A request with a token must carry a valid one. While AUTH_LEGACY_READS is on, a request without a
+    token is still served, so that clients written before tokens keep working; the route then marks
+    the response deprecated.
+
+    Args:
+        credentials (HTTPAuthorizationCredentials): The Authorization header, if any.
+
+    Returns:
+        TokenUser: The authenticated user, or None for a request without a token.
+
+    Raises:
+        HTTPException: 401 if the token is invalid, expired or revoked, or missing once AUTH_LEGACY_READS is off.
+    """
+    if credentials is None and AUTH_LEGACY_READS:
+        return None
+    return await current_user(credentials)
+
+
+def check_user(user, user_id):
+    """
+    Make sure a request only acts on behalf of the authenticated user.
+
+    Args:
+        user (TokenUser): The authenticated user.
+        user_id (int): The user ID given in the request, or None to use the authenticated user.
+
+    Returns:
+        int: The ID of the authenticated user.
+
+    Raises:
+        HTTPException: 403 if the request names another user.
+    """
+    if user_id is not None and str(user_id) != str(user.id):
+        raise HTTPException(status_code=403, detail="The token does not belong to this user")
+    return user.id
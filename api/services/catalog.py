@@ -0,0 +1,251 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+
+from config.async_database import AsyncDatabaseConnection
+from config.database import db_config
+from config.settings import env_number
+from services.catalog_file import CatalogFile, SharedCatalogFile, encode, private_directory
+
+logger = logging.getLogger(__name__)
+
+# Seconds after which the catalog is reloaded, to pick up changes made directly in SQL
+CATALOG_TTL = env_number("CATALOG_TTL", 300.0, float)
+
+
+def default_catalog_file():
+    """
+    Return the default path of the shared catalog file, one per database.
+
+    The file lives in $XDG_RUNTIME_DIR, or else in a stayabucks-<user ID> directory of the temporary
+    directory, which shared_catalog_file() creates readable by its owner only.
+    """
+    directory = os.getenv("XDG_RUNTIME_DIR")
+    if not directory:
+        user = os.geteuid() if hasattr(os, "geteuid") else os.getenv("USERNAME", "user")
+        directory = os.path.join(tempfile.gettempdir(), "stayabucks-%s" % user)
+    database = hashlib.sha1("{host}:{port}/{database}".format(**db_config).encode()).hexdigest()[:12]
+    return os.path.join(directory, "stayabucks-catalog-%s.bin" % database)
+
+
+# Catalog file shared by the workers of a host, in a directory private to the user running the server
+CATALOG_FILE = os.getenv("CATALOG_FILE") or default_catalog_file()
+
+
+class CatalogSnapshot:
+    """
+    An immutable view of the drink and supplement tables.
+
+    Attributes:
+        version (int): The catalog version this snapshot belongs to, counted by this worker.
+        generation (int): The generation of the catalog file, the same in every worker of the host.
+        drinks (Mapping): The drinks by ID, each with its name, description and price.
+        supplements (Mapping): The supplements by ID, each with its name, price and type.
+    """
+
+    def __init__(self, version, generation, drinks, supplements):
+        self.version = version
+        self.generation = generation
+        self.drinks = drinks
+        self.supplements = supplements
+
+    def drink(self, drink_id):
+        return self.drinks.get(drink_id)
+
+    def supplement(self, supplement_id):
+        return self.supplements.get(supplement_id)
+
+
+class Catalog:
+    """
+    A versioned copy of the drink and supplement tables, shared by the workers of a host.
+
+    The catalog lives in a memory-mapped catalog file (see services.catalog_file). It is loaded from
+    the database by the first worker that finds the file missing or older than the TTL, and patched by
+    the worker serving each admin write, after the commit. Every write produces a new generation of
+    the file; the other workers notice it on their next access and swap to it without querying the
+    database. Every change produces a new snapshot with a higher version, so readers holding a snapshot
+    are never affected by concurrent writes. Structures derived from the catalog subscribe to be told
+    about each change.
+
+    If the file cannot be written, the worker keeps its catalog in memory and logs a warning.
+
+    Usage:
+        snapshot = await catalog.get()
+        drink = snapshot.drink(drink_id)
+
+    Attributes:
+        ttl (float): Seconds after which the catalog is reloaded from the database.
+        shared (SharedCatalogFile): The file shared with the other workers, or None.
+    """
+
+    def __init__(self, ttl, shared=None):
+        self.ttl = ttl
+        self.shared = shared
+        self._snapshot = None
+        self._file = None
+        self._version = 0
+        self._lock = asyncio.Lock()
+        self._listeners = []
+
+    @property
+    def version(self):
+        return self._version
+
+    def _is_stale(self):
+        return self._file is None or time.time() - self._file.loaded_at > self.ttl
+
+    def _publish(self, file, table=None, key=None):
+        self._version += 1
+        self._file = file
+        self._snapshot = CatalogSnapshot(self._version, file.generation, file.drinks, file.supplements)
+        for listener in self._listeners:
+            try:
+                listener(self._snapshot, table, key)
+            except Exception:
+                # The snapshot is published all the same; the listener catches up on the next change
+                logger.exception("Catalog listener %r failed", listener)
+        return self._snapshot
+
+    def _latest(self):
+        """
+        Swap to the shared file if another worker wrote a newer generation.
+
+        Returns:
+            CatalogFile: The current catalog file, or None if the catalog was never loaded.
+        """
+        if self.shared is not None:
+            try:
+                file = self.shared.current()
+            except (OSError, ValueError) as e:
+                logger.warning("Cannot read the shared catalog file %s: %s", self.shared.path, e)
+                file = None
+            if file is not None and (self._file is None or file.generation > self._file.generation):
+                self._publish(file)
+        return self._file
+
+    @asynccontextmanager
+    async def _writing(self):
+        # One writer at a time in this worker, then across the workers of the host
+        async with self._lock, AsyncExitStack() as stack:
+            if self.shared is not None:
+                try:
+                    await stack.enter_async_context(self.shared.lock())
+                except OSError as e:
+                    logger.warning("Cannot lock the shared catalog file %s: %s", self.shared.path, e)
+            yield
+
+    def _store(self, drinks, supplements, loaded_at):
+        generation = (self._file.generation if self._file is not None else 0) + 1
+        data = encode(generation, loaded_at, drinks, supplements)
+        if self.shared is not None:
+            try:
+                return self.shared.write(data)
+            except OSError as e:
+                logger.warning("Cannot write the shared catalog file %s: %s", self.shared.path, e)
+        return CatalogFile(data)
+
+    def subscribe(self, listener):
+        """
+        Register a function called after every change of the catalog.
+
+        The listener receives the new snapshot, then the table ("drink" or "supplement") and the ID
+        of the changed row, or None and None after a full reload or a swap to the file written by another
+        worker. It is called right away with the
+        current snapshot if the catalog is already loaded.
+
+        Args:
+            listener (callable): The function to call.
+        """
+        self._listeners.append(listener)
+        if self._snapshot is not None:
+            listener(self._snapshot, None, None)
+
+    async def _load(self):
+        self._latest()
+        loaded_at = time.time()
+        async with AsyncDatabaseConnection() as (conn, cursor):
+            await cursor.execute("SELECT id, name, description, price FROM drink")
+            drinks = {row['id']: row for row in await cursor.fetchall()}
+            await cursor.execute("SELECT id, name, price, type_id FROM supplement")
+            supplements = {row['id']: row for row in await cursor.fetchall()}
+        return self._publish(self._store(drinks, supplements, loaded_at))
+
+    async def load(self):
+        """
+        Reload the whole catalog from the database and share it with the other workers.
+
+        Returns:
+            CatalogSnapshot: The freshly loaded snapshot.
+        """
+        async with self._writing():
+            return await self._load()
+
+    async def get(self):
+        """
+        Return the current snapshot, swapping to a newer shared file or reloading it first if it has expired.
+
+        Returns:
+            CatalogSnapshot: The current snapshot.
+        """
+        self._latest()
+        if self._is_stale():
+            async with self._writing():
+                # Another worker may have reloaded it while this one waited for the lock
+                self._latest()
+                if self._is_stale():
+                    await self._load()
+        return self._snapshot
+
+    async def _patch(self, table, key, row):
+        async with self._writing():
+            # Patch the latest generation, which may hold the writes of other workers
+            current = self._latest()
+            if current is None:
+                return
+            drinks = dict(current.drinks)
+            supplements = dict(current.supplements)
+            rows = drinks if table == "drink" else supplements
+            if row is None:
+                rows.pop(key, None)
+            else:
+                rows[key] = row
+            self._publish(self._store(drinks, supplements, current.loaded_at), table, key)
+
+    async def upsert_drink(self, drink_id, name, description, price):
+        await self._patch("drink", drink_id, {"id": drink_id, "name": name, "description": description, "price": price})
+
+    async def remove_drink(self, drink_id):
+        await self._patch("drink", drink_id, None)
+
+    async def upsert_supplement(self, supplement_id, name, price, type_id):
+        await self._patch("supplement", supplement_id,
+                          {"id": supplement_id, "name": name, "price": price, "type_id": type_id})
+
+    async def remove_supplement(self, supplement_id):
+        await self._patch("supplement", supplement_id, None)
+
+
+def shared_catalog_file(path):
+    """
+    Open the catalog file shared with the other workers, if its directory can be trusted.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        SharedCatalogFile: The shared file, or None to keep the catalog in the memory of each worker.
+    """
+    try:
+        private_directory(os.path.dirname(os.path.abspath(path)))
+    except OSError as e:
+        logger.warning("Not sharing the catalog between workers: %s", e)
+        return None
+    return SharedCatalogFile(path)
+
+
+catalog = Catalog(CATALOG_TTL, shared_catalog_file(CATALOG_FILE))
@@ -0,0 +1,298 @@
+import asyncio
+import mmap
+import os
+import stat
+import struct
+from collections.abc import Mapping
+from contextlib import asynccontextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are not serialized, os.replace still keeps the file whole
+    fcntl = None
+
+# Symbolic links planted in place of the files are refused where the platform allows it
+O_NOFOLLOW = getattr(os, "O_NOFOLLOW", 0)
+
+# Magic number, generation, time of the last full reload, drink count, supplement count, string table size
+HEADER = struct.Struct("<8sQdIII")
+MAGIC = b"SBCATLG1"
+# The records start 8-byte aligned after the header
+HEADER_SIZE = 64
+
+# Fixed-width records sorted by ID; the strings are (offset, size) slices of the UTF-8 string table
+DRINK_RECORD = np.dtype([
+    ("id", "<i8"), ("price", "<f8"),
+    ("name", "<u4"), ("name_size", "<u4"), ("description", "<u4"), ("description_size", "<u4"),
+])
+SUPPLEMENT_RECORD = np.dtype([
+    ("id", "<i8"), ("price", "<f8"), ("type_id", "<i8"),
+    ("name", "<u4"), ("name_size", "<u4"),
+])
+
+
+def check_owner(status, path):
+    """
+    Make sure a file or directory belongs to the user running the server.
+
+    Args:
+        status (os.stat_result): The status of the file.
+        path (str): Its path, for the error message.
+
+    Raises:
+        PermissionError: If another user owns it.
+    """
+    if hasattr(os, "geteuid") and status.st_uid != os.geteuid():
+        raise PermissionError("%s belongs to another user" % path)
+
+
+def private_directory(path):
+    """
+    Create a directory only the current user can use, or check that an existing one is.
+
+    Args:
+        path (str): The path of the directory.
+
+    Raises:
+        PermissionError: If the directory is a symbolic link, belongs to another user, or other users
+            can write to it.
+    """
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    status = os.lstat(path)
+    if not stat.S_ISDIR(status.st_mode):
+        raise PermissionError("%s is not a directory" % path)
+    check_owner(status, path)
+    if hasattr(os, "geteuid") and status.st_mode & 0o022:
+        raise PermissionError("%s is writable by other users" % path)
+
+
+class RecordMap(Mapping):
+    """
+    A read-only mapping from ID to row over the fixed-width records of a catalog file.
+
+    Rows are decoded from the file on access, so a worker holds no copy of the catalog.
+
+    Attributes:
+        records (numpy.ndarray): The records, sorted by ID, viewing the file.
+        ids (numpy.ndarray): The ID column of the records.
+    """
+
+    def __init__(self, records, strings, decode):
+        self.records = records
+        self.ids = records["id"]
+        self._strings = strings
+        self._decode = decode
+
+    def string(self, offset, size):
+        return str(self._strings[offset:offset + size], "utf-8")
+
+    def __getitem__(self, key):
+        try:
+            index = int(np.searchsorted(self.ids, key))
+        except (TypeError, OverflowError):
+            raise KeyError(key)
+        if index == len(self.ids) or self.ids[index] != key:
+            raise KeyError(key)
+        return self._decode(self, self.records[index])
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def decode_drink(rows, record):
+    return {
+        "id": int(record["id"]),
+        "name": rows.string(record["name"], record["name_size"]),
+        "description": rows.string(record["description"], record["description_size"]),
+        "price": float(record["price"]),
+    }
+
+
+def decode_supplement(rows, record):
+    return {
+        "id": int(record["id"]),
+        "name": rows.string(record["name"], record["name_size"]),
+        "price": float(record["price"]),
+        "type_id": int(record["type_id"]),
+    }
+
+
+class CatalogFile:
+    """
+    A catalog snapshot laid out as a header, the drink and supplement records and a string table.
+
+    Attributes:
+        generation (int): Incremented by every write of the shared file.
+        loaded_at (float): The time.time() of the last full reload from the database.
+        drinks (RecordMap): The drinks by ID.
+        supplements (RecordMap): The supplements by ID.
+    """
+
+    def __init__(self, buffer):
+        if len(buffer) < HEADER_SIZE:
+            raise ValueError("Truncated catalog file")
+        magic, self.generation, self.loaded_at, drink_count, supplement_count, strings_size = \
+            HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError("Not a catalog file")
+        supplements_offset = HEADER_SIZE + drink_count * DRINK_RECORD.itemsize
+        strings_offset = supplements_offset + supplement_count * SUPPLEMENT_RECORD.itemsize
+        if len(buffer) < strings_offset + strings_size:
+            raise ValueError("Truncated catalog file")
+
+        strings = memoryview(buffer)[strings_offset:strings_offset + strings_size]
+        drinks = np.frombuffer(buffer, DRINK_RECORD, drink_count, HEADER_SIZE)
+        supplements = np.frombuffer(buffer, SUPPLEMENT_RECORD, supplement_count, supplements_offset)
+        self.drinks = RecordMap(drinks, strings, decode_drink)
+        self.supplements = RecordMap(supplements, strings, decode_supplement)
+
+    @classmethod
+    def open(cls, path):
+        """
+        Memory-map a catalog file read-only.
+
+        Args:
+            path (str): The path of the file.
+
+        Returns:
+            tuple: The CatalogFile and the (device, inode) of the mapped file.
+        """
+        fd = os.open(path, os.O_RDONLY | O_NOFOLLOW)
+        try:
+            status = os.fstat(fd)
+            check_owner(status, path)
+            if status.st_size == 0:
+                raise ValueError("Empty catalog file")
+            # The mapping outlives the file descriptor, and the file once another writer replaces it
+            buffer = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        return cls(buffer), (status.st_dev, status.st_ino)
+
+
+def encode(generation, loaded_at, drinks, supplements):
+    """
+    Lay out a catalog as the bytes of a catalog file.
+
+    Args:
+        generation (int): The generation of the file.
+        loaded_at (float): The time.time() of the last full reload from the database.
+        drinks (dict): The drinks by ID, each with its name, description and price.
+        supplements (dict): The supplements by ID, each with its name, price and type_id.
+
+    Returns:
+        bytes: The content of the file.
+    """
+    strings = bytearray()
+
+    def add_string(value):
+        data = value.encode("utf-8")
+        strings.extend(data)
+        return len(strings) - len(data), len(data)
+
+    drink_records = np.zeros(len(drinks), DRINK_RECORD)
+    for record, drink_id in zip(drink_records, sorted(drinks)):
+        drink = drinks[drink_id]
+        record["id"], record["price"] = drink_id, drink["price"]
+        record["name"], record["name_size"] = add_string(drink["name"])
+        record["description"], record["description_size"] = add_string(drink["description"])
+
+    supplement_records = np.zeros(len(supplements), SUPPLEMENT_RECORD)
+    for record, supplement_id in zip(supplement_records, sorted(supplements)):
+        supplement = supplements[supplement_id]
+        record["id"], record["price"], record["type_id"] = supplement_id, supplement["price"], supplement["type_id"]
+        record["name"], record["name_size"] = add_string(supplement["name"])
+
+    header = HEADER.pack(MAGIC, generation, loaded_at, len(drinks), len(supplements), len(strings))
+    return b"".join([header.ljust(HEADER_SIZE, b"\0"), drink_records.tobytes(), supplement_records.tobytes(),
+                     bytes(strings)])
+
+
+class SharedCatalogFile:
+    """
+    The catalog file shared by the workers of a host.
+
+    Writers hold an exclusive lock on a companion .lock file, write the new generation to a temporary
+    file and rename it over the shared one, so readers never see a partial file. Readers only compare
+    the inode of the path with the one they mapped: a worker sees another worker's write without any
+    lock or database query, and keeps reading its current mapping meanwhile.
+
+    The files are created readable by their owner only, and files that are symbolic links or belong to
+    another user are refused, so keep them in a directory checked with private_directory().
+
+    Usage:
+        async with shared.lock():
+            latest = shared.current()
+            shared.write(encode(latest.generation + 1, ...))
+
+    Attributes:
+        path (str): The path of the shared file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mapped = None
+        self._key = None
+
+    def current(self):
+        """
+        Return the latest catalog file, mapping it again only if it was replaced since the last call.
+
+        Returns:
+            CatalogFile: The mapped file, or None if no worker wrote it yet.
+
+        Raises:
+            OSError, ValueError: If the file cannot be read.
+        """
+        try:
+            status = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # Mapping the file keeps its inode alive, so a replacement cannot reuse the same number
+        if (status.st_dev, status.st_ino) != self._key:
+            self._mapped, self._key = CatalogFile.open(self.path)
+        return self._mapped
+
+    @asynccontextmanager
+    async def lock(self):
+        """
+        Hold the exclusive write lock, waiting for it in a thread so as not to block the event loop.
+        """
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT | O_NOFOLLOW, 0o600)
+        try:
+            check_owner(os.fstat(fd), self.path + ".lock")
+            if fcntl is not None:
+                await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(fd)
+
+    def write(self, data):
+        """
+        Atomically replace the shared file. Call it while holding the lock.
+
+        Args:
+            data (bytes): The content of the new file, from encode().
+
+        Returns:
+            CatalogFile: The new file, mapped.
+        """
+        temporary = "%s.%d.tmp" % (self.path, os.getpid())
+        try:
+            # Left over by a crashed worker with the same process ID
+            os.unlink(temporary)
+        except FileNotFoundError:
+            pass
+        with os.fdopen(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_EXCL | O_NOFOLLOW, 0o600), "wb") as file:
+            file.write(data)
+        os.replace(temporary, self.path)
+        return self.current()
@@ -0,0 +1,106 @@
+import hashlib
+
+from fastapi import Response
+
+from config.async_database import AsyncDatabaseConnection
+
+# Clients may keep the response but must revalidate it, which costs a 304 when nothing changed
+CACHE_CONTROL = "private, no-cache"
+
+# Columns of users counting the writes to each list of the user, bumped in the transaction of the write
+VERSION_COLUMNS = {"drinks": "drinks_version", "favoris": "favoris_version"}
+
+
+def bump_version_query(kind, count=1):
+    """
+    Build the UPDATE that bumps the version of a list of some users, to run in the transaction of the write.
+
+    The version lives in the database, so every worker builds the same ETags and none of them answers 304
+    once the data has changed, whichever worker served the write.
+
+    Usage:
+        cursor.execute(bump_version_query("favoris"), (user_id,))
+
+    Args:
+        kind (str): The list, "drinks" or "favoris".
+        count (int): The number of user IDs passed as parameters.
+
+    Returns:
+        str: The UPDATE statement.
+    """
+    column = VERSION_COLUMNS[kind]
+    placeholders = ", ".join(["%s"] * count)
+    return f"UPDATE users SET {column} = {column} + 1 WHERE id IN ({placeholders})"
+
+
+async def read_version(cursor, kind, user_id):
+    """
+    Read the version of a list of a user on an open connection.
+
+    Read it in the transaction that reads the list, so that the version matches the rows returned.
+
+    Args:
+        cursor (AsyncInstrumentedCursor): The cursor of the connection.
+        kind (str): The list, "drinks" or "favoris".
+        user_id (int): The ID of the user.
+
+    Returns:
+        int: The version, 0 for an unknown user.
+    """
+    await cursor.execute(f"SELECT {VERSION_COLUMNS[kind]} AS version FROM users WHERE id = %s", (user_id,))
+    row = await cursor.fetchone()
+    return row['version'] if row else 0
+
+
+async def user_version(kind, user_id):
+    """
+    Read the version of a list of a user, to tell whether the client's copy is current.
+
+    Args:
+        kind (str): The list, "drinks" or "favoris".
+        user_id (int): The ID of the user.
+
+    Returns:
+        int: The version, 0 for an unknown user.
+    """
+    # Read-only: served by a replica unless the user has just written, like the list itself
+    async with AsyncDatabaseConnection(readonly=True, user_id=user_id) as (conn, cursor):
+        return await read_version(cursor, kind, user_id)
+
+
+def make_etag(*parts):
+    """
+    Build a strong ETag from the values a response depends on.
+
+    Args:
+        *parts: The route, its parameters and the versions of the data it reads.
+
+    Returns:
+        str: The quoted ETag.
+    """
+    key = ":".join(str(part) for part in parts)
+    return '"' + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def conditional_response(request, response, etag):
+    """
+    Set the caching headers of a response and answer 304 when the client already has it.
+
+    Args:
+        request (Request): The incoming request, possibly with an If-None-Match header.
+        response (Response): The response the route will send, which receives the ETag.
+        etag (str): The ETag of the current representation.
+
+    Returns:
+        Response: A 304 response to return as is, or None if the route must build the response.
+    """
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+        # If-None-Match uses the weak comparison: a W/ prefix added by a proxy is ignored
+        if "*" in candidates or etag in (candidate.removeprefix("W/") for candidate in candidates):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
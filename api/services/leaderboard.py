@@ -0,0 +1,104 @@
+import bisect
+import threading
+import time
+
+from config.async_database import AsyncDatabaseConnection
+from config.settings import env_number
+from services.singleflight import read_flights
+
+# Number of created drinks kept in the leaderboard
+TOP_DRINKS_SIZE = env_number("TOP_DRINKS_SIZE", 100)
+# Seconds after which the leaderboard is reloaded, to include likes recorded by other workers
+TOP_DRINKS_TTL = env_number("TOP_DRINKS_TTL", 30.0, float)
+
+
+class TopDrinks:
+    """
+    The most liked created drinks, kept sorted in memory.
+
+    The leaderboard is loaded from drink_created.like_count, then updated incrementally with
+    every like recorded by this process. Like counts only grow, so a drink either moves up
+    within the leaderboard or enters it by pushing out the last one. The leaderboard is
+    reloaded once its TTL expires to account for likes recorded by other processes; concurrent
+    requests arriving meanwhile share a single reload.
+
+    Usage:
+        top_drinks.observe(drink_created_id, like_count)
+        drinks = await top_drinks.get(10)
+
+    Attributes:
+        size (int): Number of created drinks kept.
+        ttl (float): Seconds after which the leaderboard is reloaded from the database.
+    """
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        # (-like_count, drink_created_id), so the most liked drinks come first
+        self._entries = []
+        self._counts = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    async def load(self):
+        """
+        Reload the leaderboard from the database.
+        """
+        # A lagging replica only delays likes the leaderboard has not observed itself
+        async with AsyncDatabaseConnection(readonly=True) as (conn, cursor):
+            await cursor.execute(
+                "SELECT id, like_count FROM drink_created WHERE like_count > 0 "
+                "ORDER BY like_count DESC, id LIMIT %s",
+                (self.size,)
+            )
+            rows = await cursor.fetchall()
+        with self._lock:
+            self._entries = sorted((-row['like_count'], row['id']) for row in rows)
+            self._counts = {row['id']: row['like_count'] for row in rows}
+            self._loaded_at = time.monotonic()
+
+    def observe(self, drink_created_id, like_count):
+        """
+        Record the new like count of a created drink.
+
+        Args:
+            drink_created_id (int): The ID of the created drink.
+            like_count (int): Its like count after the latest like.
+        """
+        entry = (-like_count, drink_created_id)
+        with self._lock:
+            previous = self._counts.get(drink_created_id)
+            if previous is not None:
+                if previous >= like_count:
+                    return
+                del self._entries[bisect.bisect_left(self._entries, (-previous, drink_created_id))]
+            elif len(self._entries) >= self.size and entry >= self._entries[-1]:
+                return
+
+            bisect.insort(self._entries, entry)
+            self._counts[drink_created_id] = like_count
+            if len(self._entries) > self.size:
+                _, dropped = self._entries.pop()
+                del self._counts[dropped]
+
+    async def get(self, limit):
+        """
+        Return the most liked created drinks, reloading the leaderboard first if it has expired.
+
+        Args:
+            limit (int): The number of created drinks to return.
+
+        Returns:
+            list: The created drinks with their like count, most liked first.
+        """
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            await read_flights.do("top-drinks", "leaderboard", "reload", self.load)
+        with self._lock:
+            entries = self._entries[:limit]
+        return [{"drink_created_id": drink_created_id, "like_count": -count} for count, drink_created_id in entries]
+
+
+top_drinks = TopDrinks(TOP_DRINKS_SIZE, TOP_DRINKS_TTL)
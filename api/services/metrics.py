@@ -0,0 +1,262 @@
+import math
+import threading
+
+# Upper bounds in seconds of the latency histograms, from a cached lookup to a slow query
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the rows returned by a statement
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# SQL verbs used as label values; anything else is reported as "other" to bound the label values
+SQL_OPERATIONS = {"select", "insert", "update", "delete", "replace", "create", "alter", "drop", "set", "show"}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    """
+    The metrics exposed by /metrics, rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Render every registered metric.
+
+        Returns:
+            str: The metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class Metric:
+    """
+    A named metric with one value per combination of label values.
+
+    Attributes:
+        name (str): The metric name.
+        documentation (str): The help text.
+        labelnames (tuple): The names of the labels, whose values are passed positionally.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(str(label) for label in labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in values]
+
+
+class Counter(Metric):
+    """
+    A value that only goes up, such as a number of requests.
+
+    Usage:
+        requests_total.inc("GET", "200")
+    """
+
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down, such as a number of requests in progress.
+
+    Usage:
+        in_progress.inc("GET")
+        in_progress.dec("GET")
+    """
+
+    type = "gauge"
+
+    def inc(self, *labels, amount=1):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class CallbackGauge(Metric):
+    """
+    A gauge read from the application when /metrics is scraped, such as the state of a pool.
+
+    Usage:
+        CallbackGauge("pool_connections", "Connections by state", lambda: {("idle",): 3}, ("state",))
+
+    Attributes:
+        callback (callable): Returns a dictionary of values by tuple of label values.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def samples(self):
+        try:
+            values = sorted((self._key(labels), value) for labels, value in self.callback().items())
+        except Exception:
+            # A failing source must not break the whole scrape
+            return []
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in values]
+
+
+class CallbackCounter(CallbackGauge):
+    """
+    A counter maintained by the application and read when /metrics is scraped.
+    """
+
+    type = "counter"
+
+
+class Histogram(Metric):
+    """
+    A distribution of observed values, such as request latencies, counted in cumulative buckets.
+
+    Usage:
+        request_seconds.observe(0.012, "GET", "/perso-drinks/{user_id}")
+
+    Attributes:
+        buckets (tuple): The upper bounds of the buckets, in increasing order.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, *labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts, then the sum of the observations
+                state = self._values[key] = [[0] * len(self.buckets), 0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+# HTTP layer, labelled with the route template rather than the raw path
+http_requests_total = Counter(
+    "http_requests_total", "HTTP requests handled, by route and status code.", ("method", "route", "status"))
+http_request_duration_seconds = Histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests.", ("method", "route"))
+http_requests_in_progress = Gauge(
+    "http_requests_in_progress", "HTTP requests being handled.", ("method", "route"))
+
+# Database layer, labelled with the pool ("sync" or "async") and the SQL verb
+db_connect_duration_seconds = Histogram(
+    "db_connect_duration_seconds", "Time spent opening new database connections.", ("pool",))
+db_acquire_duration_seconds = Histogram(
+    "db_acquire_duration_seconds", "Time spent checking a connection out of a pool, including opening it.",
+    ("pool",))
+db_statement_duration_seconds = Histogram(
+    "db_statement_duration_seconds", "Time spent executing SQL statements.", ("pool", "operation"))
+db_statement_errors_total = Counter(
+    "db_statement_errors_total", "SQL statements that raised an error.", ("pool", "operation"))
+db_rows_returned = Histogram(
+    "db_rows_returned", "Rows fetched per SQL statement.", ("pool", "operation"), buckets=ROW_BUCKETS)
+db_prepared_statements_total = Counter(
+    "db_prepared_statements_total",
+    "Lookups of the prepared statement caches of the sync pool connections, by result (hit, miss, evicted).",
+    ("result",))
+
+# Write-behind queues of likes and favorites, labelled with the kind of rows
+write_behind_flush_duration_seconds = Histogram(
+    "write_behind_flush_duration_seconds", "Time spent writing a batch of queued rows.", ("kind",))
+
+
+def sql_operation(query):
+    """
+    Return the verb of a SQL statement, used to label the database metrics.
+
+    Args:
+        query (str): The SQL statement.
+
+    Returns:
+        str: The lowercase first keyword, such as "select" or "insert", or "other".
+    """
+    words = query.lstrip(" (\n\t").split(None, 1)
+    operation = words[0].lower() if words else ""
+    return operation if operation in SQL_OPERATIONS else "other"
@@ -0,0 +1,128 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from config.settings import env_number
+
+# Threads running bcrypt, i.e. how many hashes are computed at the same time
+PASSWORD_HASH_WORKERS = env_number("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1))
+# Requests allowed to wait for a free thread before new ones are turned away
+PASSWORD_HASH_MAX_QUEUE = env_number("PASSWORD_HASH_MAX_QUEUE", 64)
+
+
+class PasswordHasherBusy(Exception):
+    """
+    Raised when too many password operations are already waiting for a worker.
+    """
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification on a bounded thread pool.
+
+    bcrypt releases the GIL while hashing, so the event loop keeps serving other requests
+    while a password is processed. At most `workers` operations run at once; up to
+    `max_queue` more wait for a slot and any request beyond that is rejected.
+
+    Usage:
+        hashed = await password_hasher.hash(password)
+        valid = await password_hasher.verify(password, hashed)
+
+    Attributes:
+        workers (int): Number of operations running at the same time.
+        max_queue (int): Number of operations allowed to wait for a worker.
+        rejected (int): Number of operations turned away because the queue was full.
+        completed (int): Number of operations that ran to completion.
+    """
+
+    def __init__(self, workers, max_queue):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rejected = 0
+        self.completed = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = asyncio.Semaphore(workers)
+        self._queued = 0
+        self._running = 0
+
+    @property
+    def queue_depth(self):
+        """
+        Number of operations currently waiting for a worker.
+        """
+        return self._queued
+
+    @property
+    def in_flight(self):
+        """
+        Number of operations currently running on a worker.
+        """
+        return self._running
+
+    async def _run(self, function, *args):
+        if self._slots.locked() and self._queued >= self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusy("Too many password operations in progress")
+
+        self._queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._queued -= 1
+
+        self._running += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+            self.completed += 1
+            return result
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+    async def hash(self, password):
+        """
+        Hash a password with a fresh salt.
+
+        Args:
+            password (str): The plain text password.
+
+        Returns:
+            bytes: The bcrypt hash.
+        """
+        return await self._run(lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()))
+
+    async def verify(self, password, hashed_password):
+        """
+        Check a password against a bcrypt hash.
+
+        Args:
+            password (str): The plain text password.
+            hashed_password (str): The stored bcrypt hash.
+
+        Returns:
+            bool: True if the password matches the hash.
+        """
+        return await self._run(bcrypt.checkpw, password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        """
+        Describe the current load of the hasher.
+
+        Returns:
+            dict: The number of running, queued, rejected and completed operations.
+        """
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "rejected": self.rejected,
+            "completed": self.completed,
+        }
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
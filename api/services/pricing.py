@@ -0,0 +1,170 @@
+import logging
+
+import numpy as np
+
+from services.catalog import catalog
+
+logger = logging.getLogger(__name__)
+
+# IDs beyond this are never in the catalog; checked before converting to int64
+MAX_ID = 2 ** 62
+
+
+class PriceTable:
+    """
+    The prices of a catalog snapshot in contiguous arrays sorted by ID, looked up by binary search.
+
+    The arrays hold one entry per row, so their size does not depend on how large the IDs are.
+
+    Attributes:
+        version (int): The catalog version the prices come from.
+        drink_ids (numpy.ndarray): The drink IDs, sorted.
+        drink_prices (numpy.ndarray): The price of each drink of drink_ids.
+        supplement_ids (numpy.ndarray): The supplement IDs, sorted.
+        supplement_prices (numpy.ndarray): The price of each supplement of supplement_ids.
+    """
+
+    def __init__(self, snapshot):
+        self.version = snapshot.version
+        self.drink_ids, self.drink_prices = self._build(snapshot.drinks)
+        self.supplement_ids, self.supplement_prices = self._build(snapshot.supplements)
+
+    @staticmethod
+    def _build(rows):
+        # The catalog file records are already sorted by ID; copy the two columns out of the mapping
+        return np.array(rows.ids, dtype=np.int64), np.array(rows.records["price"], dtype=np.float64)
+
+    @staticmethod
+    def _lookup(known_ids, prices, ids):
+        found = np.full(ids.shape, np.nan)
+        if len(known_ids):
+            positions = np.minimum(np.searchsorted(known_ids, ids), len(known_ids) - 1)
+            matches = known_ids[positions] == ids
+            found[matches] = prices[positions[matches]]
+        return found
+
+    def price(self, drink_ids, owners, supplement_ids, quantities):
+        """
+        Price many drinks with their supplements in one vectorized pass.
+
+        Args:
+            drink_ids (numpy.ndarray): The drink ID of each configuration.
+            owners (numpy.ndarray): For each supplement line, the index of its configuration.
+            supplement_ids (numpy.ndarray): The supplement ID of each supplement line.
+            quantities (numpy.ndarray): The quantity of each supplement line.
+
+        Returns:
+            tuple: The total price of each configuration, NaN when its drink is unknown, then for each
+            configuration the number of unknown supplements and the number of non-positive quantities.
+        """
+        count = len(drink_ids)
+        line_prices = self._lookup(self.supplement_ids, self.supplement_prices, supplement_ids)
+        unknown = np.isnan(line_prices)
+        extras = np.bincount(owners, weights=np.where(unknown, 0.0, line_prices * quantities), minlength=count)
+        totals = np.round(self._lookup(self.drink_ids, self.drink_prices, drink_ids) + extras, 2)
+        unknown_supplements = np.bincount(owners, weights=unknown, minlength=count)
+        invalid_quantities = np.bincount(owners, weights=quantities <= 0, minlength=count)
+        return totals, unknown_supplements, invalid_quantities
+
+    def quote(self, configurations):
+        """
+        Price configurations and report why the invalid ones cannot be priced.
+
+        Args:
+            configurations (list): The (drink ID, {supplement ID: quantity}) pairs.
+
+        Returns:
+            tuple: The total prices, NaN for unknown drinks, the number of unknown supplements and the
+            number of non-positive quantities of each configuration, as arrays.
+        """
+        return self.price(*flatten(configurations))
+
+    def prices(self, configurations):
+        """
+        Price configurations, ignoring supplements that are no longer in the catalog.
+
+        Args:
+            configurations (list): The (drink ID, {supplement ID: quantity}) pairs.
+
+        Returns:
+            list: The total price of each configuration, or None if its drink is not in the catalog.
+        """
+        totals = self.quote(configurations)[0]
+        return [None if np.isnan(total) else float(total) for total in totals]
+
+
+def flatten(configurations):
+    """
+    Turn (drink ID, {supplement ID: quantity}) pairs into the arrays expected by PriceTable.price.
+
+    Args:
+        configurations (list): The drink configurations.
+
+    Returns:
+        tuple: The drink_ids, owners, supplement_ids and quantities arrays.
+    """
+    def as_id(value):
+        return value if 0 <= value < MAX_ID else -1
+
+    count = len(configurations)
+    lines = [len(supplements) for _, supplements in configurations]
+    total_lines = sum(lines)
+    drink_ids = np.fromiter((as_id(drink_id) for drink_id, _ in configurations), dtype=np.int64, count=count)
+    owners = np.repeat(np.arange(count), lines)
+    supplement_ids = np.fromiter(
+        (as_id(supplement_id) for _, supplements in configurations for supplement_id in supplements),
+        dtype=np.int64, count=total_lines)
+    quantities = np.fromiter(
+        (max(-1, min(quantity, MAX_ID)) for _, supplements in configurations for quantity in supplements.values()),
+        dtype=np.int64, count=total_lines)
+    return drink_ids, owners, supplement_ids, quantities
+
+
+class PricingEngine:
+    """
+    Keeps a price table in step with the catalog, rebuilding it after every change.
+
+    Ask for the table of the snapshot the request read, so that the prices match it even if the catalog
+    changes while the request waits for the database. If the rebuild after a change failed, the table
+    is built on the next request instead of serving the prices of an older snapshot.
+
+    Usage:
+        snapshot = await catalog.get()
+        prices = pricing.table_for(snapshot)
+        totals = prices.prices([(drink_id, {supplement_id: quantity})])
+
+    Attributes:
+        table (PriceTable): The prices of the latest snapshot built.
+    """
+
+    def __init__(self):
+        self.table = None
+
+    def table_for(self, snapshot):
+        """
+        Return the prices of a catalog snapshot, building them if the table is older.
+
+        Args:
+            snapshot (CatalogSnapshot): The snapshot read by the request.
+
+        Returns:
+            PriceTable: The prices of the snapshot.
+        """
+        table = self.table
+        if table is None or table.version != snapshot.version:
+            table = PriceTable(snapshot)
+            # A request still holding an older snapshot must not replace a newer table
+            if self.table is None or self.table.version < table.version:
+                self.table = table
+        return table
+
+    def on_catalog_change(self, snapshot, table, key):
+        # Catalogs are small; rebuilding is simpler than patching and swaps the arrays atomically
+        try:
+            self.table_for(snapshot)
+        except Exception:
+            logger.exception("Building the prices of catalog version %d failed", snapshot.version)
+
+
+pricing = PricingEngine()
+catalog.subscribe(pricing.on_catalog_change)
@@ -0,0 +1,190 @@
+import bisect
+import re
+import unicodedata
+
+from services.catalog import catalog
+
+# Score of a query term matching a drink, by field and by kind of match
+NAME_EXACT_SCORE = 4.0
+NAME_PREFIX_SCORE = 2.0
+DESCRIPTION_EXACT_SCORE = 1.0
+DESCRIPTION_PREFIX_SCORE = 0.5
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+LIGATURES = str.maketrans({"œ": "oe", "æ": "ae"})
+
+
+def tokenize(text):
+    """
+    Split a text into lowercase, accent-free words, so that "Crème brûlée" gives ["creme", "brulee"].
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        list: The words of the text.
+    """
+    text = unicodedata.normalize("NFKD", (text or "").casefold().translate(LIGATURES))
+    text = "".join(character for character in text if not unicodedata.combining(character))
+    return TOKEN_PATTERN.findall(text)
+
+
+class DrinkSearchIndex:
+    """
+    An inverted index over the name and description of the drinks of the catalog.
+
+    Each word maps to the drinks containing it, and the sorted list of known words answers prefix
+    lookups by bisection, so every keystroke of a type-ahead search is answered from memory. The
+    index follows the catalog: it is rebuilt after a full reload and patched drink by drink after
+    the admin endpoints change one.
+
+    Usage:
+        results = search_index.search("cafe lat", max_price=5.0)
+    """
+
+    def __init__(self):
+        self._drinks = {}
+        # word -> {drink_id: score of an exact match of the word}
+        self._postings = {}
+        self._words = []
+
+    def _add_word(self, word, drink_id, score):
+        postings = self._postings.get(word)
+        if postings is None:
+            postings = self._postings[word] = {}
+            bisect.insort(self._words, word)
+        postings[drink_id] = max(postings.get(drink_id, 0.0), score)
+
+    def _remove_word(self, word, drink_id):
+        postings = self._postings[word]
+        postings.pop(drink_id, None)
+        if not postings:
+            del self._postings[word]
+            del self._words[bisect.bisect_left(self._words, word)]
+
+    def add(self, drink):
+        """
+        Index a drink, replacing its previous entry if any.
+
+        Args:
+            drink (dict): The drink with its id, name, description and price.
+        """
+        self.remove(drink['id'])
+        words = {}
+        for word in tokenize(drink.get('description')):
+            words[word] = DESCRIPTION_EXACT_SCORE
+        for word in tokenize(drink['name']):
+            words[word] = NAME_EXACT_SCORE
+        for word, score in words.items():
+            self._add_word(word, drink['id'], score)
+        self._drinks[drink['id']] = (drink, words)
+
+    def remove(self, drink_id):
+        """
+        Remove a drink from the index.
+
+        Args:
+            drink_id (int): The ID of the drink.
+        """
+        entry = self._drinks.pop(drink_id, None)
+        if entry is not None:
+            for word in entry[1]:
+                self._remove_word(word, drink_id)
+
+    def rebuild(self, drinks):
+        """
+        Index a whole set of drinks from scratch.
+
+        Args:
+            drinks (iterable): The drinks to index.
+        """
+        self._drinks = {}
+        self._postings = {}
+        self._words = []
+        for drink in drinks:
+            self.add(drink)
+
+    def on_catalog_change(self, snapshot, table, key):
+        if table is None:
+            self.rebuild(snapshot.drinks.values())
+        elif table == "drink":
+            drink = snapshot.drink(key)
+            if drink is None:
+                self.remove(key)
+            else:
+                self.add(drink)
+
+    @staticmethod
+    def _score(term, word, exact_score):
+        if word == term:
+            return exact_score
+        return NAME_PREFIX_SCORE if exact_score == NAME_EXACT_SCORE else DESCRIPTION_PREFIX_SCORE
+
+    def _match(self, term):
+        """
+        Score the drinks matching a query term, exactly or as a prefix of one of their words.
+        """
+        scores = {}
+        words = self._words
+        index = bisect.bisect_left(words, term)
+        while index < len(words) and words[index].startswith(term):
+            word = words[index]
+            index += 1
+            for drink_id, exact_score in self._postings[word].items():
+                scores[drink_id] = max(scores.get(drink_id, 0.0), self._score(term, word, exact_score))
+        return scores
+
+    def _refine(self, scores, term):
+        """
+        Keep the candidate drinks that also match a query term, adding its score.
+        """
+        refined = {}
+        for drink_id, score in scores.items():
+            best = 0.0
+            for word, exact_score in self._drinks[drink_id][1].items():
+                if word.startswith(term):
+                    best = max(best, self._score(term, word, exact_score))
+            if best:
+                refined[drink_id] = score + best
+        return refined
+
+    def search(self, query, max_price=None, limit=20):
+        """
+        Find the drinks whose name or description contains every word of a query.
+
+        Every query word also matches the words it is a prefix of. Drinks are ranked by the sum of
+        the scores of the query words, name matches weighing more than description matches, and
+        exact words more than prefixes.
+
+        Args:
+            query (str): The words to look for.
+            max_price (float, optional): Only return drinks up to this price.
+            limit (int): The maximum number of drinks to return.
+
+        Returns:
+            list: The matching drinks, best first.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        # The longest term is the most selective: look it up in the index, then check the
+        # remaining terms against the words of the few candidates left
+        terms = sorted(set(terms), key=len, reverse=True)
+        scores = self._match(terms[0])
+        for term in terms[1:]:
+            if not scores:
+                return []
+            scores = self._refine(scores, term)
+
+        results = []
+        for drink_id, score in scores.items():
+            drink = self._drinks[drink_id][0]
+            if max_price is None or drink['price'] <= max_price:
+                results.append((-score, drink['name'], drink_id, drink))
+        results.sort(key=lambda result: result[:3])
+        return [result[3] for result in results[:limit]]
+
+
+search_index = DrinkSearchIndex()
+catalog.subscribe(search_index.on_catalog_change)
@@ -0,0 +1,88 @@
+import asyncio
+import heapq
+
+from config.settings import env_number
+
+# Keys with the most deduplicated calls reported by /metrics
+SINGLEFLIGHT_TOP_KEYS = env_number("SINGLEFLIGHT_TOP_KEYS", 20)
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent reads: while a computation for a key runs, callers asking for the
+    same key wait for it and all receive its result, or its exception, instead of running it again.
+
+    The computation runs in its own task, so a caller that goes away does not cancel it for the
+    others. Nothing is cached: a call arriving after the computation finished starts a new one, so
+    keys only need to identify what the result depends on, such as the page and data versions.
+
+    Usage:
+        result = await read_flights.do("perso-drinks", user_id, etag, load)
+
+    Attributes:
+        top_keys (int): Subjects with the most deduplicated calls to report.
+        calls (dict): The number of calls by (route, "leader" or "shared").
+    """
+
+    def __init__(self, top_keys):
+        self.top_keys = top_keys
+        self.calls = {}
+        self._flights = {}
+        # (route, subject) -> deduplicated calls, trimmed to the largest counts
+        self._shared = {}
+
+    @property
+    def in_flight(self):
+        return len(self._flights)
+
+    def _record(self, route, subject, shared):
+        result = "shared" if shared else "leader"
+        self.calls[(route, result)] = self.calls.get((route, result), 0) + 1
+        if shared:
+            key = (route, str(subject))
+            self._shared[key] = self._shared.get(key, 0) + 1
+            # Keep memory bounded: once there are 10 times too many subjects, keep the busiest ones
+            if len(self._shared) > 10 * self.top_keys:
+                self._shared = dict(heapq.nlargest(self.top_keys, self._shared.items(), key=lambda item: item[1]))
+
+    def _done(self, flight_key, task):
+        if self._flights.get(flight_key) is task:
+            del self._flights[flight_key]
+        # Mark the exception as retrieved in case every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, route, subject, key, function):
+        """
+        Run a computation, or wait for the identical one already running.
+
+        Args:
+            route (str): The endpoint, used to label the metrics.
+            subject: What the per-key metrics count the calls by, such as the user ID.
+            key: Identifies the computation within the route; equal keys must produce equal results.
+            function (callable): The coroutine function computing the result.
+
+        Returns:
+            The result of the computation.
+        """
+        flight_key = (route, key)
+        task = self._flights.get(flight_key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(function())
+            self._flights[flight_key] = task
+            task.add_done_callback(lambda done: self._done(flight_key, done))
+        self._record(route, subject, shared)
+        return await asyncio.shield(task)
+
+    def top_shared(self):
+        """
+        Return the subjects with the most deduplicated calls.
+
+        Returns:
+            dict: The number of deduplicated calls by (route, subject), for the top_keys busiest subjects.
+        """
+        return dict(heapq.nlargest(self.top_keys, self._shared.items(), key=lambda item: item[1]))
+
+
+read_flights = SingleFlight(SINGLEFLIGHT_TOP_KEYS)
@@ -0,0 +1,130 @@
+import contextvars
+import logging
+import re
+
+from config.settings import env_number
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this many milliseconds are logged with their normalized SQL
+SLOW_QUERY_MS = env_number("SLOW_QUERY_MS", 200.0, float)
+# Requests running more statements than this are logged, to catch N+1 query patterns
+MAX_QUERIES_PER_REQUEST = env_number("MAX_QUERIES_PER_REQUEST", 20)
+
+STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*")
+WHITESPACE = re.compile(r"\s+")
+
+
+class RequestTrace:
+    """
+    The database work done while handling one request.
+
+    Attributes:
+        query_count (int): Number of statements executed.
+        db_seconds (float): Total time spent executing them.
+    """
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_seconds = 0.0
+
+    def server_timing(self, total_seconds):
+        """
+        Format the trace as a Server-Timing header value, readable in the browser developer tools.
+
+        Args:
+            total_seconds (float): The time spent handling the whole request.
+
+        Returns:
+            str: The header value.
+        """
+        return (f'db;dur={self.db_seconds * 1000:.1f};desc="{self.query_count} queries", '
+                f'app;dur={total_seconds * 1000:.1f}')
+
+
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+def start_trace():
+    """
+    Start tracing the statements run by the current request.
+
+    Returns:
+        tuple: The new trace and the token to pass to end_trace().
+    """
+    trace = RequestTrace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+def normalize_sql(query):
+    """
+    Replace the literals and placeholder lists of a statement so that similar statements look the same.
+
+    Args:
+        query (str): The SQL statement.
+
+    Returns:
+        str: The statement on one line, with "?" for literals and placeholders and "(...)" for lists of them.
+    """
+    query = query.replace("%s", "?")
+    query = STRING_LITERAL.sub("?", query)
+    query = NUMBER_LITERAL.sub("?", query)
+    query = PLACEHOLDER_LIST.sub("(...)", query)
+    return WHITESPACE.sub(" ", query).strip()
+
+
+def params_shape(params, many=False):
+    """
+    Describe the parameters of a statement without their values, which may be personal data.
+
+    Args:
+        params: The parameters passed to execute(), or the sequence passed to executemany().
+        many (bool): Whether params is the sequence of an executemany().
+
+    Returns:
+        str: The parameter types, e.g. "(int, str)" or "120 x (int, int)".
+    """
+    if many:
+        rows = list(params)
+        return f"{len(rows)} x {params_shape(rows[0]) if rows else '()'}"
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in params.items()) + "}"
+    if isinstance(params, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in params) + ")"
+    return type(params).__name__
+
+
+def record_query(query, params, seconds, many=False):
+    """
+    Add a statement to the trace of the current request and log it if it is slow.
+
+    Args:
+        query (str): The SQL statement.
+        params: Its parameters.
+        seconds (float): The time it took.
+        many (bool): Whether it was run through executemany().
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.query_count += 1
+        trace.db_seconds += seconds
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        logger.warning("Slow query (%.1f ms): %s -- params %s",
+                       seconds * 1000, normalize_sql(query), params_shape(params, many))
+
+
+def check_query_count(trace, method, route):
+    """
+    Log the requests running more statements than MAX_QUERIES_PER_REQUEST.
+    """
+    if trace.query_count > MAX_QUERIES_PER_REQUEST:
+        logger.warning("%s %s ran %d queries (%.1f ms in the database)",
+                       method, route, trace.query_count, trace.db_seconds * 1000)
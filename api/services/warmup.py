@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import time
+
+from config.async_database import AsyncDatabaseConnection
+from config.database import pool, pool_config
+from config.settings import env_number
+from services.catalog import catalog
+from services.leaderboard import top_drinks
+
+logger = logging.getLogger(__name__)
+
+# Longest pause in seconds between two warm-up attempts while the database is unreachable
+WARMUP_RETRY_MAX = env_number("WARMUP_RETRY_MAX", 30.0, float)
+
+
+async def ping_database():
+    """
+    Run a trivial query on the async pool.
+    """
+    async with AsyncDatabaseConnection() as (conn, cursor):
+        await cursor.execute("SELECT 1")
+        await cursor.fetchone()
+
+
+async def warm_database():
+    """
+    Open the connections of both pools ahead of the first requests.
+    """
+    # Creating the async pool opens its minimum number of connections
+    await ping_database()
+    await asyncio.to_thread(pool.warm, pool_config["size"])
+
+
+class Warmup:
+    """
+    Brings the dependencies of the application up in the background, retrying until they all succeed.
+
+    The worker accepts connections right away; /readyz reports it unready until the warm-up is done,
+    so the load balancer only routes traffic to warm workers. Steps that succeeded are not run again
+    after a failure.
+
+    Usage:
+        task = asyncio.create_task(warmup.run())
+
+    Attributes:
+        steps (list): The (name, coroutine function) pairs to run in order.
+        retry_max (float): Longest pause in seconds between two attempts.
+        checks (dict): The state of each step: "pending", "ok" or "error".
+        error (str): The last error, if any.
+    """
+
+    def __init__(self, steps, retry_max):
+        self.steps = steps
+        self.retry_max = retry_max
+        self.checks = {name: "pending" for name, _ in steps}
+        self.error = None
+        self.started_at = time.monotonic()
+        self.ready_at = None
+
+    @property
+    def ready(self):
+        return self.ready_at is not None
+
+    async def _run_steps(self):
+        for name, step in self.steps:
+            if self.checks[name] == "ok":
+                continue
+            try:
+                await step()
+            except Exception:
+                self.checks[name] = "error"
+                raise
+            self.checks[name] = "ok"
+
+    async def run(self):
+        """
+        Run the steps until they all succeed, backing off exponentially between attempts.
+        """
+        delay = 0.5
+        while True:
+            try:
+                await self._run_steps()
+            except Exception as e:
+                self.error = str(e)
+                logger.warning("Warm-up failed, retrying in %.1f s: %s", delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.retry_max)
+                continue
+            self.error = None
+            self.ready_at = time.monotonic()
+            logger.info("Warm-up done in %.2f s", self.ready_at - self.started_at)
+            return
+
+    def status(self):
+        """
+        Describe the progress of the warm-up.
+
+        Returns:
+            dict: Whether it is done, the state of each step and the last error.
+        """
+        return {"ready": self.ready, "checks": dict(self.checks), "error": self.error}
+
+
+warmup = Warmup([
+    ("database", warm_database),
+    # Map the drink and supplement catalog used for pricing, loading it only if no worker did
+    ("catalog", catalog.get),
+    # Preload the most liked drinks leaderboard
+    ("leaderboard", top_drinks.load),
+], WARMUP_RETRY_MAX)
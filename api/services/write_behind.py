@@ -0,0 +1,267 @@
+import logging
+import threading
+import time
+from collections import Counter, deque
+
+from mysql.connector.errors import IntegrityError
+
+from config.database import DatabaseConnection
+from config.settings import env_number
+from services.http_cache import bump_version_query
+from services.leaderboard import top_drinks
+from services.metrics import write_behind_flush_duration_seconds
+
+logger = logging.getLogger(__name__)
+
+# Acknowledge likes and favorites at once and write them in batches (1) instead of one transaction each (0)
+WRITE_BEHIND = bool(env_number("WRITE_BEHIND", 0))
+# Rows written by a single flush
+WRITE_BEHIND_BATCH_SIZE = env_number("WRITE_BEHIND_BATCH_SIZE", 500)
+# Seconds a row waits at most before being flushed
+WRITE_BEHIND_FLUSH_INTERVAL = env_number("WRITE_BEHIND_FLUSH_INTERVAL", 0.2, float)
+# Rows waiting at most in each queue before new ones are turned away
+WRITE_BEHIND_MAX_QUEUE = env_number("WRITE_BEHIND_MAX_QUEUE", 10000)
+# Seconds the shutdown waits for the queues to be written
+WRITE_BEHIND_DRAIN_TIMEOUT = env_number("WRITE_BEHIND_DRAIN_TIMEOUT", 10.0, float)
+
+# Longest pause in seconds between two attempts while the database fails
+RETRY_MAX = 5.0
+
+
+class WriteBehindFull(Exception):
+    """
+    Raised when a queue cannot take more rows, because it is full or shutting down.
+    """
+
+
+class WriteBehindQueue:
+    """
+    Buffers (user ID, created drink ID) rows in memory and writes them in batches from a background thread.
+
+    A batch is flushed as soon as `batch_size` rows are waiting, or `flush_interval` seconds after its
+    oldest row was queued. A row already waiting is not queued twice. When a flush fails, its batch goes
+    back to the front of the queue and is retried with exponential backoff. stop() writes what is left on
+    a clean shutdown; rows still queued when the process is killed are lost.
+
+    Usage:
+        accepted = like_queue.put(user_id, drink_created_id)
+
+    Attributes:
+        kind (str): What the rows are, used in the logs and metrics.
+        flush (callable): Writes a list of rows to the database.
+        batch_size (int): Rows written by a single flush.
+        flush_interval (float): Seconds a row waits at most before being flushed.
+        max_queue (int): Rows waiting at most before put() raises WriteBehindFull.
+        written (int): Rows handed to a successful flush.
+        failed (int): Flushes that raised an error.
+        rejected (int): Rows turned away because the queue was full.
+    """
+
+    def __init__(self, kind, flush, batch_size, flush_interval, max_queue):
+        self.kind = kind
+        self.flush = flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+        # (row, time it was queued), oldest first
+        self._rows = deque()
+        # Rows queued or being flushed
+        self._pending = set()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    @property
+    def depth(self):
+        """
+        Number of rows waiting to be flushed.
+        """
+        return len(self._rows)
+
+    def put(self, user_id, drink_created_id):
+        """
+        Queue a row, starting the flusher thread on first use.
+
+        Args:
+            user_id (int): The ID of the user.
+            drink_created_id (int): The ID of the created drink.
+
+        Returns:
+            bool: False if the same row is already waiting to be written.
+
+        Raises:
+            WriteBehindFull: If the queue is full or shutting down.
+        """
+        row = (user_id, drink_created_id)
+        with self._condition:
+            if row in self._pending:
+                return False
+            if self._stopping:
+                raise WriteBehindFull("The server is shutting down")
+            if len(self._rows) >= self.max_queue:
+                self.rejected += 1
+                raise WriteBehindFull("Too many %s waiting to be written" % self.kind)
+            self._rows.append((row, time.monotonic()))
+            self._pending.add(row)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-behind-%s" % self.kind, daemon=True)
+                self._thread.start()
+            if len(self._rows) >= self.batch_size:
+                self._condition.notify()
+        return True
+
+    def _next_batch(self):
+        with self._condition:
+            while True:
+                if self._rows:
+                    if self._stopping or len(self._rows) >= self.batch_size:
+                        break
+                    wait = self._rows[0][1] + self.flush_interval - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._condition.wait(wait)
+                elif self._stopping:
+                    return None
+                else:
+                    self._condition.wait()
+            return [self._rows.popleft()[0] for _ in range(min(len(self._rows), self.batch_size))]
+
+    def _run(self):
+        delay = self.flush_interval
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            try:
+                self.flush(batch)
+            except Exception as e:
+                self.failed += 1
+                logger.warning("Writing %d %s failed, retrying in %.1f s: %s", len(batch), self.kind, delay, e)
+                queued_at = time.monotonic()
+                with self._condition:
+                    self._rows.extendleft((row, queued_at) for row in reversed(batch))
+                    self._condition.wait(delay)
+                delay = min(delay * 2, RETRY_MAX)
+                continue
+            write_behind_flush_duration_seconds.observe(time.perf_counter() - started, self.kind)
+            delay = self.flush_interval
+            with self._condition:
+                self.written += len(batch)
+                self._pending.difference_update(batch)
+
+    def stop(self, timeout):
+        """
+        Write the queued rows and stop the flusher thread.
+
+        Args:
+            timeout (float): Seconds to wait for the rows to be written.
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._rows:
+            logger.error("%d %s could not be written before shutdown", len(self._rows), self.kind)
+
+
+def insert_rows(kind, db_connection, db_cursor, query, rows):
+    """
+    Insert acknowledged rows in a single multi-row statement, or one by one if the database rejects it.
+
+    The rows were checked before being acknowledged, but a concurrent request may have written the same
+    row, or the created drink may have been deleted, since then. Such rows are logged and dropped, as
+    retrying cannot help; any other error fails the flush, which is retried.
+
+    Args:
+        kind (str): What the rows are, for the logs.
+        db_connection: The connection, whose transaction is rolled back if the statement fails.
+        db_cursor: The cursor of the connection.
+        query (str): The INSERT statement of one row.
+        rows (list): The (user ID, created drink ID) pairs.
+
+    Returns:
+        list: The rows inserted.
+    """
+    try:
+        db_cursor.executemany(query, rows)
+        return rows
+    except IntegrityError:
+        db_connection.rollback()
+
+    inserted = []
+    for row in rows:
+        try:
+            # A failed statement is rolled back on its own, the rows inserted before it stay in the transaction
+            db_cursor.execute(query, row)
+            inserted.append(row)
+        except IntegrityError as err:
+            logger.warning("Dropping %s %s: %s", kind, row, err)
+    return inserted
+
+
+def flush_likes(rows):
+    """
+    Write likes, then add them to the like counts of their created drinks.
+
+    Args:
+        rows (list): The (user ID, created drink ID) pairs.
+    """
+    # Locking the created drinks in a fixed order keeps concurrent flushes from deadlocking
+    rows = sorted(rows, key=lambda row: (row[1], row[0]))
+    with DatabaseConnection() as (db_connection, db_cursor):
+        inserted = insert_rows("likes", db_connection, db_cursor,
+                               "INSERT INTO drink_created_likes (user_id, drink_created_id) VALUES (%s, %s)", rows)
+        likes = Counter(drink_created_id for _, drink_created_id in inserted)
+        drink_created_ids = sorted(likes)
+        counts = []
+        if drink_created_ids:
+            # Increment by the rows actually written: a recount would scan every like of a popular drink
+            db_cursor.executemany(
+                "UPDATE drink_created SET like_count = like_count + %s WHERE id = %s",
+                [(likes[drink_created_id], drink_created_id) for drink_created_id in drink_created_ids]
+            )
+            placeholders = ", ".join(["%s"] * len(drink_created_ids))
+            db_cursor.execute(f"SELECT id, like_count FROM drink_created WHERE id IN ({placeholders})",
+                              drink_created_ids)
+            counts = db_cursor.fetchall()
+        db_connection.commit()
+
+    for row in counts:
+        top_drinks.observe(row['id'], row['like_count'])
+
+
+def flush_favorites(rows):
+    """
+    Write favorites.
+
+    Args:
+        rows (list): The (user ID, created drink ID) pairs.
+    """
+    with DatabaseConnection() as (db_connection, db_cursor):
+        inserted = insert_rows("favorites", db_connection, db_cursor,
+                               "INSERT INTO favoris (user_id, drink_created_id) VALUES (%s, %s)", sorted(rows))
+        user_ids = sorted({user_id for user_id, _ in inserted})
+        if user_ids:
+            # The cached favorite lists change with the rows
+            db_cursor.execute(bump_version_query("favoris", len(user_ids)), user_ids)
+        db_connection.commit()
+
+
+like_queue = WriteBehindQueue("likes", flush_likes, WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_INTERVAL,
+                              WRITE_BEHIND_MAX_QUEUE)
+favorite_queue = WriteBehindQueue("favorites", flush_favorites, WRITE_BEHIND_BATCH_SIZE,
+                                  WRITE_BEHIND_FLUSH_INTERVAL, WRITE_BEHIND_MAX_QUEUE)
+write_behind_queues = (like_queue, favorite_queue)
+
+
+def drain():
+    """
+    Write the queued likes and favorites, waiting at most WRITE_BEHIND_DRAIN_TIMEOUT seconds for each queue.
+    """
+    for queue in write_behind_queues:
+        queue.stop(WRITE_BEHIND_DRAIN_TIMEOUT)
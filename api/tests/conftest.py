@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules import each other from the api directory, as when the server runs from it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("AUTH_SECRET_KEY", "test-secret-key")
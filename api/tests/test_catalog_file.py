@@ -0,0 +1,75 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from services.catalog_file import CatalogFile, SharedCatalogFile, check_owner, encode
+
+DRINKS = {
+    12: {"name": "Crème brûlée latte", "description": "Café, lait, caramel", "price": 4.5},
+    3: {"name": "Espresso", "description": "", "price": 1.8},
+}
+SUPPLEMENTS = {
+    5: {"name": "Chantilly", "price": 0.6, "type_id": 2},
+}
+
+
+def test_encode_and_decode_round_trip():
+    file = CatalogFile(encode(7, 1234.5, DRINKS, SUPPLEMENTS))
+
+    assert (file.generation, file.loaded_at) == (7, 1234.5)
+    assert list(file.drinks) == [3, 12]
+    assert dict(file.drinks) == {drink_id: dict(drink, id=drink_id) for drink_id, drink in DRINKS.items()}
+    assert file.supplements[5] == dict(SUPPLEMENTS[5], id=5)
+    assert 4 not in file.drinks and "3" not in file.drinks and 2 ** 70 not in file.drinks
+
+
+def test_truncated_and_foreign_content_is_refused():
+    data = encode(1, 0.0, DRINKS, SUPPLEMENTS)
+
+    with pytest.raises(ValueError):
+        CatalogFile(data[:-1])
+    with pytest.raises(ValueError):
+        CatalogFile(b"NOTACATL" + data[8:])
+
+
+def test_write_bumps_the_generation_seen_by_other_workers(tmp_path):
+    path = str(tmp_path / "catalog.bin")
+    writer, reader = SharedCatalogFile(path), SharedCatalogFile(path)
+    assert reader.current() is None
+
+    async def write(changes):
+        async with writer.lock():
+            latest = writer.current()
+            generation = latest.generation + 1 if latest is not None else 1
+            return writer.write(encode(generation, 0.0, {**DRINKS, **changes}, SUPPLEMENTS))
+
+    asyncio.run(write({}))
+    first = reader.current()
+    assert first.generation == 1
+    # Unchanged files are not mapped again
+    assert reader.current() is first
+
+    asyncio.run(write({20: {"name": "Thé", "description": "", "price": 2.0}}))
+    second = reader.current()
+    assert second.generation == 2 and second.drinks[20]["name"] == "Thé"
+    # The previous mapping stays readable
+    assert 20 not in first.drinks
+
+
+def test_files_of_another_user_are_refused():
+    status = SimpleNamespace(st_uid=os.geteuid() + 1)
+
+    with pytest.raises(PermissionError):
+        check_owner(status, "catalog.bin")
+    check_owner(SimpleNamespace(st_uid=os.geteuid()), "catalog.bin")
+
+
+def test_symbolic_links_are_refused(tmp_path):
+    target = tmp_path / "elsewhere.bin"
+    target.write_bytes(encode(1, 0.0, DRINKS, SUPPLEMENTS))
+    os.symlink(target, tmp_path / "catalog.bin")
+
+    with pytest.raises(OSError):
+        SharedCatalogFile(str(tmp_path / "catalog.bin")).current()
@@ -0,0 +1,34 @@
+from migrate import Migration, load_migrations
+
+
+def test_statements_are_split_on_semicolons_without_comments():
+    migration = Migration(9, "example", "\n".join([
+        "-- Premier commentaire",
+        "ALTER TABLE users",
+        "  -- Commentaire dans une instruction",
+        "  ADD COLUMN a INT;",
+        "",
+        "   -- Commentaire indenté",
+        "CREATE INDEX idx_a ON users (a);",
+        "UPDATE users SET a = 0",
+    ]))
+
+    assert migration.statements() == [
+        "ALTER TABLE users\n  ADD COLUMN a INT",
+        "CREATE INDEX idx_a ON users (a)",
+        "UPDATE users SET a = 0",
+    ]
+
+
+def test_empty_statements_are_dropped():
+    assert Migration(9, "example", "-- Rien\n;\n\n;  ;").statements() == []
+
+
+def test_every_migration_file_splits_into_statements():
+    migrations = load_migrations()
+
+    assert [migration.version for migration in migrations] == list(range(1, len(migrations) + 1))
+    for migration in migrations:
+        statements = migration.statements()
+        assert statements, migration.name
+        assert not any(line.lstrip().startswith("--") for statement in statements for line in statement.splitlines())
@@ -0,0 +1,146 @@
+import pytest
+from mysql.connector import errorcode
+from mysql.connector.errors import IntegrityError, InterfaceError
+
+from config.prepared import PreparedCursor, StatementCache
+
+
+class ServerError(Exception):
+    """
+    The MySQLInterfaceError of the C extension, which carries the MySQL error of a prepared statement.
+    """
+
+    def __init__(self, errno, msg, sqlstate):
+        super().__init__(msg)
+        self.errno = errno
+        self.msg = msg
+        self.sqlstate = sqlstate
+
+
+class FakeCursor:
+    def __init__(self, prepared=False):
+        self.prepared = prepared
+        self.executed = []
+        self.error = None
+        self.closed = False
+        self.drained = 0
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def fetchall(self):
+        self.drained += 1
+        return []
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self):
+        self.cursors = []
+
+    def cursor(self, prepared=False, **kwargs):
+        cursor = FakeCursor(prepared)
+        self.cursors.append(cursor)
+        return cursor
+
+
+def c_extension_error(errno, msg, sqlstate):
+    # CMySQLConnection.cmd_stmt_execute: raise InterfaceError(str(err)) from err
+    try:
+        raise ServerError(errno, msg, sqlstate)
+    except ServerError as err:
+        try:
+            raise InterfaceError(str(err)) from err
+        except InterfaceError as error:
+            return error
+
+
+SELECT = "SELECT * FROM users WHERE id = %s"
+
+
+def test_statement_is_prepared_on_its_second_execution():
+    cache = StatementCache(FakeConnection(), capacity=2)
+
+    assert cache.get(SELECT) is None
+    statement, cursor = cache.get(SELECT)
+    assert statement == SELECT and cursor.prepared
+    assert cache.get(SELECT) == (statement, cursor)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_least_recently_used_statement_is_evicted_and_closed():
+    cache = StatementCache(FakeConnection(), capacity=2)
+    queries = ["SELECT %s" % index for index in range(3)]
+    cursors = {}
+    for query in queries:
+        cache.get(query)
+        cursors[query] = cache.get(query)[1]
+    # The first statement was the least recently used when the third one came in
+    assert cursors[queries[0]].closed
+    assert not cursors[queries[1]].closed and not cursors[queries[2]].closed
+    assert cache.evictions == 1
+
+
+def test_statements_that_are_not_worth_preparing_use_the_text_protocol():
+    cache = StatementCache(FakeConnection(), capacity=2)
+    for _ in range(2):
+        assert cache.get("SHOW REPLICA STATUS") is None
+    disabled = StatementCache(FakeConnection(), capacity=0)
+    for _ in range(2):
+        assert disabled.get(SELECT) is None
+
+
+def warm_cursor():
+    connection = FakeConnection()
+    cursor = PreparedCursor(connection.cursor(dictionary=True), StatementCache(connection, capacity=2))
+    cursor.execute(SELECT, (1,))
+    cursor.execute(SELECT, (1,))
+    return connection, cursor
+
+
+def test_duplicate_key_of_a_prepared_statement_raises_integrity_error():
+    connection, cursor = warm_cursor()
+    prepared = connection.cursors[-1]
+    prepared.error = c_extension_error(errorcode.ER_DUP_ENTRY, "Duplicate entry '1-1' for key 'uq'", "23000")
+
+    with pytest.raises(IntegrityError) as raised:
+        cursor.execute(SELECT, (1,))
+    assert raised.value.errno == errorcode.ER_DUP_ENTRY
+
+
+def test_lost_connection_of_a_prepared_statement_stays_an_interface_error():
+    connection, cursor = warm_cursor()
+    prepared = connection.cursors[-1]
+    prepared.error = c_extension_error(errorcode.CR_SERVER_LOST, "Lost connection to MySQL server", "HY000")
+
+    with pytest.raises(InterfaceError):
+        cursor.execute(SELECT, (1,))
+
+
+def test_statement_the_server_cannot_prepare_falls_back_to_the_text_protocol():
+    connection, cursor = warm_cursor()
+    plain, prepared = connection.cursors
+    prepared.error = c_extension_error(errorcode.ER_UNSUPPORTED_PS, "This command is not supported", "HY000")
+
+    cursor.execute(SELECT, (1,))
+    assert plain.executed[-1] == SELECT
+    assert cursor.statements.get(SELECT) is None
+    assert prepared.closed
+
+
+def test_unread_rows_are_fetched_before_the_next_statement():
+    connection, cursor = warm_cursor()
+    plain, prepared = connection.cursors
+
+    drained = plain.drained
+    cursor.execute("SELECT 1")
+    assert prepared.drained == 1
+    # Rows read by the caller are not fetched again
+    cursor.fetchall()
+    cursor.execute("SELECT 1")
+    assert plain.drained == drained + 1
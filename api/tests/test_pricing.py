@@ -0,0 +1,61 @@
+import math
+from types import SimpleNamespace
+
+import numpy as np
+
+from services.catalog_file import CatalogFile, encode
+from services.pricing import MAX_ID, PriceTable, flatten
+
+
+def price_table(drink_prices, supplement_prices):
+    drinks = {drink_id: {"name": "Drink %d" % drink_id, "description": "", "price": price}
+              for drink_id, price in drink_prices.items()}
+    supplements = {supplement_id: {"name": "Supplement %d" % supplement_id, "price": price, "type_id": 1}
+                   for supplement_id, price in supplement_prices.items()}
+    file = CatalogFile(encode(1, 0.0, drinks, supplements))
+    return PriceTable(SimpleNamespace(version=1, drinks=file.drinks, supplements=file.supplements))
+
+
+def test_lookup_finds_known_ids_and_returns_nan_for_the_others():
+    known_ids = np.array([3, 10, 2 ** 40], dtype=np.int64)
+    prices = np.array([1.5, 2.0, 9.0])
+    # Below, between, equal to and beyond the known IDs
+    found = PriceTable._lookup(known_ids, prices, np.array([1, 3, 5, 10, 2 ** 40, 2 ** 41], dtype=np.int64))
+
+    assert found[1] == 1.5 and found[3] == 2.0 and found[4] == 9.0
+    assert np.isnan(found[[0, 2, 5]]).all()
+    assert np.isnan(PriceTable._lookup(np.array([], dtype=np.int64), np.array([]), np.array([1]))).all()
+
+
+def test_prices_add_the_supplements_times_their_quantity():
+    table = price_table({1: 2.5, 7: 3.0}, {4: 0.5, 9: 0.25})
+
+    assert table.prices([(1, {}), (7, {4: 2, 9: 1}), (1, {9: 3})]) == [2.5, 4.25, 3.25]
+
+
+def test_unknown_drinks_are_nan_and_unknown_supplements_are_counted():
+    table = price_table({1: 2.5}, {4: 0.5})
+
+    totals, unknown_supplements, invalid_quantities = table.quote([(2, {4: 1}), (1, {5: 1, 4: 0}), (-3, {})])
+    assert math.isnan(totals[0]) and math.isnan(totals[2])
+    assert totals[1] == 2.5
+    assert unknown_supplements.tolist() == [0, 1, 0]
+    assert invalid_quantities.tolist() == [0, 1, 0]
+    assert table.prices([(2, {}), (1, {5: 1})]) == [None, 2.5]
+
+
+def test_flatten_lays_the_supplement_lines_out_by_configuration():
+    drink_ids, owners, supplement_ids, quantities = flatten([(1, {4: 2, 9: 1}), (7, {}), (2, {4: 5})])
+
+    assert drink_ids.tolist() == [1, 7, 2]
+    assert owners.tolist() == [0, 0, 2]
+    assert supplement_ids.tolist() == [4, 9, 4]
+    assert quantities.tolist() == [2, 1, 5]
+
+
+def test_flatten_maps_out_of_range_ids_and_quantities_into_int64():
+    drink_ids, owners, supplement_ids, quantities = flatten([(2 ** 70, {-1: 2 ** 70, MAX_ID: -2 ** 70})])
+
+    assert drink_ids.tolist() == [-1]
+    assert supplement_ids.tolist() == [-1, -1]
+    assert quantities.tolist() == [MAX_ID, -1]
@@ -0,0 +1,102 @@
+import mysql.connector
+import pytest
+from fastapi.testclient import TestClient
+from mysql.connector import errorcode
+from mysql.connector.errors import IntegrityError
+
+from config.database import pool
+from main import app
+from services.auth import token_service
+
+
+class FakeDatabase:
+    """
+    The drink_created_likes table of a MySQL server.
+    """
+
+    def __init__(self):
+        self.likes = set()
+        self.connections = 0
+
+    def connect(self, **kwargs):
+        self.connections += 1
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    in_transaction = False
+
+    def __init__(self, database):
+        self.database = database
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self.database)
+
+    def ping(self, reconnect=False):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, database):
+        self.database = database
+        self.lastrowid = None
+
+    def execute(self, query, params=None):
+        if query.startswith("INSERT INTO drink_created_likes"):
+            like = tuple(params)
+            if like in self.database.likes:
+                raise IntegrityError(msg="Duplicate entry for key 'uq_drink_created_likes_user_id_drink_created_id'",
+                                     errno=errorcode.ER_DUP_ENTRY)
+            self.database.likes.add(like)
+        elif query.startswith("UPDATE drink_created SET like_count"):
+            self.lastrowid = sum(1 for _, drink_created_id in self.database.likes if drink_created_id == params[0])
+
+    def fetchall(self):
+        return []
+
+    def fetchone(self):
+        return None
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(mysql.connector, "connect", database.connect)
+    pool.dispose()
+    yield database
+    pool.dispose()
+
+
+@pytest.fixture
+def client():
+    # Without the lifespan, so that the warmup does not reach for the async pool
+    return TestClient(app)
+
+
+def test_duplicate_like_on_warm_connection_returns_400(database, client):
+    headers = {"Authorization": "Bearer " + token_service.issue(1, "user")}
+
+    for drink_created_id in (1, 2, 3):
+        response = client.post("/likes/", json={"drink_created_id": drink_created_id}, headers=headers)
+        assert response.status_code == 200
+
+    response = client.post("/likes/", json={"drink_created_id": 1}, headers=headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Like already exists for this user and drink"
+
+    # Every request used the same pooled connection, which the duplicate did not discard
+    response = client.post("/likes/", json={"drink_created_id": 4}, headers=headers)
+    assert response.status_code == 200
+    assert database.connections == 1
@@ -0,0 +1,53 @@
+from services.search import DrinkSearchIndex, tokenize
+
+DRINKS = [
+    {"id": 1, "name": "Café latte", "description": "Espresso et lait chaud", "price": 3.5},
+    {"id": 2, "name": "Latte macchiato", "description": "Lait, mousse et café", "price": 4.0},
+    {"id": 3, "name": "Thé vert", "description": "Infusion de feuilles", "price": 2.5},
+    {"id": 4, "name": "Cœur de crème brûlée", "description": None, "price": 5.0},
+]
+
+
+def index():
+    search_index = DrinkSearchIndex()
+    search_index.rebuild(DRINKS)
+    return search_index
+
+
+def ids(drinks):
+    return [drink["id"] for drink in drinks]
+
+
+def test_tokenize_drops_case_accents_and_ligatures():
+    assert tokenize("Cœur de Crème BRÛLÉE!") == ["coeur", "de", "creme", "brulee"]
+    assert tokenize(None) == []
+
+
+def test_every_query_word_must_match_a_word_or_its_prefix():
+    assert ids(index().search("cafe lat")) == [1, 2]
+    assert ids(index().search("the")) == [3]
+    assert index().search("cafe the") == []
+    assert index().search("  ") == []
+
+
+def test_name_matches_rank_above_description_matches():
+    # "lait" is in both descriptions, "latte" in both names: drink 1 has "cafe" in its name
+    assert ids(index().search("cafe")) == [1, 2]
+    assert ids(index().search("mousse latte")) == [2]
+    assert ids(index().search("crem")) == [4]
+
+
+def test_max_price_and_limit():
+    assert ids(index().search("lait", max_price=3.5)) == [1]
+    assert ids(index().search("lait", limit=1)) == [1]
+
+
+def test_the_index_follows_added_and_removed_drinks():
+    search_index = index()
+    search_index.add(dict(DRINKS[2], name="Thé noir"))
+    assert search_index.search("vert") == []
+    assert ids(search_index.search("noir")) == [3]
+
+    search_index.remove(3)
+    assert search_index.search("the") == []
+    assert "noir" not in search_index._postings
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from services.singleflight import SingleFlight
+
+
+def test_concurrent_identical_calls_share_one_computation():
+    flights = SingleFlight(top_keys=5)
+    started = []
+
+    async def load():
+        started.append(True)
+        await asyncio.sleep(0.01)
+        return ["drink"]
+
+    async def main():
+        results = await asyncio.gather(*(flights.do("perso-drinks", 1, "etag", load) for _ in range(3)))
+        # The computation is over: the next call runs it again
+        await flights.do("perso-drinks", 1, "etag", load)
+        return results
+
+    results = asyncio.run(main())
+    assert results == [["drink"]] * 3
+    assert len(started) == 2
+    assert flights.calls == {("perso-drinks", "leader"): 2, ("perso-drinks", "shared"): 2}
+    assert flights.top_shared() == {("perso-drinks", "1"): 2}
+    assert flights.in_flight == 0
+
+
+def test_different_keys_do_not_share():
+    flights = SingleFlight(top_keys=5)
+    started = []
+
+    async def load():
+        started.append(True)
+        await asyncio.sleep(0)
+        return "drinks"
+
+    async def main():
+        return await asyncio.gather(flights.do("show-fav", 1, "a", load), flights.do("show-fav", 2, "b", load))
+
+    assert asyncio.run(main()) == ["drinks", "drinks"]
+    assert len(started) == 2
+
+
+def test_every_caller_receives_the_exception():
+    flights = SingleFlight(top_keys=5)
+
+    async def load():
+        await asyncio.sleep(0)
+        raise RuntimeError("database down")
+
+    async def main():
+        return await asyncio.gather(*(flights.do("show-fav", 1, "etag", load) for _ in range(2)),
+                                    return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert [type(error) for error in errors] == [RuntimeError, RuntimeError]
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    flights = SingleFlight(top_keys=5)
+
+    async def load():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flights.do("show-fav", 1, "etag", load))
+        second = asyncio.ensure_future(flights.do("show-fav", 1, "etag", load))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"